@@ -1,45 +1,120 @@
 # agent.py
+import os
 import sys
-import yaml
+import json
+import tempfile
 import logging
 
-# --- CRITICAL FIX: Patch PyYAML for HyperPyYAML/CosyVoice ---
-# ต้องทำสิ่งนี้เป็นบรรทัดแรกๆ ก่อน import livekit หรือ fun_audio
-def patch_yaml_aggressive():
-    print("Applying Aggressive PyYAML Patch...")
-    try:
-        # Patch Base Loader
-        setattr(yaml.Loader, 'max_depth', 10000)
-        
-        # Patch CLoader (ตัวที่ Mac/Linux ชอบใช้และทำให้เกิดบั๊ก)
-        if hasattr(yaml, 'CLoader'):
-            setattr(yaml.CLoader, 'max_depth', 10000)
-            
-        # Patch SafeLoader และอื่นๆ เผื่อไว้
-        if hasattr(yaml, 'SafeLoader'):
-            setattr(yaml.SafeLoader, 'max_depth', 10000)
-    except Exception as e:
-        print(f"YAML Patch Warning: {e}")
-
-patch_yaml_aggressive()
-# ------------------------------------------------------------
-
-import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# ต้องอยู่ก่อน import prometheus_client (ผ่าน livekit หรือ module ของเรา) เพราะมันเลือก multiprocess mode ตอน import
+# job แบบ thread (default) รันใน process นี้ metric อยู่ใน registry ปกติที่ /metrics ของ LiveKit อ่านได้ตรงๆ
+# ถ้ามี PROMETHEUS_MULTIPROC_DIR metric ของ process นี้จะเปิดไฟล์ใน dir ไว้ แล้ว worker ของ LiveKit ลบไฟล์ทิ้งตอนเริ่ม
+# (/metrics ไม่เห็นอะไรเลย) แบบ process ให้ worker ตั้ง dir ให้ process ลูกเหมือนเดิม (ดู __main__)
+from model_registry import JOB_EXECUTOR, REGISTRY
+
+if JOB_EXECUTOR == "thread":
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+# patch ของ PyYAML / torchaudio / CosyVoice อยู่ใน bootstrap และถูกเรียกตอนสร้าง SenseVoiceSTT / CosyVoiceTTS
+import bootstrap
+
+import asyncio
+
 from livekit import rtc
-from livekit.agents import JobContext, WorkerOptions, cli, tokenize, tts, AutoSubscribe
-from livekit.agents.llm import ChatContext, ChatMessage
-from livekit.agents.voice import Agent, AgentSession
+from livekit.agents import JobContext, JobExecutorType, JobProcess, WorkerOptions, cli, llm, tokenize, tts, AutoSubscribe
+from livekit.agents.voice import AgentSession
 from livekit.plugins import silero, openai
 from fun_audio import SenseVoiceSTT, CosyVoiceTTS
 from edge_tts_plugin import EdgeTTS # Custom adapter
+from hedged_tts import HedgedTTS
+from mock_llm import MockLLM
+from llm_cache import CachedLLM
+from chat_window import ChatWindow, WindowedAgent
+from speculative_llm import SpeculativeLLM
+from placement import get_placement
+from turn_metrics import TurnMetrics
+from worker_load import LOAD_THRESHOLD, WorkerLoad, start_reporter
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("agent")
 
+# เลือก TTS engine: "edge" (default), "cosyvoice" หรือ "hedged" (CosyVoice ก่อน ถ้าช้าเกิน deadline ค่อยเริ่ม EdgeTTS แข่ง)
+TTS_ENGINE = os.getenv("AGENT_TTS", "edge")
+TTS_DEADLINE_MS = float(os.getenv("AGENT_TTS_DEADLINE_MS", "600"))
+# inference backend ของ model บน CPU: torch (fp32), int8 หรือ onnx (ดู inference_backends.py)
+STT_BACKEND = os.getenv("AGENT_STT_BACKEND", "torch")
+TTS_BACKEND = os.getenv("AGENT_TTS_BACKEND", "torch")
+# เสียงของ CosyVoice (ชื่อใน voice store ดู voice_registry.py) participant เลือกเองได้ผ่าน attribute "voice"
+TTS_VOICE = os.getenv("AGENT_TTS_VOICE", "default")
+
+# latency ต่อ turn: histogram ที่ http://<host>:AGENT_METRICS_PORT/metrics (ตั้งเป็นค่าว่างเพื่อปิด)
+# และ record JSON ต่อ turn ต่อท้ายไฟล์ AGENT_TURN_LOG (ถ้าตั้งไว้)
+METRICS_PORT = os.getenv("AGENT_METRICS_PORT", "9100")
+TURN_LOG = os.getenv("AGENT_TURN_LOG")
+# prewarm ตัวแรกโหลด model ทั้งหมด (หลายสิบวินาทีบน CPU) default 10 s ของ LiveKit ไม่พอ
+PREWARM_TIMEOUT_S = float(os.getenv("AGENT_PREWARM_TIMEOUT_S", "180"))
+
+
+def prewarm(proc: JobProcess):
+    # โหลด model ทั้งหมดครั้งเดียวต่อ worker process ก่อนรับ job (แบบ thread ถูกเรียกทุก runner แต่โหลดจริงครั้งเดียว)
+    # job ที่สร้าง SenseVoiceSTT / CosyVoiceTTS ทีหลังจะได้ instance เดียวกันจาก REGISTRY
+    proc.userdata["vad"] = REGISTRY.get_or_load("silero_vad", "livekit-plugins-silero", silero.VAD.load, engine="vad")
+    SenseVoiceSTT(vad=proc.userdata["vad"], backend=STT_BACKEND)
+    if TTS_ENGINE in ("cosyvoice", "hedged"):
+        # ingest เสียง default ของ worker ที่นี่ (นอก event loop ของ job)
+        CosyVoiceTTS(backend=TTS_BACKEND, voice=TTS_VOICE)
+
+    # queue depth / RTF ของ process นี้ให้ load_fnc ใน process หลักอ่าน (worker_load.py)
+    start_reporter()
+
+    for entry in REGISTRY.report():
+        logger.info(f"Prewarmed model: {entry}")
+    bootstrap.log_report()
+
+    # pin main thread หลังโหลด model เสร็จ (โหลดบนทุก core) thread ที่ job สร้างทีหลังสืบทอดชุด core ของ vad
+    # ส่วน thread ของ STT / TTS pin ตัวเองตาม budget ของ engine นั้น
+    placement = get_placement()
+    placement.pin("vad")
+    logger.info(f"Placement: {json.dumps(placement.diagnostics())}")
+
+
+def build_base_llm() -> llm.LLM:
+    # AGENT_LLM=mock ใช้ MockLLM แทน Ollama สำหรับ load test (AGENT_LLM_PROFILE = ชื่อ preset หรือ JSON)
+    if os.getenv("AGENT_LLM", "ollama") == "mock":
+        return MockLLM(os.getenv("AGENT_LLM_PROFILE", "ollama-cpu"))
+    return openai.LLM( 
+        # model="llama3.2",
+        model="qwen2.5:7b",
+        base_url="http://localhost:11434/v1",
+        api_key="ollama", # Dummy key required by OpenAI client
+    )
+
+
+def build_llm(inner: llm.LLM) -> llm.LLM:
+    # คำถามซ้ำ (FAQ / คำทักทาย) ตอบจาก cache ตั้ง AGENT_LLM_CACHE=0 เพื่อปิด
+    if os.getenv("AGENT_LLM_CACHE", "1") != "0":
+        inner = CachedLLM(inner)
+    # AGENT_LLM_SPECULATION=1 เริ่มถาม LLM ตั้งแต่ final transcript ก่อน endpointing delay หมด (ต้อง attach กับ session ด้วย)
+    # ปิดไว้เป็นค่าเริ่มต้น: ทุกครั้งที่เดาผิดคือ generation ที่ทิ้ง แย่ง CPU กับ Ollama
+    if os.getenv("AGENT_LLM_SPECULATION", "0") == "1":
+        inner = SpeculativeLLM(inner)
+    return inner
+
+
+def build_tts() -> tts.TTS:
+    # AGENT_EDGE_FORMAT=pcm ขอ raw PCM จาก service, decoded-mp3 decode MP3 เองใน plugin
+    edge = lambda: EdgeTTS(voice="th-TH-PremwadeeNeural", output_format=os.getenv("AGENT_EDGE_FORMAT", "mp3"))
+    if TTS_ENGINE == "cosyvoice":
+        # ไม่มี engine สำรอง: เสียงเงียบแทน error ให้ session คุยต่อได้
+        return CosyVoiceTTS(backend=TTS_BACKEND, voice=TTS_VOICE, silence_on_failure=True)
+    if TTS_ENGINE == "hedged":
+        # CosyVoice ต้อง raise เมื่อไม่มีเสียง HedgedTTS จึงจะสลับไป EdgeTTS ได้
+        return HedgedTTS(CosyVoiceTTS(backend=TTS_BACKEND, voice=TTS_VOICE), edge(), deadline_s=TTS_DEADLINE_MS / 1000)
+    return edge()
+
 async def entrypoint(ctx: JobContext):
     logger.info(f"Connecting to room: {ctx.room.name}")
     
@@ -47,35 +122,26 @@ async def entrypoint(ctx: JobContext):
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
     logger.info("Connected to room")
 
-    # 2. เตรียม TTS Adapter
-    # หมายเหตุ: CosyVoice ใช้ 22050Hz แต่อาจจะต้องเช็คว่า LiveKit รองรับไหม
-    # ถ้า Model โหลดผ่าน Error เรื่อง Audio Frame จะหายไปเอง
-    # tts_adapter = tts.StreamAdapter(
-    #     tts=CosyVoiceTTS(),
-    #     sentence_tokenizer=tokenize.basic.SentenceTokenizer()
-    # )
+    # 2. TTS: CosyVoiceTTS รองรับ stream() เอง (รับ token จาก LLM แล้วเริ่มพูดตั้งแต่วลีแรก)
+    # ไม่ต้องห่อด้วย tts.StreamAdapter
 
     # 3. สร้าง Agent
-    initial_ctx = ChatContext(
-        items=[
-            ChatMessage(
-                role="system",
-                content=["คุณคือCall center AI อารมณ์ดี ชื่อฟ้าใส พูดภาษาไทยเป็นหลัก สั้นกระชับและเป็นกันเอง ขายของเก่งมาก"]
-            )
-        ]
-    )
+    # system prompt อยู่ใน instructions ที่เดียว (framework ใส่เป็นข้อความ system แรกของ chat_ctx ให้เอง)
+
+    # ใช้ VAD ตัวเดียวกันทั้ง turn detection และ streaming STT (interim transcript ระหว่างพูด)
+    vad = ctx.proc.userdata.get("vad") or REGISTRY.get_or_load("silero_vad", "livekit-plugins-silero", silero.VAD.load, engine="vad")
 
-    agent = Agent(
-        vad=silero.VAD.load(),
-        stt=SenseVoiceSTT(),
-        llm=openai.LLM( 
-            # model="llama3.2",
-            model="qwen2.5:7b",
-            base_url="http://localhost:11434/v1",
-            api_key="ollama", # Dummy key required by OpenAI client
-        ),
-        tts=EdgeTTS(voice="th-TH-PremwadeeNeural"),
-        chat_ctx=initial_ctx,
+    # history ที่ส่งให้ LLM จำกัดที่ AGENT_CONTEXT_BUDGET token turn เก่าถูกสรุปด้วย LLM ตัวจริง
+    # (ไม่ผ่าน cache / speculation) หลังเอเจนต์ตอบจบ ดู chat_window.py
+    base_llm = build_base_llm()
+    agent_llm = build_llm(base_llm)
+    agent_tts = build_tts()
+    agent = WindowedAgent(
+        window=ChatWindow(summarizer=base_llm),
+        vad=vad,
+        stt=SenseVoiceSTT(vad=vad, backend=STT_BACKEND),
+        llm=agent_llm,
+        tts=agent_tts,
         instructions="คุณคือCall center AI อารมณ์ดี ชื่อฟ้าใส พูดภาษาไทยเป็นหลัก สั้นกระชับและเป็นกันเอง ขายของเก่งมาก",
     )
 
@@ -90,6 +156,12 @@ async def entrypoint(ctx: JobContext):
     # ปกติ AgentSession จะจัดการ connection ให้ แต่การ wait_for_participant ช่วยให้แน่ใจว่ามีคนเข้าห้องแล้ว
     participant = await ctx.wait_for_participant()
     logger.info(f"Starting agent for participant: {participant.identity}")
+    TurnMetrics(session, room=ctx.room.name, participant=participant.identity, record_path=TURN_LOG)
+    if isinstance(agent_llm, SpeculativeLLM):
+        agent_llm.attach(session)
+    if (voice := participant.attributes.get("voice")) and isinstance(agent_tts, CosyVoiceTTS):
+        # เสียงที่ยังไม่เคย ingest ถูก extract บน inference thread ก่อนเริ่ม session
+        await agent_tts.aupdate_options(voice=voice)
     
     # เริ่มทำงาน
     # start() เป็น async function
@@ -121,4 +193,24 @@ async def entrypoint(ctx: JobContext):
         await asyncio.sleep(1)
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    # job ละ process ลูก (AGENT_JOB_EXECUTOR=process) ต้องใช้ multiprocess mode ของ prometheus_client เพื่อรวม metric จากทุก job
+    # (load_fnc อ่าน queue depth / RTF จาก dir นี้ด้วย จึงตั้งไว้เสมอแม้ไม่เปิด /metrics) แบบ thread ใช้ registry ของ process นี้
+    metrics_options = {}
+    if JOB_EXECUTOR == "process":
+        metrics_options["prometheus_multiproc_dir"] = os.path.join(tempfile.gettempdir(), "livekit-demo-prometheus")
+    if METRICS_PORT:
+        metrics_options["prometheus_port"] = int(METRICS_PORT)
+    cli.run_app(
+        WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # AGENT_JOB_EXECUTOR=thread (default): ทุก job แชร์ model / STT batcher / TTS scheduler ใน process เดียว
+            # process: job ละ process ลูก model โหลดซ้ำทุก process และ batch ข้าม session ไม่ได้ (ดู model_registry.py)
+            job_executor_type=JobExecutorType(JOB_EXECUTOR),
+            initialize_process_timeout=PREWARM_TIMEOUT_S,
+            # ไม่รับ job ใหม่เมื่อคิว inference / RTF / memory / จำนวน job เกิน AGENT_LOAD_THRESHOLD
+            load_fnc=WorkerLoad(),
+            load_threshold=LOAD_THRESHOLD,
+            **metrics_options,
+        )
+    )
\ No newline at end of file
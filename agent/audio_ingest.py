@@ -0,0 +1,228 @@
+import functools
+import math
+
+import numpy as np
+from livekit import rtc
+from numpy.lib.stride_tricks import sliding_window_view
+
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+
+
+class PolyphaseResampler:
+    # Resample อัตราส่วน up/down ด้วย FIR (windowed sinc, Kaiser) แบบ polyphase
+    # ออกแบบ filter ครั้งเดียวต่อคู่ sample rate แล้วใช้ซ้ำ (ผลเทียบเท่า scipy.signal.resample_poly)
+    def __init__(self, src_rate: int, dst_rate: int, *, zeros: int = 10, beta: float = 5.0, block: int = 8192):
+        g = math.gcd(src_rate, dst_rate)
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.up = dst_rate // g
+        self.down = src_rate // g
+        self._block = block
+
+        max_rate = max(self.up, self.down)
+        self._half_len = zeros * max_rate
+        n = np.arange(-self._half_len, self._half_len + 1, dtype=np.float64)
+        cutoff = 1.0 / max_rate
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), beta) * self.up
+
+        # จัด filter เป็น bank[phase, tap] กลับด้าน tap ไว้แล้ว เพื่อ dot กับหน้าต่าง input ตรงๆ
+        taps = -(-len(h) // self.up)
+        padded = np.zeros(taps * self.up, dtype=np.float64)
+        padded[:len(h)] = h
+        self._bank = padded.reshape(taps, self.up).T[:, ::-1].astype(np.float32).copy()
+        self._taps = taps
+
+    def output_length(self, n_in: int) -> int:
+        return -(-n_in * self.up // self.down)
+
+    def resample(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        n_out = self.output_length(len(x))
+        if out is None:
+            out = np.empty(n_out, dtype=np.float32)
+        out = out[:n_out]
+        if n_out == 0:
+            return out
+
+        # ต่อขอบด้วยศูนย์ให้หน้าต่างของ filter ไม่หลุดช่วง
+        pad = self._taps
+        xp = np.zeros(len(x) + 2 * pad, dtype=np.float32)
+        xp[pad:pad + len(x)] = x
+        windows = sliding_window_view(xp, self._taps)
+
+        # output ที่ index ห่างกัน up ตัวใช้ phase เดียวกัน และตำแหน่ง input ขยับทีละ down
+        # จึงคำนวณทีละ phase ได้ด้วย strided view (ไม่ copy) + einsum ครั้งเดียว
+        for r in range(min(self.up, n_out)):
+            m = r * self.down + self._half_len
+            phase = m % self.up
+            start = (m - phase) // self.up + pad - self._taps + 1
+            dst = out[r::self.up]
+            np.einsum("ij,j->i", windows[start:start + len(dst) * self.down:self.down], self._bank[phase], out=dst)
+        return out
+
+
+@functools.lru_cache(maxsize=16)
+def get_resampler(src_rate: int, dst_rate: int) -> PolyphaseResampler:
+    return PolyphaseResampler(src_rate, dst_rate)
+
+
+def _frames_to_mono(frames: list[rtc.AudioFrame], num_channels: int, out: np.ndarray) -> None:
+    # เขียน int16 ของแต่ละ frame ลงตำแหน่งของมันใน out (float32) โดยตรง ไม่ต่อ bytes ทั้ง utterance ก่อน
+    # frame.data เป็น memoryview บน buffer ของ frame asarray ได้ view ไม่ copy แล้วคูณ scale ครั้งเดียวทั้งก้อน
+    pos = 0
+    for f in frames:
+        n = f.samples_per_channel
+        if num_channels == 1:
+            out[pos:pos + n] = np.asarray(f.data)
+        else:
+            np.sum(np.asarray(f.data).reshape(n, num_channels), axis=1, dtype=np.float32, out=out[pos:pos + n])
+        pos += n
+    out *= _INT16_SCALE / num_channels if num_channels > 1 else _INT16_SCALE
+
+
+def _runs(frames: list[rtc.AudioFrame]) -> list[tuple[list[rtc.AudioFrame], int, int]]:
+    # แบ่ง frame ที่ติดกันและมี format เดียวกันเป็นกลุ่ม (ปกติมีกลุ่มเดียว)
+    fmts = [(f.sample_rate, f.num_channels) for f in frames]
+    if fmts.count(fmts[0]) == len(fmts):
+        return [(frames, *fmts[0])]
+    runs = []
+    for f, fmt in zip(frames, fmts):
+        if runs and runs[-1][1:] == fmt:
+            runs[-1][0].append(f)
+        else:
+            runs.append(([f], *fmt))
+    return runs
+
+
+def ingest_frames(frames: rtc.AudioFrame | list[rtc.AudioFrame], target_rate: int) -> np.ndarray:
+    # รวม frame เป็น float32 mono ที่ target_rate ใน buffer เดียวที่จองไว้ล่วงหน้า
+    # downmix ระหว่างแปลง แล้ว resample ด้วย filter ที่ cache ไว้ถ้า rate ไม่ตรง
+    if isinstance(frames, rtc.AudioFrame):
+        frames = [frames]
+    if not frames:
+        return np.zeros(0, dtype=np.float32)
+
+    runs = _runs(frames)
+    lengths = [sum(f.samples_per_channel for f in run) for run, _, _ in runs]
+    sizes = [n if rate == target_rate else get_resampler(rate, target_rate).output_length(n) for (_, rate, _), n in zip(runs, lengths)]
+
+    buf = np.empty(sum(sizes), dtype=np.float32)
+    pos = 0
+    for (run, rate, channels), n, size in zip(runs, lengths, sizes):
+        dst = buf[pos:pos + size]
+        if rate == target_rate:
+            _frames_to_mono(run, channels, dst)
+        else:
+            mono = np.empty(n, dtype=np.float32)
+            _frames_to_mono(run, channels, mono)
+            get_resampler(rate, target_rate).resample(mono, out=dst)
+        pos += size
+    return buf
+
+
+class AudioAccumulator:
+    # buffer float32 ที่ขยายแบบ doubling สำหรับเก็บเสียงระหว่าง utterance (streaming STT)
+    # view() คืน slice ของ buffer เดิม ไม่ต้อง concatenate ทุกครั้งที่ decode
+    def __init__(self, target_rate: int, initial_s: float = 10.0):
+        self._rate = target_rate
+        self._buf = np.empty(int(target_rate * initial_s), dtype=np.float32)
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def append_frames(self, frames: list[rtc.AudioFrame]) -> None:
+        if not frames:
+            return
+        runs = _runs(frames)
+        if len(runs) == 1 and runs[0][1] == self._rate:
+            _frames_to_mono(frames, runs[0][2], self._reserve(sum(f.samples_per_channel for f in frames)))
+        else:
+            audio = ingest_frames(frames, self._rate)
+            self._reserve(len(audio))[:] = audio
+
+    def view(self, start: int = 0, end: int | None = None) -> np.ndarray:
+        end = self._len if end is None else min(end, self._len)
+        return self._buf[start:end]
+
+    def _reserve(self, n: int) -> np.ndarray:
+        need = self._len + n
+        if need > len(self._buf):
+            grown = np.empty(max(need, 2 * len(self._buf)), dtype=np.float32)
+            grown[:self._len] = self._buf[:self._len]
+            self._buf = grown
+        dst = self._buf[self._len:need]
+        self._len = need
+        return dst
+
+
+class StreamResampler:
+    # resample ต่อเนื่องทีละ chunk ด้วย filter เดียวกับ PolyphaseResampler
+    # เก็บ input ที่ยังต้องใช้ไว้ระหว่าง chunk ผลรวมของทุก chunk + flush() เท่ากับ resample ทั้งก้อน
+    # input เก็บใน buffer เดียวที่ใช้ซ้ำ ([_lo, _hi) คือส่วนที่ยังใช้) ขยายแบบ doubling เมื่อไม่พอ
+    def __init__(self, src_rate: int, dst_rate: int, initial: int = 4096):
+        self._r = get_resampler(src_rate, dst_rate)
+        self._pad = self._r._taps
+        self._buf = np.zeros(max(initial, 4 * self._pad), dtype=np.float32)
+        self._lo = 0
+        self._hi = self._pad  # zero pad ด้านซ้าย
+        self._buf_start = 0  # index (ในพิกัดที่ pad แล้ว) ของ self._buf[self._lo]
+        self._n_in = 0
+        self._n_out = 0
+
+    def _window_start(self, n: int) -> tuple[int, int]:
+        r = self._r
+        m = n * r.down + r._half_len
+        phase = m % r.up
+        return (m - phase) // r.up + self._pad - r._taps + 1, phase
+
+    def _append(self, n: int) -> np.ndarray:
+        # คืน slice ว่างยาว n ต่อท้ายข้อมูลที่ยังใช้ ย้ายข้อมูลกลับไปต้น buffer ก่อนจะขยาย
+        live = self._hi - self._lo
+        if self._hi + n > len(self._buf):
+            if live + n > len(self._buf):
+                grown = np.empty(max(live + n, 2 * len(self._buf)), dtype=np.float32)
+                grown[:live] = self._buf[self._lo:self._hi]
+                self._buf = grown
+            else:
+                self._buf[:live] = self._buf[self._lo:self._hi]
+            self._lo, self._hi = 0, live
+        dst = self._buf[self._hi:self._hi + n]
+        self._hi += n
+        return dst
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        self._append(len(x))[:] = x
+        self._n_in += len(x)
+        return self._emit(None)
+
+    def flush(self) -> np.ndarray:
+        self._append(self._pad)[:] = 0.0
+        return self._emit(self._r.output_length(self._n_in))
+
+    def _emit(self, limit: int | None) -> np.ndarray:
+        r = self._r
+        live = self._buf[self._lo:self._hi]
+        # output n ใช้ input ถึง index base_n + pad (รวม) ต้องมีข้อมูลถึงตรงนั้นแล้วเท่านั้น
+        last = self._buf_start + len(live) - self._pad - 1
+        n_end = max(self._n_out, -(-((last + 1) * r.up - r._half_len) // r.down))
+        if limit is not None:
+            n_end = min(n_end, limit)
+        count = max(0, n_end - self._n_out)
+        out = np.empty(count, dtype=np.float32)
+
+        if count:
+            windows = sliding_window_view(live, r._taps)
+            for k in range(min(r.up, count)):
+                start, phase = self._window_start(self._n_out + k)
+                start -= self._buf_start
+                dst = out[k::r.up]
+                np.einsum("ij,j->i", windows[start:start + len(dst) * r.down:r.down], r._bank[phase], out=dst)
+            self._n_out = n_end
+
+        # ทิ้ง input ที่ output ถัดไปไม่ใช้แล้ว (แค่เลื่อน _lo ไม่ copy)
+        keep_from = min(self._window_start(self._n_out)[0] - self._buf_start, len(live))
+        if keep_from > 0:
+            self._lo += keep_from
+            self._buf_start += keep_from
+        return out
@@ -0,0 +1,82 @@
+# เทียบ ingest_frames กับวิธีเดิม (join bytes -> frombuffer -> astype -> /32768)
+#
+#   python bench_audio_ingest.py --seconds 5 --repeat 50
+import argparse
+import json
+import time
+
+import numpy as np
+from livekit import rtc
+
+from audio_ingest import PolyphaseResampler, ingest_frames
+
+
+def make_frames(seconds: float, sample_rate: int, num_channels: int, frame_ms: int = 10) -> list[rtc.AudioFrame]:
+    rng = np.random.default_rng(0)
+    spf = sample_rate * frame_ms // 1000
+    n_frames = int(seconds * 1000 / frame_ms)
+    pcm = (rng.standard_normal(n_frames * spf * num_channels) * 3000).astype(np.int16)
+    step = spf * num_channels
+    return [rtc.AudioFrame(pcm[i * step:(i + 1) * step].tobytes(), sample_rate, num_channels, spf) for i in range(n_frames)]
+
+
+def legacy_path(frames: list[rtc.AudioFrame]) -> np.ndarray:
+    raw_bytes = b"".join([f.data.tobytes() for f in frames])
+    return np.frombuffer(raw_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def legacy_resample(frames: list[rtc.AudioFrame]) -> np.ndarray:
+    # วิธีเดิมใน patched_load_wav: สร้าง torchaudio Resample ใหม่ทุกครั้ง
+    import torch
+    import torchaudio
+    audio = legacy_path(frames).reshape(-1, frames[0].num_channels).mean(axis=1)
+    tensor = torch.from_numpy(audio).unsqueeze(0)
+    return torchaudio.transforms.Resample(orig_freq=frames[0].sample_rate, new_freq=16000)(tensor)[0].numpy()
+
+
+def timeit(fn, frames, repeat: int) -> float:
+    fn(frames)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(frames)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for sample_rate, num_channels in [(16000, 1), (48000, 1), (48000, 2)]:
+        frames = make_frames(args.seconds, sample_rate, num_channels)
+        row = {
+            "sample_rate": sample_rate,
+            "num_channels": num_channels,
+            "ingest_ms": timeit(lambda f: ingest_frames(f, 16000), frames, args.repeat),
+        }
+        if (sample_rate, num_channels) == (16000, 1):
+            # วิธีเดิมถูกต้องเฉพาะกรณี 16 kHz mono
+            row["legacy_ms"] = timeit(legacy_path, frames, args.repeat)
+        else:
+            try:
+                row["legacy_torchaudio_ms"] = timeit(legacy_resample, frames, args.repeat)
+            except ImportError:
+                pass
+        results.append(row)
+        print(", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+
+    # ต้นทุนการออกแบบ filter ที่ cache ไว้ (จ่ายครั้งเดียวต่อคู่ rate)
+    start = time.perf_counter()
+    PolyphaseResampler(48000, 16000)
+    print(f"filter design 48k->16k: {(time.perf_counter() - start) * 1000:.3f} ms (cached after first use)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# RTF และคุณภาพของแต่ละ inference backend (torch fp32 / int8 / onnx) บน CPU
+#
+#   python bench_backends.py                                   # ทุก backend ทั้ง STT และ TTS
+#   python bench_backends.py --corpus clips/ --suites stt      # เสียงจริง (ความตรงของ transcript มีความหมายกว่า)
+#   python bench_backends.py --tts-backends torch,int8 --json backends.json
+#
+# คุณภาพเทียบกับ backend แรกในรายการ (ปกติคือ torch):
+#   STT  transcript agreement = 1 - character error rate ระหว่าง transcript ของ backend กับ reference
+#   TTS  spectral distance = RMS ของผลต่าง log spectrum เฉลี่ยทั้งประโยค (dB) ไม่ขึ้นกับความยาว/จังหวะ
+#        ที่ต่างกันเพราะ LM สุ่ม token (ตั้ง seed เดียวกันทุก backend แต่ int8 ยังได้ token ต่างกันได้)
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmark import SENTENCES, SAMPLE_RATE, git_commit, recorded_clips, summarize, synthetic_clips
+
+
+def edit_distance(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def agreement(text: str, reference: str) -> float:
+    if not reference:
+        return 1.0 if not text else 0.0
+    return max(0.0, 1.0 - edit_distance(text, reference) / len(reference))
+
+
+def average_log_spectrum(pcm: bytes, n_fft: int = 1024) -> np.ndarray:
+    audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    if len(audio) < n_fft:
+        audio = np.pad(audio, (0, n_fft - len(audio)))
+    hop = n_fft // 2
+    n = 1 + (len(audio) - n_fft) // hop
+    frames = np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::hop][:n] * np.hanning(n_fft)
+    power = np.square(np.abs(np.fft.rfft(frames, axis=1))).mean(axis=0)
+    return 10 * np.log10(power + 1e-10)
+
+
+def spectral_distance_db(pcm: bytes, reference: bytes) -> float:
+    return float(np.sqrt(np.mean(np.square(average_log_spectrum(pcm) - average_log_spectrum(reference)))))
+
+
+async def bench_stt(backends: list[str], clips: dict[str, np.ndarray], repeat: int) -> tuple[dict, dict]:
+    from fun_audio import SenseVoiceSTT
+
+    metrics, transcripts = {}, {}
+    for backend in backends:
+        stt_ = SenseVoiceSTT(backend=backend)
+        if stt_._batcher is None:
+            raise RuntimeError(f"SenseVoice ({backend}) not available")
+        await stt_._decode(next(iter(clips.values())), "th")  # warmup
+        rtf, texts = [], {}
+        for name, audio in clips.items():
+            for _ in range(repeat):
+                start = time.perf_counter()
+                texts[name] = await stt_._decode(audio, "th")
+                rtf.append((time.perf_counter() - start) / (len(audio) / SAMPLE_RATE))
+        transcripts[backend] = texts
+        reference = transcripts[backends[0]]
+        metrics[f"stt.{backend}.rtf"] = summarize(rtf, "x")
+        metrics[f"stt.{backend}.agreement"] = summarize([agreement(texts[n], reference[n]) for n in clips], "ratio")
+    return metrics, transcripts
+
+
+async def synthesize(tts_, text: str, seed: int) -> tuple[bytes, float]:
+    import torch
+
+    torch.manual_seed(seed)
+    start = time.perf_counter()
+    pcm = b"".join([ev.frame.data.tobytes() async for ev in tts_.synthesize(text)])
+    return pcm, time.perf_counter() - start
+
+
+async def bench_tts(backends: list[str], repeat: int) -> dict:
+    from fun_audio import CosyVoiceTTS
+
+    metrics, reference = {}, {}
+    for backend in backends:
+        tts_ = CosyVoiceTTS(use_cache=False, backend=backend)
+        if tts_._model is None:
+            raise RuntimeError(f"CosyVoice ({backend}) not available")
+        try:
+            await synthesize(tts_, SENTENCES[0], seed=0)  # warmup
+            rtf, distance = [], []
+            for i, text in enumerate(SENTENCES):
+                for r in range(repeat):
+                    pcm, elapsed = await synthesize(tts_, text, seed=r)
+                    audio_s = len(pcm) / 2 / tts_.sample_rate
+                    rtf.append(elapsed / audio_s if audio_s else float("nan"))
+                    key = (i, r)
+                    if backend == backends[0]:
+                        reference[key] = pcm
+                    distance.append(spectral_distance_db(pcm, reference[key]))
+        finally:
+            await tts_.aclose()
+        metrics[f"tts.{backend}.rtf"] = summarize(rtf, "x")
+        metrics[f"tts.{backend}.spectral_distance"] = summarize(distance, "dB")
+    return metrics
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", default="stt,tts")
+    parser.add_argument("--stt-backends", default="torch,int8,onnx", help="first entry is the quality reference")
+    parser.add_argument("--tts-backends", default="torch,int8,onnx", help="first entry is the quality reference")
+    parser.add_argument("--corpus", help="directory of recorded .wav clips (any sample rate)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    suites = set(args.suites.split(","))
+    clips = {**synthetic_clips(), **recorded_clips(args.corpus)}
+    metrics: dict[str, dict] = {}
+    skipped: dict[str, str] = {}
+    transcripts = {}
+
+    if "stt" in suites:
+        try:
+            stt_metrics, transcripts = await bench_stt(args.stt_backends.split(","), clips, args.repeat)
+            metrics.update(stt_metrics)
+        except Exception as e:
+            skipped["stt"] = f"{type(e).__name__}: {e}"
+    if "tts" in suites:
+        try:
+            metrics.update(await bench_tts(args.tts_backends.split(","), args.repeat))
+        except Exception as e:
+            skipped["tts"] = f"{type(e).__name__}: {e}"
+
+    for name, s in metrics.items():
+        print(f"{name:<32} n={s['n']:<4} mean={s['mean']:>9.3f}  p50={s['p50']:>9.3f}  p95={s['p95']:>9.3f} {s['unit']}")
+    for suite, reason in skipped.items():
+        print(f"skipped {suite}: {reason}")
+
+    if args.json:
+        results = {
+            "meta": {"commit": git_commit(), "args": vars(args)},
+            "metrics": metrics,
+            "transcripts": transcripts,
+            "skipped": skipped,
+        }
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
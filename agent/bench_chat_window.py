@@ -0,0 +1,101 @@
+# time-to-first-token ตามความยาวสาย มี / ไม่มี ChatWindow (chat_window.py) ด้วย MockLLM ที่คิดเวลา prefill
+#
+#   python bench_chat_window.py                                     # 40 turn (~10 นาที), budget 1500 token
+#   python bench_chat_window.py --budget 1000 --summarizer truncate
+#   python bench_chat_window.py --prefill-tps 30 --num-ctx 4096 --json window.json
+#
+# MockLLM จำลอง Ollama: prompt ส่วนหน้าที่ตรงกับ request ก่อนหน้าไม่ต้อง prefill ใหม่ (KV cache)
+# prompt เกิน num_ctx ทิ้ง cache ทั้งหมด การสรุปใช้ MockLLM ตัวเดียวกัน (แย่ง cache เหมือน Ollama slot เดียว)
+# token ตอบ decode เร็ว (--decode-tps) เพราะวัดแค่ TTFT
+import argparse
+import asyncio
+import copy
+import json
+import random
+import sys
+import time
+
+from livekit.agents.llm import ChatContext
+
+from bench_speculation import QUESTIONS
+from benchmark import git_commit, summarize
+from chat_window import ChatWindow, estimate_tokens
+from mock_llm import Dist, MockLLM, get_profile
+
+SYSTEM_PROMPT = "คุณคือCall center AI อารมณ์ดี ชื่อฟ้าใส พูดภาษาไทยเป็นหลัก สั้นกระชับและเป็นกันเอง ขายของเก่งมาก"
+
+
+async def run_call(args, *, windowed: bool) -> list[dict]:
+    profile = copy.copy(get_profile(args.llm_profile))
+    profile.tokens_per_s = Dist.parse(args.decode_tps)
+    profile.prefill_tokens_per_s = args.prefill_tps
+    profile.num_ctx = args.num_ctx
+    llm_ = MockLLM(profile, seed=args.seed)
+    window = ChatWindow(budget_tokens=args.budget, summarizer=llm_ if args.summarizer == "llm" else None) if windowed else None
+    rng = random.Random(args.seed)
+
+    # เหมือน entrypoint เดิม: system prompt ทั้งใน chat_ctx และ instructions
+    history = ChatContext()
+    history.add_message(role="system", content=SYSTEM_PROMPT)
+    history.add_message(role="system", content=SYSTEM_PROMPT)
+    rows = []
+    for turn in range(args.turns):
+        history.add_message(role="user", content=rng.choice(QUESTIONS))
+        chat_ctx = window.apply(history) if window else history
+        prompt_tokens = sum(estimate_tokens(i.text_content or "") + 4 for i in chat_ctx.items)
+        start = time.perf_counter()
+        ttft, parts = None, []
+        async with llm_.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    ttft = ttft or (time.perf_counter() - start) * 1000
+                    parts.append(chunk.delta.content)
+        history.add_message(role="assistant", content="".join(parts))
+        rows.append({"turn": turn, "ttft_ms": ttft, "prompt_tokens": prompt_tokens})
+        if window:
+            window.schedule_compaction()
+        # ผู้ใช้ฟังคำตอบแล้วพูดต่อ (การสรุปทำในช่วงนี้)
+        await asyncio.sleep(args.think_s)
+    if window:
+        await window.aclose()
+    return rows
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=1500, help="ChatWindow token budget")
+    parser.add_argument("--summarizer", choices=["llm", "truncate"], default="llm")
+    parser.add_argument("--llm-profile", default="ollama-cpu", help="MockLLM profile (name or JSON)")
+    parser.add_argument("--prefill-tps", type=float, default=200.0, help="prompt tokens prefilled per second")
+    parser.add_argument("--num-ctx", type=int, default=2048, help="Ollama context size (0 = unlimited)")
+    parser.add_argument("--decode-tps", default="500")
+    parser.add_argument("--think-s", type=float, default=3.0, help="reply playout + user speaking between turns (s)")
+    parser.add_argument("--bucket", type=int, default=10, help="turns per reported bucket")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    metrics: dict[str, dict] = {}
+    calls = {}
+    for mode in ("full", "window"):
+        rows = await run_call(args, windowed=mode == "window")
+        calls[mode] = rows
+        for lo in range(0, len(rows), args.bucket):
+            bucket = rows[lo:lo + args.bucket]
+            name = f"{mode}.turns_{lo + 1:02d}-{lo + len(bucket):02d}"
+            metrics[f"{name}.ttft"] = summarize([r["ttft_ms"] for r in bucket], "ms")
+            metrics[f"{name}.prompt_tokens"] = summarize([r["prompt_tokens"] for r in bucket], "tokens")
+
+    for name, s in metrics.items():
+        print(f"{name:<40} n={s['n']:<4} mean={s['mean']:>9.1f}  p50={s['p50']:>9.1f}  p95={s['p95']:>9.1f} {s['unit']}")
+
+    if args.json:
+        results = {"meta": {"commit": git_commit(), "args": vars(args)}, "metrics": metrics, "turns": calls}
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
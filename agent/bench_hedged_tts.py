@@ -0,0 +1,128 @@
+# ตรวจ HedgedTTS ว่าได้เสียงจาก engine ที่ถูกต้องเมื่อ primary ล้ม / ช้า / ปกติ ไม่ต้องมี model หรือ internet
+#
+#   python bench_hedged_tts.py
+#   python bench_hedged_tts.py --deadline-ms 300 --json hedged.json
+#
+# secondary เป็น TTS จำลองที่ส่ง tone ที่รู้ค่าไว้ก่อน แต่ละ scenario เทียบ byte ของเสียงที่ HedgedTTS ส่งออก
+# กับเสียงที่ engine ที่ควรชนะส่งออกตรงๆ:
+#   cosyvoice-missing  CosyVoiceTTS ที่ไม่มี model (ต้อง raise ไม่ใช่ push เสียงเงียบ) -> secondary
+#   cosyvoice-silence  เหมือนข้างบนแต่ silence_on_failure=True -> เสียงเงียบของ primary (พฤติกรรมเมื่อใช้ตัวเดียว)
+#   primary-error      primary raise APIConnectionError ทันที -> secondary
+#   primary-slow       primary ได้เสียงหลัง deadline นานกว่า secondary -> secondary
+#   primary-fast       primary ได้เสียงก่อน deadline -> primary และไม่เริ่ม secondary
+# จบด้วย exit code 1 ถ้ามี scenario ที่ไม่ผ่าน
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+from livekit.agents import tts, utils, APIConnectionError, APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS
+
+from benchmark import git_commit
+from hedged_tts import HedgedTTS
+
+SAMPLE_RATE = 22050  # เท่ากับ CosyVoiceTTS ที่ไม่มี model จะได้ไม่ต้อง resample
+
+
+def tone(freq: float, seconds: float) -> bytes:
+    t = np.arange(int(SAMPLE_RATE * seconds), dtype=np.float32) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * freq * t) * 8000).astype(np.int16).tobytes()
+
+
+class FakeTTS(tts.TTS):
+    # ส่ง pcm ทีละ chunk หลังรอ delay_s หรือ raise APIConnectionError ถ้า fail
+    def __init__(self, pcm: bytes, *, delay_s: float = 0.0, fail: bool = False, chunk_bytes: int = 4410):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.pcm = pcm
+        self.delay_s = delay_s
+        self.fail = fail
+        self.chunk_bytes = chunk_bytes
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> tts.ChunkedStream:
+        return FakeStream(self, text, conn_options)
+
+
+class FakeStream(tts.ChunkedStream):
+    def __init__(self, tts_: FakeTTS, text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=tts_, input_text=text, conn_options=conn_options)
+        self._fake = tts_
+
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(request_id=utils.shortuuid("tts_req_"), sample_rate=SAMPLE_RATE, num_channels=1, mime_type="audio/pcm")
+        await asyncio.sleep(self._fake.delay_s)
+        if self._fake.fail:
+            raise APIConnectionError("simulated primary failure")
+        for i in range(0, len(self._fake.pcm), self._fake.chunk_bytes):
+            output_emitter.push(self._fake.pcm[i:i + self._fake.chunk_bytes])
+
+
+async def collect(engine: tts.TTS, text: str) -> bytes:
+    out = bytearray()
+    async with engine.synthesize(text) as stream:
+        async for ev in stream:
+            out += ev.frame.data.tobytes()
+    return bytes(out)
+
+
+def missing_cosyvoice(silence_on_failure: bool) -> tts.TTS:
+    from fun_audio import CosyVoiceTTS
+
+    return CosyVoiceTTS(model_path="missing-model", use_cache=False, silence_on_failure=silence_on_failure)
+
+
+async def run_scenario(name: str, primary: tts.TTS, secondary: FakeTTS, expected: str, deadline_s: float) -> dict:
+    hedged = HedgedTTS(primary, secondary, deadline_s=deadline_s)
+    text = "สวัสดีค่ะ"
+    start = time.perf_counter()
+    try:
+        got = await collect(hedged, text)
+        error = None
+    except Exception as e:
+        got, error = b"", repr(e)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if expected == "secondary":
+        want = secondary.pcm
+    elif expected == "primary-silence":
+        want = np.zeros(SAMPLE_RATE // 2, dtype=np.int16).tobytes()
+    else:
+        want = primary.pcm
+    stats = hedged.stats()
+    ok = error is None and got == want
+    if expected == "primary":
+        ok = ok and stats["hedged"] == 0
+    row = {"scenario": name, "expected": expected, "ok": ok, "elapsed_ms": round(elapsed_ms, 1), "bytes": len(got), "error": error, "stats": stats}
+    print(f"{'PASS' if ok else 'FAIL'} {name:<18} expected={expected:<16} {len(got)} bytes in {elapsed_ms:.0f} ms, hedged={stats['hedged']}" + (f", error={error}" if error else ""))
+    return row
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deadline-ms", type=float, default=200.0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    deadline_s = args.deadline_ms / 1000
+
+    primary_pcm, secondary_pcm = tone(440, 1.0), tone(220, 1.2)
+    scenarios = [
+        ("cosyvoice-missing", lambda: missing_cosyvoice(False), 0.0, "secondary"),
+        ("cosyvoice-silence", lambda: missing_cosyvoice(True), 0.0, "primary-silence"),
+        ("primary-error", lambda: FakeTTS(primary_pcm, fail=True), 0.0, "secondary"),
+        ("primary-slow", lambda: FakeTTS(primary_pcm, delay_s=deadline_s * 4), deadline_s / 4, "secondary"),
+        ("primary-fast", lambda: FakeTTS(primary_pcm, delay_s=deadline_s / 4), 0.0, "primary"),
+    ]
+    rows = []
+    for name, make_primary, secondary_delay, expected in scenarios:
+        secondary = FakeTTS(secondary_pcm, delay_s=secondary_delay)
+        rows.append(await run_scenario(name, make_primary(), secondary, expected, deadline_s))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": {"commit": git_commit(), "args": vars(args)}, "scenarios": rows}, f, indent=2, ensure_ascii=False)
+    return 0 if all(row["ok"] for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,107 @@
+# ตรวจ CachedLLM (llm_cache.py) ว่าตอบจาก cache เฉพาะเมื่อบทสนทนาก่อนหน้าเหมือนกัน ด้วย MockLLM ไม่ต้องมี Ollama
+#
+#   python bench_llm_cache.py
+#   python bench_llm_cache.py --context-items 4 --json llm_cache.json
+#
+# แต่ละ scenario ส่ง request สองครั้ง (เหมือนสองสายที่แชร์ cache ใน process เดียวกัน) แล้วดูว่าครั้งที่สอง hit หรือ miss:
+#   faq-first-turn     คำถามเดียวกันเป็น turn แรก ต่างกันแค่คำลงท้าย -> hit
+#   same-history       "ใช่ครับ" หลังคำถามเดียวกันของเอเจนต์ -> hit
+#   other-assistant    "ใช่ครับ" / "ใช่ค่ะ" หลังคำถามต่างกันของเอเจนต์ -> miss
+#   other-user-turn    "เอาสองชิ้นครับ" หลังเอเจนต์ถามเหมือนกัน แต่ผู้ใช้พูดถึงสินค้าต่างกัน -> miss
+#   first-vs-later     คำถามเดียวกันเป็น turn แรก กับหลังคุยกันไปแล้ว -> miss
+# จบด้วย exit code 1 ถ้ามี scenario ที่ไม่ผ่าน
+import argparse
+import asyncio
+import json
+import sys
+
+from livekit.agents.llm import ChatContext
+
+from benchmark import git_commit
+from llm_cache import DEFAULT_CONTEXT_ITEMS, CachedLLM, LLMResponseCache
+from mock_llm import MockLLM
+
+SYSTEM_PROMPT = "คุณคือCall center AI อารมณ์ดี ชื่อฟ้าใส พูดภาษาไทยเป็นหลัก สั้นกระชับและเป็นกันเอง ขายของเก่งมาก"
+
+
+def conversation(*turns: tuple[str, str]) -> ChatContext:
+    # turns = (role, text) ข้อความสุดท้ายคือคำพูดของผู้ใช้ที่ส่งให้ LLM
+    chat_ctx = ChatContext()
+    chat_ctx.add_message(role="system", content=SYSTEM_PROMPT)
+    for role, text in turns:
+        chat_ctx.add_message(role=role, content=text)
+    return chat_ctx
+
+
+SCENARIOS = [
+    (
+        "faq-first-turn",
+        conversation(("user", "ร้านเปิดกี่โมงครับ")),
+        conversation(("user", "ร้านเปิดกี่โมงคะ")),
+        "hit",
+    ),
+    (
+        "same-history",
+        conversation(("user", "มีโปรโมชั่นไหมครับ"), ("assistant", "ลดทุกชิ้นห้าสิบเปอร์เซ็นต์ค่ะ สนใจรับรายละเอียดทางไลน์ไหมคะ"), ("user", "ใช่ครับ")),
+        conversation(("user", "มีโปรโมชั่นไหมคะ"), ("assistant", "ลดทุกชิ้นห้าสิบเปอร์เซ็นต์ค่ะ สนใจรับรายละเอียดทางไลน์ไหมคะ"), ("user", "ใช่ค่ะ")),
+        "hit",
+    ),
+    (
+        "other-assistant",
+        conversation(("user", "ส่งต่างจังหวัดได้ไหมครับ"), ("assistant", "ได้ค่ะ ต้องการสั่งเลยไหมคะ"), ("user", "ใช่ครับ")),
+        conversation(("user", "ส่งต่างจังหวัดได้ไหมครับ"), ("assistant", "ได้ค่ะ ต้องการยกเลิกคำสั่งซื้อเดิมไหมคะ"), ("user", "<|th|>ใช่ค่ะ")),
+        "miss",
+    ),
+    (
+        "other-user-turn",
+        conversation(("user", "อยากได้เสื้อสีแดงครับ"), ("assistant", "รับกี่ชิ้นคะ"), ("user", "เอาสองชิ้นครับ")),
+        conversation(("user", "อยากได้รองเท้าเบอร์สี่สิบครับ"), ("assistant", "รับกี่ชิ้นคะ"), ("user", "<|th|>เอาสองชิ้นครับ")),
+        "miss",
+    ),
+    (
+        "first-vs-later",
+        conversation(("user", "ราคาเท่าไหร่ครับ")),
+        conversation(("user", "มีเสื้อสีแดงไหมครับ"), ("assistant", "มีค่ะ"), ("user", "ราคาเท่าไหร่ครับ")),
+        "miss",
+    ),
+]
+
+
+async def ask(llm_: CachedLLM, chat_ctx: ChatContext) -> str:
+    parts = []
+    async with llm_.chat(chat_ctx=chat_ctx) as stream:
+        async for chunk in stream:
+            if chunk.delta and chunk.delta.content:
+                parts.append(chunk.delta.content)
+    return "".join(parts)
+
+
+async def run_scenario(name: str, first: ChatContext, second: ChatContext, expected: str, context_items: int) -> dict:
+    # cache ใหม่ต่อ scenario ให้ผลไม่ขึ้นกับ scenario ก่อนหน้า
+    llm_ = CachedLLM(MockLLM("instant", seed=0), cache=LLMResponseCache(), context_items=context_items)
+    first_reply = await ask(llm_, first)
+    await ask(llm_, second)
+    stats = llm_.cache_stats()
+    got = "hit" if stats["hits"] else "miss"
+    ok = got == expected and stats["misses"] == (1 if got == "hit" else 2)
+    print(f"{'PASS' if ok else 'FAIL'} {name:<16} expected={expected:<4} got={got:<4} {stats}")
+    await llm_.aclose()
+    return {"scenario": name, "expected": expected, "got": got, "ok": ok, "first_reply": first_reply, "stats": stats}
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--context-items", type=int, default=DEFAULT_CONTEXT_ITEMS, help="messages before the utterance that are part of the cache key")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rows = [await run_scenario(name, first, second, expected, args.context_items) for name, first, second, expected in SCENARIOS]
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": {"commit": git_commit(), "args": vars(args)}, "scenarios": rows}, f, indent=2, ensure_ascii=False)
+    return 0 if all(row["ok"] for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,190 @@
+# hit rate และเวลาที่ประหยัดได้ของ speculative LLM (speculative_llm.py) ด้วย MockLLM ไม่ต้องมี model / Ollama
+#
+#   python bench_speculation.py                                  # ollama-cpu, ASR ผิด 10%
+#   python bench_speculation.py --llm-profile fast --asr-error 0.3 --threshold 0.85
+#   python bench_speculation.py --turns 50 --json speculation.json
+#   python bench_speculation.py --max-per-turn 3                 # speculation จาก interim ด้วย (default: final อย่างเดียว)
+#   python bench_speculation.py --window-budget 300              # history โตทุก turn ผ่าน ChatWindow เหมือน WindowedAgent
+#
+# จำลอง turn ตาม event ของ AgentSession: ผู้ใช้พูด -> interim ทุก --interim-interval
+# -> end of speech -> final transcript (+--transcript-delay) -> framework เรียก chat() (+--endpointing-delay)
+# interim ตามหลังเสียงพูดจริงหนึ่งช่วง decode และ final อาจต่างจาก interim (คำลงท้าย / ASR ผิดตัวอักษร)
+# เทียบ time-to-first-token นับจาก chat() ระหว่างมีและไม่มี speculation
+# hit_ratio นับ speculation ที่ถูกแทนที่ก่อน turn จบเป็นตัวหารด้วย wasted_ms_per_turn = เวลา generation ที่ทิ้งต่อ turn
+# --window-budget: speculation ต้องเดาด้วย prompt ที่ผ่าน window แล้ว transcript ที่ chat() ได้คือ final ที่เดาไว้
+# จึงต้องไม่มี miss เลย (miss = prefix ไม่ตรงกับ prompt จริง) ไม่อย่างนั้นจบด้วย exit code 1
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import types
+
+from livekit.agents.llm import ChatContext
+
+from benchmark import git_commit, summarize
+from chat_window import ChatWindow
+from mock_llm import MockLLM
+from speculative_llm import DEFAULT_MAX_PER_TURN, DEFAULT_THRESHOLD, SpeculativeLLM
+
+QUESTIONS = [
+    "ตอนนี้มีโปรโมชั่นอะไรบ้างครับ",
+    "ร้านเปิดกี่โมงถึงกี่โมงคะ",
+    "ส่งของต่างจังหวัดใช้เวลากี่วันครับ",
+    "จ่ายเงินปลายทางได้ไหมคะ",
+    "สินค้าชิ้นนี้มีสีอื่นไหมครับ",
+    "ถ้าของเสียหายระหว่างส่งต้องทำยังไงคะ",
+    "สั่งวันนี้ได้ส่วนลดกี่เปอร์เซ็นต์ครับ",
+    "อยากเปลี่ยนที่อยู่จัดส่งค่ะ",
+]
+PARTICLES = ["ครับ", "คะ", "ค่ะ", "นะครับ", ""]
+THAI_CHARS = "กขคงจฉชซญดตถทธนบปผพฟมยรลวศสหอะาิีึืุู่้"
+
+
+# คำตอบของเอเจนต์ที่ต่อท้าย history หลังแต่ละ turn (--window-budget)
+REPLY = "ได้เลยค่ะ ตอนนี้ร้านมีโปรโมชั่นลดราคาสินค้าหลายรายการ สนใจสินค้าประเภทไหนเป็นพิเศษไหมคะ"
+
+
+class SimSession:
+    # AgentSession จำลอง: แค่ event emitter + current_agent ที่ SpeculativeLLM.attach() ใช้
+    def __init__(self, chat_ctx: ChatContext, window: ChatWindow | None = None):
+        self._handlers: dict[str, list] = {}
+        self.current_agent = types.SimpleNamespace(chat_ctx=chat_ctx, tools=[])
+        if window is not None:
+            self.current_agent.window = window
+
+    def on(self, event: str, callback) -> None:
+        self._handlers.setdefault(event, []).append(callback)
+
+    def emit(self, event: str, **fields) -> None:
+        ev = types.SimpleNamespace(created_at=time.time(), **fields)
+        for callback in self._handlers.get(event, []):
+            callback(ev)
+
+
+def asr_variant(text: str, rng: random.Random, error_rate: float) -> str:
+    # transcript สุดท้ายที่ต่างจาก interim: เปลี่ยนคำลงท้าย และ (ตาม error_rate) แทนตัวอักษรหนึ่งตัว
+    for particle in PARTICLES[:-1]:
+        if text.endswith(particle):
+            text = text[: -len(particle)] + rng.choice(PARTICLES)
+            break
+    if rng.random() < error_rate and len(text) > 2:
+        i = rng.randrange(len(text))
+        text = text[:i] + rng.choice(THAI_CHARS) + text[i + 1:]
+    return text
+
+
+def build_turn(question: str, rng: random.Random, args) -> list[tuple[float, str, dict]]:
+    # (เวลานับจากเริ่มพูด, event, fields) เรียงตามเวลา event "chat" = framework เรียก LLM
+    speech_s = len(question) * args.char_ms / 1000
+    events = [(0.0, "user_state_changed", {"old_state": "listening", "new_state": "speaking"})]
+    t = args.interim_interval
+    while t < speech_s:
+        # interim ครอบคลุมเสียงถึงรอบ decode ก่อนหน้า ASR อาจผิดได้เหมือน final
+        heard = question[: int(len(question) * (t - args.interim_interval / 2) / speech_s)]
+        if heard:
+            events.append((t, "user_input_transcribed", {"transcript": asr_variant(heard, rng, args.asr_error), "is_final": False}))
+        t += args.interim_interval
+    final = asr_variant(question, rng, args.asr_error)
+    events.append((speech_s, "user_state_changed", {"old_state": "speaking", "new_state": "listening"}))
+    events.append((speech_s + args.transcript_delay, "user_input_transcribed", {"transcript": final, "is_final": True}))
+    events.append((speech_s + args.endpointing_delay, "chat", {"transcript": final}))
+    return events
+
+
+async def run_turn(llm_, session: SimSession | None, events: list, base_ctx: ChatContext, window: ChatWindow | None = None) -> float:
+    start = time.perf_counter()
+    ttft = float("nan")
+    for at, event, fields in events:
+        await asyncio.sleep(max(0.0, start + at - time.perf_counter()))
+        if event != "chat":
+            if session is not None:
+                session.emit(event, **fields)
+            continue
+        chat_ctx = base_ctx.copy()
+        chat_ctx.add_message(role="user", content=fields["transcript"])
+        if window is not None:
+            # เหมือน WindowedAgent.llm_node
+            chat_ctx = window.apply(chat_ctx)
+        requested = time.perf_counter()
+        async with llm_.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    ttft = (time.perf_counter() - requested) * 1000
+                    break
+        if window is not None:
+            window.schedule_compaction()
+            base_ctx.add_message(role="user", content=fields["transcript"])
+            base_ctx.add_message(role="assistant", content=REPLY)
+    return ttft
+
+
+def new_call(args) -> tuple[ChatContext, ChatWindow | None]:
+    # history ใหม่ต่อการรันแต่ละแบบ (--window-budget ต่อ turn ท้าย history) สรุปแบบตัดข้อความ: compaction เสร็จก่อน turn ถัดไป
+    base_ctx = ChatContext()
+    base_ctx.add_message(role="system", content="คุณคือ call center AI ชื่อฟ้าใส")
+    return base_ctx, ChatWindow(budget_tokens=args.window_budget) if args.window_budget > 0 else None
+
+
+async def bench(args) -> tuple[dict, dict, dict | None]:
+    rng = random.Random(args.seed)
+    turns = [build_turn(rng.choice(QUESTIONS), rng, args) for _ in range(args.turns)]
+
+    metrics = {}
+    # baseline: LLM เดียวกัน (seed เดียวกัน) ไม่มี speculation
+    baseline_llm = MockLLM(args.llm_profile, seed=args.seed)
+    base_ctx, window = new_call(args)
+    ttft = [await run_turn(baseline_llm, None, events, base_ctx, window) for events in turns]
+    metrics["speculation.off.ttft"] = summarize(ttft, "ms")
+
+    spec_llm = SpeculativeLLM(MockLLM(args.llm_profile, seed=args.seed), threshold=args.threshold, max_per_turn=args.max_per_turn)
+    base_ctx, window = new_call(args)
+    session = SimSession(base_ctx, window)
+    spec_llm.attach(session)
+    ttft = [await run_turn(spec_llm, session, events, base_ctx, window) for events in turns]
+    metrics["speculation.on.ttft"] = summarize(ttft, "ms")
+    await spec_llm.aclose()
+    window_stats = None
+    if window is not None:
+        await window.aclose()
+        window_stats = window.stats()
+    return metrics, spec_llm.stats(), window_stats
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-profile", default="ollama-cpu", help="MockLLM profile (name or JSON)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--max-per-turn", type=int, default=DEFAULT_MAX_PER_TURN, help="speculations on interim transcripts per turn (0 = final only)")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--asr-error", type=float, default=0.1, help="chance that a transcript has one wrong character")
+    parser.add_argument("--char-ms", type=float, default=90.0, help="speaking time per character")
+    parser.add_argument("--interim-interval", type=float, default=0.6, help="seconds between interim transcripts")
+    parser.add_argument("--transcript-delay", type=float, default=0.15, help="end of speech -> final transcript (s)")
+    parser.add_argument("--endpointing-delay", type=float, default=0.5, help="end of speech -> LLM request (s)")
+    parser.add_argument("--window-budget", type=int, default=0, help="grow the history through a ChatWindow with this token budget (0 = fixed history)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    metrics, stats, window_stats = await bench(args)
+    for name, s in metrics.items():
+        print(f"{name:<24} n={s['n']:<4} mean={s['mean']:>9.1f}  p50={s['p50']:>9.1f}  p95={s['p95']:>9.1f} {s['unit']}")
+    print(json.dumps(stats, indent=2))
+    ok = True
+    if window_stats is not None:
+        print(f"window: {json.dumps(window_stats)}")
+        ok = stats["misses"] == 0 and stats["hits"] == args.turns
+        if not ok:
+            print(f"FAIL: {stats['misses']} misses / {stats['hits']} hits in {args.turns} windowed turns (speculated prompt differs from the windowed one)")
+
+    if args.json:
+        results = {"meta": {"commit": git_commit(), "args": vars(args)}, "metrics": metrics, "speculation": stats, "window": window_stats}
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
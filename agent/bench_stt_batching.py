@@ -0,0 +1,118 @@
+# Throughput vs latency ของ SenseVoiceBatcher ที่ 1, 4, 16 utterance พร้อมกัน
+#
+#   python bench_stt_batching.py                       # ใช้ SenseVoiceSmall จริง
+#   python bench_stt_batching.py --wav clip.wav        # ใช้เสียงจริงแทน noise
+#   python bench_stt_batching.py --simulate            # ไม่โหลด model (วัด overhead ของ scheduler)
+#
+# utterance ทุกตัวมาจาก process เดียว ตรงกับ worker ที่รัน job เป็น thread (AGENT_JOB_EXECUTOR=thread, default)
+# ถ้า job ละ process แต่ละ batcher เห็นแค่ session เดียว ผลที่ concurrency > 1 จะไม่เกิดใน production
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from stt_batcher import SenseVoiceBatcher
+
+
+class SimulatedModel:
+    # จำลองต้นทุน forward pass: ค่าคงที่ต่อ batch + ต่อ utterance (time.sleep ปล่อย GIL เหมือน torch)
+    def __init__(self, batch_overhead_ms: float, per_item_ms: float):
+        self._batch_overhead = batch_overhead_ms / 1000.0
+        self._per_item = per_item_ms / 1000.0
+
+    def generate(self, inputs, **kwargs):
+        time.sleep(self._batch_overhead + self._per_item * len(inputs))
+        return [{"key": str(i), "text": "สวัสดีครับ"} for i in range(len(inputs))]
+
+
+def load_audio(path: str | None, seconds: float) -> np.ndarray:
+    if path:
+        import soundfile as sf
+        data, sr = sf.read(path, dtype="float32")
+        if data.ndim > 1:
+            data = data.mean(axis=1)
+        if sr != 16000:
+            raise SystemExit(f"{path}: expected 16 kHz audio, got {sr}")
+        return data
+    rng = np.random.default_rng(0)
+    return (0.05 * rng.standard_normal(int(16000 * seconds))).astype(np.float32)
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_level(batcher: SenseVoiceBatcher, audio: np.ndarray, concurrency: int, rounds: int) -> dict:
+    latencies = []
+
+    async def one() -> None:
+        start = time.perf_counter()
+        await batcher.recognize(audio, "th")
+        latencies.append(time.perf_counter() - start)
+
+    # warmup
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    latencies.clear()
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "utterances": len(latencies),
+        "throughput_utt_per_s": len(latencies) / elapsed,
+        "audio_s_per_s": len(latencies) * len(audio) / 16000 / elapsed,
+        "latency_ms_p50": 1000 * percentile(latencies, 0.5),
+        "latency_ms_p95": 1000 * percentile(latencies, 0.95),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-batch-size", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--wav", help="16 kHz clip to recognize (default: 3 s of noise)")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.simulate:
+        model = SimulatedModel(batch_overhead_ms=60, per_item_ms=25)
+    else:
+        from fun_audio import SenseVoiceSTT
+        model = SenseVoiceSTT()._model
+        if model is None:
+            raise SystemExit("SenseVoice model not available, use --simulate")
+
+    audio = load_audio(args.wav, args.seconds)
+    results = []
+    for max_batch in args.max_batch_size:
+        batcher = SenseVoiceBatcher(model, max_batch_size=max_batch, max_wait_ms=args.max_wait_ms)
+        for concurrency in args.concurrency:
+            row = await run_level(batcher, audio, concurrency, args.rounds)
+            row["max_batch_size"] = max_batch
+            row["batch_size_avg"] = batcher.stats().get("batch_size_avg", 0.0)
+            results.append(row)
+            print(
+                f"max_batch={max_batch:>2} concurrency={concurrency:>2}  "
+                f"{row['throughput_utt_per_s']:7.2f} utt/s  "
+                f"p50={row['latency_ms_p50']:7.1f} ms  p95={row['latency_ms_p95']:7.1f} ms  "
+                f"avg batch={row['batch_size_avg']:.1f}"
+            )
+        batcher.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
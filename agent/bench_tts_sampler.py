@@ -0,0 +1,109 @@
+# token/s ของการสุ่ม speech token ของ CosyVoice LM: loop สุ่มซ้ำเดิม (retry) เทียบ masked (tts_sampler.py)
+#
+#   python bench_tts_sampler.py                                # EOS prob 0, 0.3, 0.7, 0.95
+#   python bench_tts_sampler.py --eos-prob 0.5 --steps 5000 --json sampler.json
+#
+# วัดเฉพาะ sampling_ids (ไม่รวม forward ของ LM) ด้วย ras_sampling ของ CosyVoice ตัวจริง และ score สุ่ม
+# ที่ EOS มี probability ตาม --eos-prob (ภาษาไทย / cross-lingual ที่ LM อยากจบก่อน min_len)
+# tv_distance = ระยะ total variation ระหว่าง histogram ของสองวิธีบน step เดียวกัน (ควรใกล้ 0 ตามจำนวน sample)
+# ยกเว้นเมื่อ EOS prob >= top_p (nucleus มีแต่ EOS): retry ครบ MAX_TRIALS แล้วคืน EOS ส่วน masked สุ่ม token ที่อนุญาต
+import argparse
+import functools
+import json
+import sys
+import time
+import types
+
+import numpy as np
+
+from benchmark import git_commit, summarize
+from bootstrap import COSYVOICE_PATH
+import tts_sampler
+
+
+def make_scores(torch, rng: np.random.Generator, speech_token_size: int, extra: int, eos_prob: float, sharpness: float):
+    # log-probability แบบที่ LM ให้: speech token กระจายแบบหางยาว, stop token อื่นต่ำมาก, EOS ตาม eos_prob
+    logits = rng.standard_normal(speech_token_size + extra) * sharpness
+    logits[speech_token_size + 1:] = -30.0
+    speech = np.exp(logits[:speech_token_size] - logits[:speech_token_size].max()).sum()
+    logits[speech_token_size] = logits[:speech_token_size].max() + np.log(eos_prob / (1 - eos_prob) * speech) if eos_prob > 0 else -30.0
+    return torch.log_softmax(torch.from_numpy(logits).float(), dim=0)
+
+
+def run(lm, sampling_ids, pool: list, steps: int) -> tuple[float, list[int]]:
+    decoded: list = []
+    start = time.perf_counter()
+    for i in range(steps):
+        top_ids = sampling_ids(lm, pool[i % len(pool)], decoded, None, ignore_eos=True)
+        decoded.append(int(top_ids))
+    return steps / (time.perf_counter() - start), decoded
+
+
+def tv_distance(lm, scores, decoded: list, draws: int) -> float:
+    counts = []
+    for sampling_ids in (tts_sampler.retry_sampling_ids, tts_sampler.masked_sampling_ids):
+        ids = [int(sampling_ids(lm, scores, decoded, None, ignore_eos=True)) for _ in range(draws)]
+        counts.append(np.bincount(ids, minlength=len(scores)) / draws)
+    return float(np.abs(counts[0] - counts[1]).sum() / 2)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eos-prob", type=float, nargs="+", default=[0.0, 0.3, 0.7, 0.95])
+    parser.add_argument("--steps", type=int, default=2000, help="tokens per sampler and EOS probability")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--speech-token-size", type=int, default=6561)
+    parser.add_argument("--extra-tokens", type=int, default=200, help="EOS + stop tokens after the speech vocabulary (CosyVoice3)")
+    parser.add_argument("--sharpness", type=float, default=3.0, help="std of speech-token logits")
+    parser.add_argument("--draws", type=int, default=2000, help="samples per sampler for tv_distance")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if COSYVOICE_PATH not in sys.path:
+        sys.path.append(COSYVOICE_PATH)
+    try:
+        import torch
+        from cosyvoice.utils.common import ras_sampling
+    except ImportError as e:
+        print(f"CosyVoice not available: {e}", file=sys.stderr)
+        return 1
+
+    # เหมือน LM ใน cosyvoice3.yaml
+    lm = types.SimpleNamespace(speech_token_size=args.speech_token_size, sampling=functools.partial(ras_sampling, top_p=0.8, top_k=25, win_size=10, tau_r=0.1))
+    rng = np.random.default_rng(args.seed)
+    torch.manual_seed(args.seed)
+
+    metrics: dict[str, dict] = {}
+    samplers = {"retry": tts_sampler.retry_sampling_ids, "masked": tts_sampler.masked_sampling_ids}
+    for eos_prob in args.eos_prob:
+        pool = [make_scores(torch, rng, args.speech_token_size, args.extra_tokens, eos_prob, args.sharpness) for _ in range(32)]
+        for name, sampling_ids in samplers.items():
+            before = tts_sampler.sampler_stats()
+            rates = []
+            for _ in range(args.repeat):
+                rate, decoded = run(lm, sampling_ids, pool, args.steps)
+                rates.append(rate)
+            after = tts_sampler.sampler_stats()
+            prefix = f"eos_{eos_prob:g}.{name}"
+            metrics[f"{prefix}.tokens_per_s"] = summarize(rates, "tokens/s")
+            steps = args.steps * args.repeat
+            if name == "retry":
+                metrics[f"{prefix}.retries_per_token"] = summarize([(after["retries"] - before["retries"]) / steps], "draws")
+            else:
+                metrics[f"{prefix}.avoided_retries_per_token"] = summarize([(after["avoided_retries"] - before["avoided_retries"]) / steps], "draws")
+        metrics[f"eos_{eos_prob:g}.tv_distance"] = summarize([tv_distance(lm, pool[0], decoded[-10:], args.draws)], "tv")
+
+    for name, s in metrics.items():
+        print(f"{name:<40} mean={s['mean']:>11.4f}  p50={s['p50']:>11.4f}  {s['unit']}")
+    print(json.dumps(tts_sampler.sampler_stats(), indent=2))
+
+    if args.json:
+        results = {"meta": {"commit": git_commit(), "args": vars(args)}, "metrics": metrics, "sampler": tts_sampler.sampler_stats()}
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
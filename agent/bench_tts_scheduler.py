@@ -0,0 +1,229 @@
+# เสียงแรกต่อสาย / throughput รวม / เสียงสะดุด ของ CosyVoice ที่ 1, 4, 8 สายพร้อมกัน มีและไม่มี TTSScheduler
+#
+#   python bench_tts_scheduler.py                          # CosyVoice จำลอง (งาน CPU จริงด้วย matmul) เทียบ off / on
+#   python bench_tts_scheduler.py --lm-step-ms 40 --flow-ms 300 --json scheduler.json
+#   python bench_tts_scheduler.py --real                   # CosyVoice จริง ตาม AGENT_TTS_SCHEDULER_SLOTS
+#   AGENT_TTS_SCHEDULER_SLOTS=0 python bench_tts_scheduler.py --real   # baseline (model ใน process เดียวถอด scheduler ไม่ได้)
+#   python bench_tts_scheduler.py --concurrency 1 --slots 1 2            # สายเดียว: off เทียบ on ตามจำนวน slot
+#
+# --slots default = จำนวน slot ที่ job แบบ thread ได้บนเครื่องนี้ (core ของ TTS / thread ต่อ step ดู tts_scheduler.py)
+# บนเครื่องหลาย core slot เดียวทำให้ LM ของสายเดียวต้องรอ token2wav (เสียงแรกช้ากว่า off) ต้องรันบนเครื่องที่ deploy จริง
+#
+# แต่ละสายมี inference thread ของตัวเองเหมือน session จริง (CosyVoiceTTS หนึ่งตัวต่อ session แชร์ model)
+# CosyVoice จำลองมีโครงเดียวกับ CosyVoice2Model.tts: llm_job บน thread แยก decode ทีละ token,
+# ลูปหลัก poll ทุก --poll-ms แล้วเรียก token2wav ทุก token_hop_len token ต้นทุนเป็น matmul ของ torch
+# (ปล่อย GIL แย่ง core กันจริง) ที่ calibrate ให้ได้เวลาตาม --*-ms เมื่อรันคนเดียว
+#
+# stall = เวลาที่ผู้ฟังไม่ได้ยินอะไรหลังเสียงแรก (chunk ถัดไปมาช้ากว่าเสียงที่เล่นไปแล้ว)
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from benchmark import SENTENCES, git_commit, summarize
+from inference_executor import InferenceExecutor
+from placement import get_placement
+from tts_scheduler import TTSScheduler, placement_slots
+
+
+class CpuWork:
+    # ทำงาน CPU นานประมาณ ms มิลลิวินาที (วัดตอนไม่มีใครแย่ง)
+    def __init__(self, size: int = 192):
+        import torch
+
+        self._a = torch.randn(size, size)
+        self._b = torch.randn(size, size)
+        self._per_ms = 1.0
+        start = time.perf_counter()
+        for _ in range(200):
+            self._unit()
+        self._per_ms = 200 / ((time.perf_counter() - start) * 1000)
+
+    def _unit(self) -> None:
+        self._a @ self._b
+
+    def run(self, ms: float) -> None:
+        for _ in range(max(1, round(ms * self._per_ms))):
+            self._unit()
+
+
+class SimLM:
+    def __init__(self, cpu: CpuWork, args):
+        self._cpu = cpu
+        self._args = args
+
+    def inference(self, text, **kwargs):
+        self._cpu.run(self._args.prefill_ms)
+        for i in range(int(len(text) * self._args.tokens_per_char)):
+            if i:
+                self._cpu.run(self._args.lm_step_ms)
+            yield i
+
+
+class SimCosyVoiceModel:
+    # เทียบ CosyVoice2Model: token 25 ตัวต่อเสียงหนึ่งวินาที
+    token_hop_len = 25
+    pre_lookahead_len = 3
+
+    def __init__(self, cpu: CpuWork, args, sample_rate: int):
+        self._cpu = cpu
+        self._args = args
+        self._sample_rate = sample_rate
+        self.llm = SimLM(cpu, args)
+        self.lock = threading.Lock()
+        self.tokens: dict[str, list] = {}
+        self.llm_end: dict[str, bool] = {}
+
+    def llm_job(self, text, prompt_text, llm_prompt_speech_token, llm_embedding, uuid):
+        for token in self.llm.inference(text=text):
+            self.tokens[uuid].append(token)
+        self.llm_end[uuid] = True
+
+    def token2wav(self, token, prompt_token, prompt_feat, embedding, token_offset, uuid, stream=False, finalize=False, speed=1.0):
+        import torch
+
+        n = len(token) - token_offset
+        self._cpu.run(self._args.flow_ms * n / self.token_hop_len)
+        return torch.zeros(1, int(n / 25 * self._sample_rate))
+
+    def tts(self, text: str):
+        this_uuid = str(uuid.uuid1())
+        with self.lock:
+            self.tokens[this_uuid], self.llm_end[this_uuid] = [], False
+        job = threading.Thread(target=self.llm_job, args=(text, None, None, None, this_uuid))
+        job.start()
+        offset, need = 0, self.token_hop_len + self.pre_lookahead_len
+        while True:
+            time.sleep(self._args.poll_ms / 1000)
+            if len(self.tokens[this_uuid]) - offset >= need:
+                tokens = self.tokens[this_uuid][:offset + self.token_hop_len]
+                yield {"tts_speech": self.token2wav(token=tokens, prompt_token=None, prompt_feat=None, embedding=None, token_offset=offset, uuid=this_uuid, stream=True, finalize=False)}
+                offset += self.token_hop_len
+            if self.llm_end[this_uuid] and len(self.tokens[this_uuid]) - offset < need:
+                break
+        job.join()
+        yield {"tts_speech": self.token2wav(token=self.tokens[this_uuid], prompt_token=None, prompt_feat=None, embedding=None, token_offset=offset, uuid=this_uuid, stream=True, finalize=True)}
+        with self.lock:
+            self.tokens.pop(this_uuid)
+            self.llm_end.pop(this_uuid)
+
+
+class SimCosyVoice:
+    sample_rate = 24000
+
+    def __init__(self, cpu: CpuWork, args):
+        self.model = SimCosyVoiceModel(cpu, args, self.sample_rate)
+
+    def inference_cross_lingual(self, text, prompt_wav, zero_shot_spk_id="", stream=False):
+        yield from self.model.tts(text)
+
+
+def playout(chunks: list[tuple[float, float]], start: float) -> dict:
+    # chunks = (เวลาที่ได้, ความยาวเสียง s)
+    first = chunks[0][0]
+    cursor, stall = first, 0.0
+    for at, seconds in chunks:
+        if at > cursor:
+            stall += at - cursor
+            cursor = at
+        cursor += seconds
+    audio_s = sum(s for _, s in chunks)
+    return {"first_chunk_ms": (first - start) * 1000, "stall_ms": stall * 1000, "audio_s": audio_s}
+
+
+async def sim_chunks(model: SimCosyVoice, executor: InferenceExecutor, text: str):
+    async for item in executor.stream(model.inference_cross_lingual, text, ""):
+        yield item["tts_speech"].shape[-1] / model.sample_rate
+
+
+async def real_chunks(tts_, text: str):
+    async for ev in tts_.synthesize(text):
+        yield ev.frame.samples_per_channel / ev.frame.sample_rate
+
+
+async def run_level(make_chunks, concurrency: int, rounds: int) -> tuple[list[dict], float, float]:
+    async def one(i: int, r: int) -> dict:
+        start = time.perf_counter()
+        chunks = []
+        async for seconds in make_chunks(i, SENTENCES[(i + r) % len(SENTENCES)]):
+            chunks.append((time.perf_counter(), seconds))
+        return playout(chunks, start)
+
+    rows = []
+    start = time.perf_counter()
+    for r in range(rounds):
+        rows += await asyncio.gather(*(one(i, r) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return rows, sum(row["audio_s"] for row in rows), elapsed
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--real", action="store_true", help="use the real CosyVoice model")
+    parser.add_argument("--slots", type=int, nargs="+", default=[placement_slots()], help="scheduler slots in simulate mode (one 'on' run per value)")
+    parser.add_argument("--guard-s", type=float, default=0.3, help="scheduler: serve a stream this long before its audio runs out")
+    parser.add_argument("--first-chunk-s", type=float, default=2.0, help="scheduler: first-chunk deadline")
+    parser.add_argument("--prefill-ms", type=float, default=60.0)
+    parser.add_argument("--lm-step-ms", type=float, default=8.0, help="CPU time per speech token")
+    parser.add_argument("--flow-ms", type=float, default=120.0, help="CPU time of flow + vocoder per second of audio")
+    parser.add_argument("--tokens-per-char", type=float, default=2.0)
+    parser.add_argument("--poll-ms", type=float, default=100.0, help="CosyVoice token polling interval")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    host = {"cpu_count": os.cpu_count(), "tts_cpus": len(get_placement().cpus("tts")), "tts_threads": get_placement().threads("tts")}
+    print(f"host: {json.dumps(host)}")
+
+    if args.real:
+        from fun_audio import CosyVoiceTTS
+
+        sessions = [CosyVoiceTTS(use_cache=False) for _ in range(max(args.concurrency))]
+        if sessions[0]._model is None:
+            print("CosyVoice model not available, run without --real", file=sys.stderr)
+            return 1
+        label = "on" if sessions[0]._scheduler else "off"
+        modes = {label: (lambda i, text: real_chunks(sessions[i], text), sessions[0]._scheduler)}
+    else:
+        cpu = CpuWork()
+        modes = {}
+        for slots in [0, *args.slots]:
+            label = f"on_{slots}slot" if slots else "off"
+            model = SimCosyVoice(cpu, args)
+            scheduler = None
+            if slots:
+                scheduler = TTSScheduler(slots=slots, sample_rate=model.sample_rate, guard_s=args.guard_s, first_chunk_s=args.first_chunk_s)
+                scheduler.install(model)
+            executors = [InferenceExecutor(f"bench-{label}-{i}") for i in range(max(args.concurrency))]
+            modes[label] = ((lambda i, text, model=model, executors=executors: sim_chunks(model, executors[i], text)), scheduler)
+
+    metrics: dict[str, dict] = {}
+    schedulers: dict[str, dict] = {}
+    for label, (make_chunks, scheduler) in modes.items():
+        for concurrency in args.concurrency:
+            rows, audio_s, elapsed = await run_level(make_chunks, concurrency, args.rounds)
+            name = f"scheduler_{label}.streams_{concurrency}"
+            metrics[f"{name}.first_chunk"] = summarize([r["first_chunk_ms"] for r in rows], "ms")
+            metrics[f"{name}.stall"] = summarize([r["stall_ms"] for r in rows], "ms")
+            metrics[f"{name}.throughput"] = summarize([audio_s / elapsed], "audio_s/s")
+        if isinstance(scheduler, TTSScheduler):
+            schedulers[label] = scheduler.stats()
+
+    for name, s in metrics.items():
+        print(f"{name:<40} n={s['n']:<4} mean={s['mean']:>9.2f}  p50={s['p50']:>9.2f}  p95={s['p95']:>9.2f} {s['unit']}")
+    if schedulers:
+        print(json.dumps(schedulers, indent=2))
+
+    if args.json:
+        results = {"meta": {"commit": git_commit(), "args": vars(args), "host": host}, "metrics": metrics, "scheduler": schedulers}
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
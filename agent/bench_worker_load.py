@@ -0,0 +1,233 @@
+# คะแนน load ของ worker (worker_load.py) กับคิว inference จำลอง ไม่ต้องมี model / LiveKit server
+#
+#   python bench_worker_load.py                    # ทุก scenario
+#   python bench_worker_load.py --scenario queue --queue-saturation 4
+#   python bench_worker_load.py --live             # คะแนนตอนนี้ของ worker ที่รันอยู่ในเครื่องนี้
+#
+# scenario:
+#   policy     LoadPolicy กับ LoadSample ที่กำหนดเอง (คิวเต็มครึ่งหนึ่ง / เต็ม / RTF สูงอย่างเดียว / RTF สูง + คิวเต็ม)
+#   queue      เติมงานทีละชิ้นใน InferenceExecutor ที่งานแรกถูก block ไว้ (งานที่เหลือค้างเป็น pending)
+#   rtf        งาน TTS ที่ RTF เพิ่มขึ้นทีละขั้น (คะแนนเป็นค่าเฉลี่ยถ่วงตามความยาวเสียงใน RTF_WINDOW_S)
+#   jobs       จำนวน job ที่รันอยู่เทียบ --max-jobs
+#   processes  process ลูกหลายตัวเขียน queue depth ลง multiproc dir แล้ว process นี้อ่านรวม
+#              (เหมือน job process กับ load_fnc ของ worker) ฆ่า process ลูกแล้วคิวของมันต้องหายไป
+#   production WorkerLoad() แบบที่ agent.py สร้าง (multiproc_dir=None) กับ PROMETHEUS_MULTIPROC_DIR ที่ตั้งไว้จริง
+#              และ process ลูกเขียนคิวลง dir: job แบบ thread ต้องเห็น RTF ของ process นี้และไม่นับ dir
+#              แบบ process ต้องเห็นคิวของ process ลูกใน dir และไม่นับ RTF ของ process นี้
+# ทุกแถวเทียบ term และ available กับค่าที่คำนวณจากอินพุตจำลอง จบด้วย exit code 1 ถ้ามีแถวที่ไม่ตรง
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+from benchmark import git_commit
+from inference_executor import InferenceExecutor
+import model_registry
+import worker_load
+from worker_load import LoadPolicy, LoadSample, WorkerLoad, record_rtf
+
+CHILD = """
+import sys, time
+from worker_load import INFERENCE_QUEUE_DEPTH
+INFERENCE_QUEUE_DEPTH.labels(queue="cosyvoice").set(float(sys.argv[1]))
+print("ready", flush=True)
+time.sleep(60)
+"""
+
+
+def check(policy: LoadPolicy, terms: dict[str, float], available: bool, expected: dict[str, float]) -> bool:
+    # term ที่คาดไว้ตรงกับที่ได้ และ available ตรงกับ score (ค่าสูงสุดของ term ไม่เกิน 1) เทียบ threshold
+    if any(abs(terms.get(k, 0.0) - v) > 1e-6 for k, v in expected.items()):
+        return False
+    return available == (min(1.0, max(terms.values())) < policy.threshold)
+
+
+def row(scenario: str, step, load: WorkerLoad, score: float, expected: dict[str, float]) -> dict:
+    stats = load.stats()
+    ok = check(load.policy, stats["terms"], stats["available"], expected)
+    out = {"scenario": scenario, "step": step, "load": round(score, 3), "available": stats["available"], "terms": {k: round(v, 3) for k, v in stats["terms"].items()}, "expected": expected, "ok": ok}
+    print(f"{'PASS' if ok else 'FAIL'} {scenario:<10} {str(step):<16} load={score:.2f} available={str(stats['available']):<5} {out['terms']}" + ("" if ok else f" expected {expected}"))
+    return out
+
+
+def scenario_policy(policy: LoadPolicy) -> list[dict]:
+    # (ชื่อ, sample, term ที่คาดไว้, available ที่คาดไว้)
+    sat = policy.queue_saturation
+    rtf_high = policy.rtf_weight
+    cases = [
+        ("idle", LoadSample(), {"queue": 0.0, "rtf": 0.0}, True),
+        ("queue half", LoadSample(queue_depth=sat / 2), {"queue": 0.5}, 0.5 < policy.threshold),
+        ("queue full", LoadSample(queue_depth=sat), {"queue": 1.0}, False),
+        ("rtf 1x", LoadSample(rtf=policy.max_rtf), {"rtf": rtf_high}, rtf_high < policy.threshold),
+        # วลีช้าหนึ่งวลี (RTF หลายเท่า) ดันคะแนนได้ไม่เกิน weight
+        ("rtf 5x", LoadSample(rtf=policy.max_rtf * 5), {"rtf": rtf_high}, rtf_high < policy.threshold),
+        ("rtf 5x+queue", LoadSample(rtf=policy.max_rtf * 5, queue_depth=sat), {"queue": 1.0, "rtf": rtf_high}, False),
+    ]
+    rows = []
+    for name, sample, expected, want_available in cases:
+        terms = policy.terms(sample)
+        score = policy.score(sample)
+        available = policy.available(sample)
+        ok = check(policy, terms, available, expected) and available == want_available
+        rows.append({"scenario": "policy", "step": name, "load": round(score, 3), "available": available, "terms": {k: round(v, 3) for k, v in terms.items()}, "expected": expected, "ok": ok})
+        print(f"{'PASS' if ok else 'FAIL'} {'policy':<10} {name:<16} load={score:.2f} available={str(available):<5} {rows[-1]['terms']}")
+    return rows
+
+
+async def scenario_queue(policy: LoadPolicy) -> list[dict]:
+    executor = InferenceExecutor("simulated")
+    release = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def blocked():
+        asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+        yield b""
+
+    load = WorkerLoad(policy, multiproc_dir="")
+    rows, streams = [], []
+    for n in range(int(policy.queue_saturation) + 3):
+        # งานแรกกำลังรัน (ไม่นับ) ที่เหลือรอ thread
+        rows.append(row("queue", n, load, load(), {"queue": max(0, n - 1) / policy.queue_saturation}))
+        stream = executor.stream(blocked)
+        streams.append((stream, asyncio.ensure_future(stream.__anext__())))
+        await asyncio.sleep(0.05)
+    release.set()
+    await asyncio.gather(*(task for _, task in streams), return_exceptions=True)
+    for stream, _ in streams:
+        await stream.aclose()
+    rows.append(row("queue", "drained", load, load(), {"queue": 0.0}))
+    executor.shutdown()
+    return rows
+
+
+def scenario_rtf(policy: LoadPolicy) -> list[dict]:
+    load = WorkerLoad(policy, multiproc_dir="")
+    rows, recorded = [], []
+    for rtf in (0.2, 0.5, 0.8, 1.0, 1.5, 3.0):
+        record_rtf("tts", rtf * 10.0, 10.0)
+        recorded.append(rtf)
+        # งานยาวเท่ากันทุกชิ้น: ค่าเฉลี่ยธรรมดา
+        mean = sum(recorded) / len(recorded)
+        rows.append(row("rtf", rtf, load, load(), {"rtf": policy.rtf_weight * min(1.0, mean / policy.max_rtf)}))
+    # ไม่ให้ RTF ค้างไปถึง scenario ถัดไป
+    with worker_load._rtf_lock:
+        worker_load._rtf.clear()
+    return rows
+
+
+def scenario_jobs(policy: LoadPolicy) -> list[dict]:
+    load = WorkerLoad(policy, multiproc_dir="")
+    rows = []
+    for n in range(policy.max_jobs + 2):
+        worker = types.SimpleNamespace(active_jobs=[None] * n)
+        rows.append(row("jobs", n, load, load(worker), {"jobs": n / policy.max_jobs}))
+    return rows
+
+
+def spawn_children(path: str, depths: list[int]) -> list[subprocess.Popen]:
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=path)
+    here = os.path.dirname(os.path.abspath(__file__))
+    children = []
+    for depth in depths:
+        child = subprocess.Popen([sys.executable, "-c", CHILD, str(depth)], cwd=here, env=env, stdout=subprocess.PIPE, text=True)
+        child.stdout.readline()
+        children.append(child)
+    return children
+
+
+def scenario_processes(policy: LoadPolicy, depths: list[int]) -> list[dict]:
+    rows = []
+    with tempfile.TemporaryDirectory() as path:
+        children = spawn_children(path, depths)
+        load = WorkerLoad(policy, multiproc_dir=path)
+        alive = sum(depths)
+        rows.append(row("processes", f"{len(children)} up", load, load(), {"queue": alive / policy.queue_saturation}))
+        for child, depth in zip(children, depths):
+            child.kill()
+            child.wait()
+            alive -= depth
+            rows.append(row("processes", f"pid {child.pid} killed", load, load(), {"queue": alive / policy.queue_saturation}))
+    return rows
+
+
+def scenario_production(policy: LoadPolicy, depths: list[int]) -> list[dict]:
+    rows = []
+    saved_dir, saved_executor = os.environ.get("PROMETHEUS_MULTIPROC_DIR"), model_registry.JOB_EXECUTOR
+    with tempfile.TemporaryDirectory() as path:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+        children = spawn_children(path, depths)
+        try:
+            # TTS ของ process นี้ทำไม่ทัน (RTF 3)
+            record_rtf("tts", 30.0, 10.0)
+            load = WorkerLoad(policy)
+            model_registry.JOB_EXECUTOR = "thread"
+            rows.append(row("production", "thread", load, load(), {"queue": 0.0, "rtf": policy.rtf_weight * min(1.0, 3.0 / policy.max_rtf)}))
+            model_registry.JOB_EXECUTOR = "process"
+            rows.append(row("production", "process", load, load(), {"queue": sum(depths) / policy.queue_saturation, "rtf": 0.0}))
+        finally:
+            for child in children:
+                child.kill()
+                child.wait()
+            model_registry.JOB_EXECUTOR = saved_executor
+            if saved_dir is None:
+                os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            else:
+                os.environ["PROMETHEUS_MULTIPROC_DIR"] = saved_dir
+            with worker_load._rtf_lock:
+                worker_load._rtf.clear()
+    return rows
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=["policy", "queue", "rtf", "jobs", "processes", "production"], nargs="+", default=["policy", "queue", "rtf", "jobs", "processes", "production"])
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--max-jobs", type=int, default=4)
+    parser.add_argument("--queue-saturation", type=float, default=8)
+    parser.add_argument("--max-rtf", type=float, default=1.0)
+    parser.add_argument("--rtf-weight", type=float, default=0.75)
+    parser.add_argument("--min-free-mb", type=float, default=0, help="0 = ignore memory (host memory would dominate the simulation)")
+    parser.add_argument("--child-depths", type=int, nargs="+", default=[3, 5], help="queue depth of each simulated job process")
+    parser.add_argument("--live", action="store_true", help="print the load of the worker running on this host")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.live:
+        path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "livekit-demo-prometheus")
+        load = WorkerLoad(multiproc_dir=path)
+        score = load()
+        print(json.dumps(load.stats(), indent=2))
+        return 0 if score < load.policy.threshold else 1
+
+    policy = LoadPolicy(threshold=args.threshold, max_jobs=args.max_jobs, queue_saturation=args.queue_saturation, max_rtf=args.max_rtf, rtf_weight=args.rtf_weight, min_free_mb=args.min_free_mb)
+    rows = []
+    started = time.perf_counter()
+    if "policy" in args.scenario:
+        rows += scenario_policy(policy)
+    if "queue" in args.scenario:
+        rows += await scenario_queue(policy)
+    if "rtf" in args.scenario:
+        rows += scenario_rtf(policy)
+    if "jobs" in args.scenario:
+        rows += scenario_jobs(policy)
+    if "processes" in args.scenario:
+        rows += scenario_processes(policy, args.child_depths)
+    if "production" in args.scenario:
+        rows += scenario_production(policy, args.child_depths)
+    failed = [r for r in rows if not r["ok"]]
+    print(f"done in {time.perf_counter() - started:.1f}s, {len(rows) - len(failed)}/{len(rows)} rows as expected")
+
+    if args.json:
+        results = {"meta": {"commit": git_commit(), "args": vars(args)}, "rows": rows}
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,360 @@
+# benchmark ของ STT / TTS / LLM adapter แบบ offline ผลเป็น JSON เทียบกับ baseline ที่เก็บไว้ได้
+#
+#   python benchmark.py --json results.json                           # SenseVoice + CosyVoice จริง
+#   python benchmark.py --stt simulate --tts standin --json ci.json   # ไม่ต้องมี model / internet
+#   python benchmark.py --corpus clips/ --baseline baseline.json --fail-on-regression
+#
+# regression = แย่ลงเกิน --tolerance (สัดส่วน) และเกิน --slack-ms / --slack-rtf (ค่าสัมบูรณ์) พร้อมกัน
+#
+# suite:
+#   stt  real-time factor ของ SenseVoiceSTT ต่อ clip (สังเคราะห์ + ไฟล์ใน --corpus)
+#   tts  time-to-first-chunk และ RTF รวมของ TTS ต่อประโยค
+#   e2e  STT -> MockLLM -> TTS หนึ่ง turn: เวลาจนได้ transcript, token แรก และเสียงแรก
+#        (--llm-profile เลือก profile ของ MockLLM เช่น ollama-cpu ดู mock_llm.py)
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from audio_ingest import get_resampler
+from phrase_chunker import PhraseChunker
+
+SAMPLE_RATE = 16000
+
+# ประโยคทดสอบ (สั้น / กลาง / ยาว) แบบที่ call center ใช้จริง
+SENTENCES = [
+    "สวัสดีค่ะ",
+    "ยินดีต้อนรับสู่ร้านของเรานะคะ วันนี้มีอะไรให้ช่วยไหมคะ",
+    "ตอนนี้เรามีโปรโมชั่นพิเศษ ลดราคาสินค้าทุกชิ้นสูงสุดห้าสิบเปอร์เซ็นต์ จนถึงสิ้นเดือนนี้เท่านั้น สนใจรับรายละเอียดเพิ่มเติมไหมคะ",
+]
+
+
+# --- สถิติ ---
+
+def summarize(values: list[float], unit: str) -> dict:
+    a = np.asarray(values, dtype=np.float64)
+    if len(a) == 0:
+        return {"unit": unit, "n": 0}
+    return {
+        "unit": unit,
+        "n": int(len(a)),
+        "mean": round(float(a.mean()), 4),
+        "min": round(float(a.min()), 4),
+        "p50": round(float(np.percentile(a, 50)), 4),
+        "p90": round(float(np.percentile(a, 90)), 4),
+        "p95": round(float(np.percentile(a, 95)), 4),
+        "p99": round(float(np.percentile(a, 99)), 4),
+        "max": round(float(a.max()), 4),
+    }
+
+
+# ส่วนต่างขั้นต่ำต่อหน่วยที่ยังไม่นับเป็น regression (jitter ของ timer / scheduler)
+# metric ที่ต่ำกว่ามิลลิวินาทีแกว่งเกิน tolerance แบบสัดส่วนได้แม้รันโค้ดเดิมซ้ำ
+MIN_SLACK = {"ms": 5.0, "x": 0.02}
+
+
+def compare(results: dict, baseline: dict, tolerance: float, slack: dict | None = None) -> list[dict]:
+    # ทุก metric ยิ่งน้อยยิ่งดี (latency, RTF) ถือว่า regress เมื่อ p50 หรือ p95 แย่ลงเกิน tolerance
+    # และเกิน slack ของหน่วยนั้นด้วย baseline เป็น 0 ไม่มี ratio ดูแค่ slack
+    slack = {**MIN_SLACK, **(slack or {})}
+    rows = []
+    for name, cur in results["metrics"].items():
+        base = baseline.get("metrics", {}).get(name)
+        if not base or not cur.get("n") or not base.get("n"):
+            continue
+        allowed = slack.get(cur.get("unit"), 0.0)
+        for stat in ("p50", "p95"):
+            delta = cur[stat] - base[stat]
+            ratio = cur[stat] / base[stat] if base[stat] > 0 else None
+            rows.append({
+                "metric": name,
+                "stat": stat,
+                "baseline": base[stat],
+                "current": cur[stat],
+                "ratio": round(ratio, 3) if ratio is not None else None,
+                "slack": allowed,
+                "regression": delta > allowed and (ratio is None or ratio > 1 + tolerance),
+            })
+    return rows
+
+
+# --- corpus ---
+
+def synthetic_clips(seed: int = 0) -> dict[str, np.ndarray]:
+    # เสียงสังเคราะห์คล้ายพูด: noise กรองความถี่ช่วงเสียงพูด ปรับ envelope เป็นพยางค์ คั่นด้วยช่วงเงียบ
+    rng = np.random.default_rng(seed)
+    clips = {}
+    for seconds in (1.0, 3.0, 6.0, 12.0):
+        n = int(SAMPLE_RATE * seconds)
+        noise = rng.standard_normal(n).astype(np.float32)
+        kernel = np.hanning(9).astype(np.float32)
+        voiced = np.convolve(noise, kernel / kernel.sum(), mode="same")
+        t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+        envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) * (np.sin(2 * np.pi * 0.3 * t) > -0.6)
+        clips[f"synthetic_{seconds:g}s"] = (0.3 * voiced * envelope).astype(np.float32)
+    return clips
+
+
+def recorded_clips(corpus: str | None) -> dict[str, np.ndarray]:
+    if not corpus:
+        return {}
+    import soundfile as sf
+
+    clips = {}
+    for path in sorted(glob.glob(os.path.join(corpus, "**", "*.wav"), recursive=True)):
+        data, sr = sf.read(path, dtype="float32")
+        if data.ndim > 1:
+            data = data.mean(axis=1)
+        if sr != SAMPLE_RATE:
+            data = get_resampler(sr, SAMPLE_RATE).resample(data)
+        clips[os.path.relpath(path, corpus)] = data
+    return clips
+
+
+# --- adapter ---
+
+class SimulatedSenseVoice:
+    # ต้นทุน forward pass โดยประมาณของ SenseVoiceSmall บน CPU (คงที่ต่อ batch + ตามความยาวเสียง)
+    def __init__(self, batch_overhead_ms: float = 40.0, ms_per_audio_s: float = 15.0):
+        self._batch_overhead = batch_overhead_ms / 1000.0
+        self._per_audio_s = ms_per_audio_s / 1000.0
+
+    def generate(self, inputs, **kwargs):
+        audio_s = sum(len(x) for x in inputs) / SAMPLE_RATE
+        time.sleep(self._batch_overhead + self._per_audio_s * audio_s)
+        return [{"key": str(i), "text": "<|th|><|NEUTRAL|><|Speech|><|woitn|>สวัสดีค่ะ"} for i in range(len(inputs))]
+
+
+async def build_stt(kind: str):
+    # คืน async fn(audio) -> text
+    if kind == "simulate":
+        from stt_batcher import get_batcher
+
+        batcher = get_batcher(SimulatedSenseVoice())
+
+        async def decode(audio: np.ndarray) -> str:
+            event = await batcher.recognize(audio, "th")
+            return event.alternatives[0].text if event.alternatives else ""
+        return decode
+
+    from fun_audio import SenseVoiceSTT
+
+    stt_ = SenseVoiceSTT()
+    if stt_._batcher is None:
+        raise RuntimeError("SenseVoice model not available")
+    return lambda audio: stt_._decode(audio, "th")
+
+
+async def build_tts(kind: str):
+    # คืน (tts, cleanup)
+    if kind == "cosyvoice":
+        from fun_audio import CosyVoiceTTS
+
+        tts_ = CosyVoiceTTS(use_cache=False)
+        if tts_._model is None:
+            raise RuntimeError("CosyVoice model not available")
+        return tts_, None
+
+    from edge_tts_plugin import EdgeTTS
+
+    if kind == "edge":
+        return EdgeTTS(use_cache=False, output_format="pcm"), None
+
+    from edge_tts_standin import StandIn, start
+
+    runner, endpoint = await start(StandIn(latency_ms=120))
+    return EdgeTTS(use_cache=False, output_format="pcm", endpoint=endpoint), runner.cleanup
+
+
+async def time_tts(tts_, text: str) -> tuple[float, float, float]:
+    # (วินาทีถึง chunk แรก, วินาทีทั้งหมด, ความยาวเสียงวินาที)
+    start = time.perf_counter()
+    first = None
+    audio_s = 0.0
+    async for ev in tts_.synthesize(text):
+        if first is None:
+            first = time.perf_counter() - start
+        audio_s += ev.frame.duration
+    return first or 0.0, time.perf_counter() - start, audio_s
+
+
+# --- suite ---
+
+async def bench_stt(decode, clips: dict[str, np.ndarray], warmup: int, repeat: int) -> dict:
+    rtf, latency = [], []
+    for name, audio in clips.items():
+        for i in range(warmup + repeat):
+            start = time.perf_counter()
+            await decode(audio)
+            elapsed = time.perf_counter() - start
+            if i >= warmup:
+                rtf.append(elapsed / (len(audio) / SAMPLE_RATE))
+                latency.append(elapsed * 1000)
+    return {"stt.rtf": summarize(rtf, "x"), "stt.latency_ms": summarize(latency, "ms")}
+
+
+async def bench_tts(tts_, warmup: int, repeat: int) -> dict:
+    ttfc, rtf = [], []
+    for text in SENTENCES:
+        for i in range(warmup + repeat):
+            first, total, audio_s = await time_tts(tts_, text)
+            if i >= warmup:
+                ttfc.append(first * 1000)
+                rtf.append(total / audio_s if audio_s else float("nan"))
+    return {"tts.ttfc_ms": summarize(ttfc, "ms"), "tts.rtf": summarize(rtf, "x")}
+
+
+async def run_turn(decode, llm_, tts_, audio: np.ndarray) -> dict:
+    # หนึ่ง turn นับจากผู้ใช้พูดจบ (ส่งเสียงทั้งก้อนเข้า STT)
+    from livekit.agents.llm import ChatContext
+
+    start = time.perf_counter()
+    transcript = await decode(audio)
+    transcript_at = time.perf_counter()
+
+    chat_ctx = ChatContext.empty()
+    chat_ctx.add_message(role="user", content=transcript or "สวัสดีค่ะ")
+    chunker = PhraseChunker()
+    first_token_at = None
+    first_phrase = None
+    async with llm_.chat(chat_ctx=chat_ctx) as stream:
+        async for chunk in stream:
+            if not chunk.delta or not chunk.delta.content:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            phrases = chunker.push(chunk.delta.content)
+            if phrases:
+                first_phrase = phrases[0]
+                break
+    if first_phrase is None:
+        first_phrase = (chunker.flush() or ["สวัสดีค่ะ"])[0]
+    phrase_at = time.perf_counter()
+
+    first_chunk_s, _, _ = await time_tts(tts_, first_phrase)
+    return {
+        "transcript_ms": (transcript_at - start) * 1000,
+        "llm_first_token_ms": ((first_token_at or phrase_at) - transcript_at) * 1000,
+        "first_phrase_ms": (phrase_at - transcript_at) * 1000,
+        "first_audio_ms": (phrase_at - start + first_chunk_s) * 1000,
+    }
+
+
+async def bench_e2e(decode, tts_, clips: dict[str, np.ndarray], warmup: int, repeat: int, llm_profile: str = "echo") -> dict:
+    from mock_llm import MockLLM
+
+    llm_ = MockLLM(llm_profile)
+    rows = []
+    for audio in clips.values():
+        for i in range(warmup + repeat):
+            row = await run_turn(decode, llm_, tts_, audio)
+            if i >= warmup:
+                rows.append(row)
+    return {f"e2e.{key}": summarize([r[key] for r in rows], "ms") for key in rows[0]} if rows else {}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", default="stt,tts,e2e")
+    parser.add_argument("--stt", choices=["sensevoice", "simulate"], default="sensevoice")
+    parser.add_argument("--tts", choices=["cosyvoice", "edge", "standin"], default="cosyvoice")
+    parser.add_argument("--corpus", help="directory of recorded .wav clips (any sample rate)")
+    parser.add_argument("--llm-profile", default="echo", help="MockLLM profile for the e2e suite (name or JSON)")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown vs baseline (0.15 = 15%%)")
+    parser.add_argument("--slack-ms", type=float, default=MIN_SLACK["ms"], help="absolute slowdown ignored for ms metrics")
+    parser.add_argument("--slack-rtf", type=float, default=MIN_SLACK["x"], help="absolute increase ignored for RTF metrics")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    suites = set(args.suites.split(","))
+    clips = {**synthetic_clips(), **recorded_clips(args.corpus)}
+    metrics: dict[str, dict] = {}
+    skipped: dict[str, str] = {}
+
+    decode = tts_ = cleanup = None
+    if suites & {"stt", "e2e"}:
+        try:
+            decode = await build_stt(args.stt)
+        except Exception as e:
+            skipped["stt"] = f"{type(e).__name__}: {e}"
+    if suites & {"tts", "e2e"}:
+        try:
+            tts_, cleanup = await build_tts(args.tts)
+        except Exception as e:
+            skipped["tts"] = f"{type(e).__name__}: {e}"
+
+    try:
+        if "stt" in suites and decode:
+            metrics.update(await bench_stt(decode, clips, args.warmup, args.repeat))
+        if "tts" in suites and tts_:
+            metrics.update(await bench_tts(tts_, args.warmup, args.repeat))
+        if "e2e" in suites:
+            if decode and tts_:
+                metrics.update(await bench_e2e(decode, tts_, clips, args.warmup, args.repeat, args.llm_profile))
+            else:
+                skipped["e2e"] = "needs both stt and tts"
+    finally:
+        if tts_ is not None:
+            await tts_.aclose()
+        if cleanup is not None:
+            await cleanup()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "clips": {name: round(len(audio) / SAMPLE_RATE, 2) for name, audio in clips.items()},
+        },
+        "metrics": metrics,
+        "skipped": skipped,
+    }
+
+    for name, s in metrics.items():
+        print(f"{name:<28} n={s['n']:<4} p50={s['p50']:>10.3f}  p95={s['p95']:>10.3f}  max={s['max']:>10.3f} {s['unit']}")
+    for suite, reason in skipped.items():
+        print(f"skipped {suite}: {reason}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.tolerance, {"ms": args.slack_ms, "x": args.slack_rtf})
+        results["comparison"] = rows
+        print(f"\nvs {args.baseline} (tolerance {args.tolerance:.0%}, slack {args.slack_ms:g} ms / {args.slack_rtf:g}x):")
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            ratio = f"x{row['ratio']:.2f}" if row["ratio"] is not None else "  -  "
+            print(f"  {row['metric']:<28} {row['stat']}  {row['baseline']:>10.3f} -> {row['current']:>10.3f}  {ratio} {flag}")
+        regressions = [row for row in rows if row["regression"]]
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,202 @@
+# patch และ import backend หนัก (torch, funasr, cosyvoice) ที่เดียว ทำครั้งเดียวต่อ process
+#
+# agent ที่ใช้แค่ EdgeTTS ไม่ต้องโหลด torch เลย: SenseVoiceSTT เรียก ensure_funasr()
+# และ CosyVoiceTTS เรียก ensure_cosyvoice() ตอนสร้าง instance เท่านั้น
+#
+#   python bootstrap.py            # รายงานเวลา import ของ agent (ไม่โหลด backend หนัก)
+#   python bootstrap.py --heavy    # รวม funasr / cosyvoice ด้วย
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("bootstrap")
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+COSYVOICE_PATH = os.path.join(PROJECT_ROOT, "Fun-Audio-Chat/third_party/CosyVoice")
+
+_lock = threading.RLock()
+_done: dict[str, object] = {}
+_report: list[dict] = []
+
+
+@contextmanager
+def _timed(step: str):
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except ImportError as e:
+        status = f"missing: {e}"
+        raise
+    except Exception as e:
+        status = f"failed: {e}"
+        raise
+    finally:
+        _report.append({"step": step, "ms": round((time.perf_counter() - start) * 1000, 1), "status": status})
+
+
+def _once(step: str):
+    # decorator: รันครั้งแรกครั้งเดียว คืนค่าเดิมทุกครั้งหลังจากนั้น (ImportError = None)
+    def wrap(fn):
+        def run():
+            with _lock:
+                if step not in _done:
+                    try:
+                        with _timed(step):
+                            _done[step] = fn()
+                    except ImportError as e:
+                        logger.warning(f"{step}: {e}")
+                        _done[step] = None
+                    except Exception as e:
+                        logger.warning(f"{step} failed: {e}")
+                        _done[step] = None
+                return _done[step]
+        run.__name__ = fn.__name__
+        return run
+    return wrap
+
+
+@_once("patch_yaml")
+def patch_yaml() -> bool:
+    # HyperPyYAML (config ของ CosyVoice) ลึกเกิน max_depth เริ่มต้นของ PyYAML / ruamel.yaml
+    import yaml
+
+    for name in ("Loader", "SafeLoader", "CLoader", "CSafeLoader", "FullLoader", "UnsafeLoader"):
+        loader_cls = getattr(yaml, name, None)
+        if loader_cls:
+            setattr(loader_cls, "max_depth", 10000)
+    try:
+        import ruamel.yaml
+        for name in ("Loader", "SafeLoader", "RoundTripLoader"):
+            loader_cls = getattr(ruamel.yaml, name, None)
+            if loader_cls:
+                setattr(loader_cls, "max_depth", 10000)
+    except ImportError:
+        logger.info("ruamel.yaml not found, skipping patch")
+    return True
+
+
+@_once("patch_modelscope")
+def patch_modelscope() -> bool:
+    # ให้ download ภายใน (เช่น wetext) ไปที่ HuggingFace แทน ModelScope
+    import modelscope
+    from huggingface_hub import snapshot_download as hf_snapshot_download
+
+    def patched_snapshot_download(model_id, *args, **kwargs):
+        logger.info(f"Intercepted ModelScope download for {model_id}. Redirecting to HuggingFace...")
+        if "cache_dir" in kwargs and kwargs["cache_dir"] is None:
+            del kwargs["cache_dir"]
+        return hf_snapshot_download(repo_id=model_id, *args, **kwargs)
+
+    modelscope.snapshot_download = patched_snapshot_download
+    return True
+
+
+@_once("patch_torchaudio")
+def patch_torchaudio() -> bool:
+    # torchaudio.load ผ่าน soundfile โดยตรง (เลี่ยงปัญหา TorchCodec)
+    import soundfile as sf
+    import torch
+    import torchaudio
+
+    def patched_torchaudio_load(filepath, **kwargs):
+        data, sample_rate = sf.read(filepath)
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)  # (samples, 1)
+        data = data.T  # (channels, samples)
+        return torch.from_numpy(data).float(), sample_rate
+
+    torchaudio.load = patched_torchaudio_load
+    return True
+
+
+@_once("patch_cosyvoice")
+def patch_cosyvoice() -> bool:
+    import torch
+    import torchaudio
+    import cosyvoice.utils.file_utils
+    from cosyvoice.llm.llm import TransformerLM
+
+    from audio_ingest import get_resampler
+    from tts_sampler import sampling_ids_for
+
+    def patched_load_wav(wav, target_sr, min_sr=16000):
+        try:
+            speech, sample_rate = torchaudio.load(wav)
+        except Exception:
+            speech, sample_rate = torchaudio.load(wav, backend="soundfile")
+
+        speech = speech.mean(dim=0, keepdim=True)
+        if sample_rate != target_sr:
+            assert sample_rate >= min_sr, "wav sample rate {} must be greater than {}".format(sample_rate, target_sr)
+            # ใช้ polyphase resampler ที่ cache filter ไว้ต่อคู่ rate แทนการสร้าง Resample ใหม่ทุกครั้ง
+            resampled = get_resampler(sample_rate, target_sr).resample(speech[0].numpy())
+            speech = torch.from_numpy(resampled).unsqueeze(0)
+        return speech
+
+    cosyvoice.utils.file_utils.load_wav = patched_load_wav
+    # sampling_ids เดิม raise RuntimeError เมื่อสุ่มได้ EOS เกิน max_trials (เจอบ่อยกับภาษาไทย/cross-lingual)
+    # แทนด้วยการสุ่มครั้งเดียวที่ตัด EOS ออกจากการกระจาย ดู tts_sampler.py
+    TransformerLM.sampling_ids = sampling_ids_for()
+    return True
+
+
+@_once("import_funasr")
+def ensure_funasr():
+    # คืน funasr.AutoModel หรือ None ถ้าไม่มี library
+    patch_modelscope()
+    from funasr import AutoModel
+    return AutoModel
+
+
+@_once("import_cosyvoice")
+def ensure_cosyvoice():
+    # คืน module cosyvoice.cli.cosyvoice (มี CosyVoice, CosyVoice2, CosyVoice3) หรือ None
+    if COSYVOICE_PATH not in sys.path:
+        sys.path.append(COSYVOICE_PATH)
+    patch_yaml()
+    patch_modelscope()
+    patch_torchaudio()
+    patch_cosyvoice()
+    import cosyvoice.cli.cosyvoice as cli
+    return cli
+
+
+def report() -> list[dict]:
+    with _lock:
+        return list(_report)
+
+
+def log_report() -> None:
+    for row in report():
+        logger.info(f"bootstrap {row['step']}: {row['ms']:.1f} ms ({row['status']})")
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heavy", action="store_true", help="also import funasr and cosyvoice")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    start = time.perf_counter()
+    try:
+        with _timed("import agent"):
+            import agent  # noqa: F401
+    except Exception as e:
+        logger.error(f"import agent failed: {e}")
+    if args.heavy:
+        ensure_funasr()
+        ensure_cosyvoice()
+    for row in report():
+        print(f"{row['step']:<20} {row['ms']:>9.1f} ms  {row['status']}")
+    print(f"{'total':<20} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+
+from livekit.agents import llm
+from livekit.agents.voice import Agent, ModelSettings
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("chat_window")
+
+# จำกัดขนาด prompt ที่ส่งให้ LLM ต่อ turn ไม่ให้โตตามความยาวสาย (prefill ของ qwen2.5:7b บน CPU
+# เพิ่มตามจำนวน token และเกิน num_ctx ของ Ollama เมื่อไหร่ Ollama ตัด prompt เองแบบไม่บอก)
+#
+#   [system prompt (ครั้งเดียว)] [สรุปบทสนทนาก่อนหน้า] [turn ล่าสุด ...]
+#
+# prefix ต้องคงที่ระหว่าง turn ให้ prompt cache ของ Ollama (KV cache ของ prompt ก่อนหน้า) ใช้ต่อได้
+# จึงไม่เลื่อน window ทีละ turn แต่รอจนเกิน budget แล้วสรุป turn เก่าทีเดียวให้เหลือ target_ratio ของ budget
+# (prefix เปลี่ยนหนึ่งครั้งต่อการ compact) การสรุปทำหลังเอเจนต์ตอบเสร็จ ระหว่างนั้น turn เก่ายังอยู่ใน prompt
+DEFAULT_BUDGET_TOKENS = int(os.getenv("AGENT_CONTEXT_BUDGET", "1500"))
+
+# request สรุปขึ้นต้นด้วย prompt เดียวกับ turn ล่าสุด (system + สรุปเดิม + turn ที่จะสรุป) แล้วต่อท้ายด้วยคำสั่ง
+# Ollama จึง prefill แค่คำสั่ง ไม่ต้องอ่านบทสนทนาใหม่ทั้งหมด
+SUMMARY_PROMPT = (
+    "(คำสั่งระบบ ไม่ใช่คำพูดลูกค้า) สรุปบทสนทนาข้างต้นเป็นภาษาไทยสั้นๆ ไม่เกิน {words} คำ "
+    "รวมสรุปก่อนหน้า (ถ้ามี) เก็บชื่อ ความต้องการ สินค้า ตัวเลข และสิ่งที่ตกลงกันไว้ ไม่ต้องเกริ่นนำ"
+)
+
+CHAT_WINDOW_COMPACTIONS = Counter(
+    "agent_chat_window_compactions",
+    "Chat history compactions by method",
+    ["method"],
+)
+CHAT_WINDOW_TOKENS = Gauge(
+    "agent_chat_window_prompt_tokens",
+    "Estimated prompt tokens of the last LLM request",
+    multiprocess_mode="max",
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # ประมาณแบบไม่ต้องโหลด tokenizer: ภาษาไทยราว 2 ตัวอักษรต่อ token (BPE ของ qwen2.5) อย่างอื่นราว 4
+    thai = sum(1 for ch in text if "\u0e00" <= ch <= "\u0e7f")
+    return (thai + 1) // 2 + (len(text) - thai + 3) // 4
+
+
+def item_tokens(item: llm.ChatItem) -> int:
+    # + overhead ของ chat template ต่อข้อความ (<|im_start|>role ... <|im_end|>)
+    if item.type == "message":
+        return estimate_tokens(item.text_content or "") + 4
+    if item.type == "function_call":
+        return estimate_tokens(item.name + item.arguments) + 4
+    if item.type == "function_call_output":
+        return estimate_tokens(item.output) + 4
+    return 0
+
+
+class ChatWindow:
+    # หนึ่ง window ต่อ Agent (history ของสายเดียว)
+    def __init__(
+        self,
+        *,
+        budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+        target_ratio: float = 0.5,
+        keep_recent: int = 4,
+        summary_tokens: int = 200,
+        summarizer: llm.LLM | None = None,
+    ):
+        self.budget_tokens = budget_tokens
+        self.target_ratio = target_ratio
+        # จำนวนข้อความล่าสุดที่ไม่สรุปเสมอ
+        self.keep_recent = keep_recent
+        # สรุปไม่ควรกิน budget เกินหนึ่งในสี่
+        self.summary_tokens = min(summary_tokens, budget_tokens // 4)
+        # None = สรุปแบบตัดข้อความ (ไม่ต้องเรียก LLM)
+        self._summarizer = summarizer
+        self._summary = ""
+        # id ของข้อความแรกที่ยังส่งเต็ม ข้อความก่อนหน้านี้อยู่ในสรุปแล้ว
+        self._cut_id: str | None = None
+        self._pending: tuple[str, list[llm.ChatItem], list[llm.ChatItem]] | None = None
+        self._task: asyncio.Task | None = None
+        self._last_tokens = 0
+        self._compactions = 0
+        self._truncations = 0
+
+    def apply(self, chat_ctx: llm.ChatContext, *, record: bool = True) -> llm.ChatContext:
+        # คืน ChatContext ใหม่ที่ส่งให้ LLM (ไม่แก้ chat_ctx ของ Agent)
+        # record=False (speculation ดู speculative_llm.py): prompt เดียวกับที่ llm_node จะส่ง แต่ไม่นับสถิติและไม่ตั้ง compaction
+        system: list[llm.ChatItem] = []
+        seen: set[str] = set()
+        history: list[llm.ChatItem] = []
+        for item in chat_ctx.items:
+            if item.type == "message" and item.role in ("system", "developer"):
+                # system prompt ที่ซ้ำกัน (ใส่ทั้งใน chat_ctx และ instructions) เหลืออันเดียว
+                text = item.text_content or ""
+                if text not in seen:
+                    seen.add(text)
+                    system.append(item)
+            else:
+                history.append(item)
+
+        start = self._index_of(history, self._cut_id)
+        kept = history[start:]
+        fixed = sum(item_tokens(i) for i in system) + (estimate_tokens(self._summary) + 4 if self._summary else 0)
+        kept_tokens = [item_tokens(i) for i in kept]
+        total = fixed + sum(kept_tokens)
+
+        prefix = list(system)
+        if self._summary:
+            prefix.append(llm.ChatMessage(id="chat_window.summary", role="system", content=[f"สรุปบทสนทนาก่อนหน้า: {self._summary}"]))
+
+        if record and total > self.budget_tokens and self._pending is None and (self._task is None or self._task.done()):
+            cut = self._choose_cut(kept, kept_tokens, fixed)
+            if cut > 0:
+                self._pending = (kept[cut].id, prefix, kept[:cut])
+
+        if total > self.budget_tokens * 1.5:
+            # สรุปไม่ทัน (หรือ turn เดียวยาวมาก): ตัดข้อความเก่าทิ้งไปก่อน prefix เปลี่ยนทุก turn จนกว่าจะสรุปเสร็จ
+            if record:
+                self._truncations += 1
+            while len(kept) > 1 and total > self.budget_tokens:
+                total -= kept_tokens.pop(0)
+                kept.pop(0)
+
+        if record:
+            self._last_tokens = total
+            CHAT_WINDOW_TOKENS.set(total)
+        return llm.ChatContext(prefix + kept)
+
+    @staticmethod
+    def _index_of(history: list[llm.ChatItem], item_id: str | None) -> int:
+        if item_id is None:
+            return 0
+        for i, item in enumerate(history):
+            if item.id == item_id:
+                return i
+        # ข้อความที่ตัดไว้หายไป (history ถูกแก้) เริ่มใหม่ทั้งหมด
+        return 0
+
+    def _choose_cut(self, kept: list[llm.ChatItem], kept_tokens: list[int], fixed: int) -> int:
+        # ตัดที่ข้อความของผู้ใช้เท่านั้น (ไม่แยก function_call กับ output) ให้ส่วนที่เหลือ <= target
+        target = self.budget_tokens * self.target_ratio - fixed - self.summary_tokens
+        limit = len(kept) - self.keep_recent
+        remaining = sum(kept_tokens)
+        cut = 0
+        for i in range(1, max(limit, 0) + 1):
+            remaining -= kept_tokens[i - 1]
+            if i < len(kept) and kept[i].type == "message" and kept[i].role == "user":
+                cut = i
+                if remaining <= target:
+                    break
+        return cut
+
+    def schedule_compaction(self) -> None:
+        # เรียกหลังเอเจนต์ตอบจบ สรุปในพื้นหลังไม่ให้ไปแย่ง LLM ระหว่างที่ผู้ใช้รอคำตอบ
+        if self._pending is None or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._compact(*self._pending), name="chat_window_compact")
+
+    async def _compact(self, cut_id: str, prefix: list[llm.ChatItem], items: list[llm.ChatItem]) -> None:
+        method = "llm" if self._summarizer is not None else "truncate"
+        summary = None
+        if self._summarizer is not None:
+            try:
+                summary = await self._summarize(prefix, items)
+            except Exception as e:
+                logger.warning(f"Summarizing chat history failed, truncating instead: {e}")
+                method = "truncate"
+        if not summary:
+            summary = self._truncated_summary(items)
+        self._summary = summary
+        self._cut_id = cut_id
+        self._pending = None
+        self._compactions += 1
+        CHAT_WINDOW_COMPACTIONS.labels(method=method).inc()
+        logger.info(f"Compacted {len(items)} chat items into a {estimate_tokens(summary)} token summary ({method})")
+
+    async def _summarize(self, prefix: list[llm.ChatItem], items: list[llm.ChatItem]) -> str:
+        chat_ctx = llm.ChatContext(prefix + items)
+        chat_ctx.add_message(role="user", content=SUMMARY_PROMPT.format(words=self.summary_tokens // 2))
+        parts = []
+        async with self._summarizer.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    parts.append(chunk.delta.content)
+        return "".join(parts).strip()
+
+    def _truncated_summary(self, items: list[llm.ChatItem]) -> str:
+        # เก็บคำพูดของลูกค้า (ล่าสุดก่อน) จนเต็ม summary_tokens
+        lines = [self._summary] if self._summary else []
+        lines += [f"ลูกค้า: {i.text_content}" for i in items if i.type == "message" and i.role == "user" and i.text_content]
+        out, used = [], 0
+        for line in reversed(lines):
+            used += estimate_tokens(line)
+            if used > self.summary_tokens:
+                break
+            out.append(line)
+        return " / ".join(reversed(out))
+
+    async def aclose(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "prompt_tokens": self._last_tokens,
+            "summary_tokens": estimate_tokens(self._summary),
+            "compactions": self._compactions,
+            "truncations": self._truncations,
+        }
+
+
+class WindowedAgent(Agent):
+    # Agent ที่ส่ง history ผ่าน ChatWindow ก่อนถึง LLM
+    def __init__(self, *, window: ChatWindow | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.window = window or ChatWindow()
+
+    async def llm_node(self, chat_ctx: llm.ChatContext, tools: list[llm.Tool], model_settings: ModelSettings):
+        async for chunk in Agent.default.llm_node(self, self.window.apply(chat_ctx), tools, model_settings):
+            yield chunk
+        self.window.schedule_compaction()
+
+    async def on_exit(self) -> None:
+        await self.window.aclose()
@@ -1,15 +1,167 @@
 import asyncio
 import logging
-from livekit.agents import tts, utils, APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS
-import edge_tts
+import ssl
+import time
+from xml.sax.saxutils import escape
+
+import aiohttp
+import certifi
+from livekit.agents import tts, utils, APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS, APIConnectionError, APIStatusError, APITimeoutError
+from edge_tts.communicate import (
+    connect_id,
+    date_to_string,
+    get_headers_and_data,
+    mkssml,
+    remove_incompatible_characters,
+    split_text_by_byte_length,
+    ssml_headers_plus_data,
+)
+from edge_tts.constants import SEC_MS_GEC_VERSION, WSS_HEADERS, WSS_URL
+from edge_tts.data_classes import TTSConfig
+from edge_tts.drm import DRM
+
+from tts_cache import TTSCache, cache_key, get_tts_cache
 
 logger = logging.getLogger("edge_tts_plugin")
 
+SAMPLE_RATE = 24000
+
+# output_format:
+#   "mp3"         ส่ง MP3 ให้ LiveKit decode เอง (แบบเดิม)
+#   "pcm"         ขอ raw PCM 16-bit จาก service โดยตรง
+#   "decoded-mp3" รับ MP3 แล้ว decode ทีละ chunk ใน process ส่ง PCM ออกไป
+_SERVICE_FORMATS = {
+    "mp3": "audio-24khz-48kbitrate-mono-mp3",
+    "pcm": "raw-24khz-16bit-mono-pcm",
+    "decoded-mp3": "audio-24khz-48kbitrate-mono-mp3",
+}
+
+# service ตัด websocket ที่เปิดค้างนาน และ token Sec-MS-GEC มีอายุจำกัด เปิดใหม่ก่อนถึงเวลานั้น
+MAX_SESSION_DURATION = 240.0
+
+
 class EdgeTTS(tts.TTS):
-    def __init__(self, voice: str = "th-TH-PremwadeeNeural"):
+    def __init__(
+        self,
+        voice: str = "th-TH-PremwadeeNeural",
+        cache: TTSCache | None = None,
+        use_cache: bool = True,
+        output_format: str = "mp3",
+        endpoint: str = WSS_URL,
+        request_timeout: float | None = None,
+        rate: str = "+0%",
+        volume: str = "+0%",
+        pitch: str = "+0Hz",
+    ):
+        if output_format not in _SERVICE_FORMATS:
+            raise ValueError(f"output_format must be one of {list(_SERVICE_FORMATS)}")
         # EdgeTTS produces MP3 by default which LiveKit can decode
-        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=24000, num_channels=1)
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=SAMPLE_RATE, num_channels=1)
         self.voice = voice
+        self._config = TTSConfig(voice, rate, volume, pitch, "SentenceBoundary")
+        self._output_format = output_format
+        self._endpoint = endpoint
+        # None = ใช้ conn_options.timeout ของแต่ละ request
+        self._request_timeout = request_timeout
+        # วลีที่พูดซ้ำบ่อย (ทักทาย, ยืนยัน) เล่นจาก cache แทนการเรียก service ใหม่
+        self._cache = (cache or get_tts_cache()) if use_cache else None
+
+        # websocket เดียวใช้ต่อกันได้หลายประโยค (ส่ง speech.config ครั้งเดียวตอนเปิด)
+        self._session: aiohttp.ClientSession | None = None
+        self._pool = utils.ConnectionPool[aiohttp.ClientWebSocketResponse](
+            connect_cb=self._connect_ws,
+            close_cb=self._close_ws,
+            max_session_duration=MAX_SESSION_DURATION,
+        )
+        self._ssl = ssl.create_default_context(cafile=certifi.where()) if endpoint.startswith("wss://") else None
+
+    @property
+    def mime_type(self) -> str:
+        return "audio/mpeg" if self._output_format == "mp3" else "audio/pcm"
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats() if self._cache else {}
+
+    def prewarm(self) -> None:
+        # เปิด websocket ล่วงหน้า ประโยคแรกจะไม่ต้องรอ handshake
+        self._pool.prewarm()
+
+    async def aclose(self) -> None:
+        await self._pool.aclose()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _connect_ws(self, timeout: float) -> aiohttp.ClientWebSocketResponse:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(trust_env=True)
+        sep = "&" if "?" in self._endpoint else "?"
+        url = (
+            f"{self._endpoint}{sep}ConnectionId={connect_id()}"
+            f"&Sec-MS-GEC={DRM.generate_sec_ms_gec()}"
+            f"&Sec-MS-GEC-Version={SEC_MS_GEC_VERSION}"
+        )
+        start = time.perf_counter()
+        try:
+            ws = await asyncio.wait_for(
+                self._session.ws_connect(url, compress=15, headers=DRM.headers_with_muid(WSS_HEADERS), ssl=self._ssl),
+                timeout,
+            )
+        except asyncio.TimeoutError as e:
+            raise APITimeoutError("EdgeTTS websocket connect timed out") from e
+        except aiohttp.ClientResponseError as e:
+            if e.status == 403:
+                # นาฬิกาเครื่องเพี้ยนจาก service ปรับแล้วให้ retry ใหม่
+                DRM.handle_client_response_error(e)
+            raise APIStatusError(f"EdgeTTS websocket rejected: {e.message}", status_code=e.status, retryable=e.status == 403 or e.status >= 500) from e
+        except aiohttp.ClientError as e:
+            raise APIConnectionError(f"EdgeTTS websocket connect failed: {e}") from e
+
+        await ws.send_str(
+            f"X-Timestamp:{date_to_string()}\r\n"
+            "Content-Type:application/json; charset=utf-8\r\n"
+            "Path:speech.config\r\n\r\n"
+            '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+            '"sentenceBoundaryEnabled":"false","wordBoundaryEnabled":"false"'
+            "},"
+            f'"outputFormat":"{_SERVICE_FORMATS[self._output_format]}"'
+            "}}}}\r\n"
+        )
+        logger.info(f"EdgeTTS websocket connected in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return ws
+
+    async def _close_ws(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        await ws.close()
+
+    async def _request(self, ws: aiohttp.ClientWebSocketResponse, text: str):
+        # ส่ง SSML หนึ่งก้อนแล้วอ่าน audio ของ request นั้นจนถึง turn.end
+        request_id = connect_id()
+        await ws.send_str(ssml_headers_plus_data(request_id, date_to_string(), mkssml(self._config, text)))
+
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                encoded = msg.data.encode("utf-8")
+                headers, _ = get_headers_and_data(encoded, encoded.find(b"\r\n\r\n"))
+                if headers.get(b"X-RequestId", request_id.encode()) != request_id.encode():
+                    continue
+                if headers.get(b"Path") == b"turn.end":
+                    return
+            elif msg.type == aiohttp.WSMsgType.BINARY:
+                if len(msg.data) < 2:
+                    raise APIConnectionError("EdgeTTS sent a binary message without header length")
+                # 2 byte แรกคือความยาว header ตามด้วย header ที่ลงท้ายด้วย \r\n แล้วจึงเป็นเสียง
+                header_length = int.from_bytes(msg.data[:2], "big")
+                headers, data = get_headers_and_data(msg.data[2:], header_length - 2)
+                if headers.get(b"Path") != b"audio" or headers.get(b"X-RequestId", request_id.encode()) != request_id.encode():
+                    continue
+                # ข้อความปิดท้าย stream ไม่มี Content-Type และไม่มีข้อมูล
+                if data:
+                    yield data
+            elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.CLOSING):
+                break
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                raise APIConnectionError(f"EdgeTTS websocket error: {ws.exception()}")
+        raise APIConnectionError("EdgeTTS websocket closed before turn.end")
 
     def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> tts.ChunkedStream:
         return EdgeTTSStream(self, text, conn_options)
@@ -20,22 +172,82 @@ class EdgeTTSStream(tts.ChunkedStream):
         self._tts = tts_instance
 
     async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(
+            request_id=utils.shortuuid("tts_req_"),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            mime_type=self._tts.mime_type,
+        )
+
+        cache = self._tts._cache
+        key = cache_key(self._input_text, voice=self._tts.voice, model="edge-tts", sample_rate=SAMPLE_RATE, mime_type=self._tts.mime_type)
+        cached = await cache.aget(key) if cache else None
+        if cached is not None:
+            output_emitter.push(cached)
+            logger.info(f"EdgeTTS cache hit: {len(self._input_text)} chars")
+            return
+
+        timeout = self._tts._request_timeout or self._conn_options.timeout
+        start = time.perf_counter()
         try:
-            communicate = edge_tts.Communicate(self._input_text, self._tts.voice)
-            
-            # EdgeTTS outputs MP3 audio (audio/mpeg)
-            output_emitter.initialize(
-                request_id=utils.shortuuid("tts_req_"),
-                sample_rate=24000, 
-                num_channels=1,
-                mime_type="audio/mpeg" 
-            )
+            async with asyncio.timeout(timeout):
+                audio = await self._synthesize(output_emitter, timeout)
+        except TimeoutError as e:
+            raise APITimeoutError(f"EdgeTTS request timed out after {timeout:.1f}s") from e
+        except aiohttp.ClientError as e:
+            raise APIConnectionError(f"EdgeTTS request failed: {e}") from e
+
+        if not audio:
+            raise APIConnectionError(f"EdgeTTS returned no audio for: {self._input_text!r}")
+        if cache:
+            await cache.aput(key, b"".join(audio))
+        logger.info(
+            f"EdgeTTS finished synthesizing: {len(self._input_text)} chars in {(time.perf_counter() - start) * 1000:.0f} ms"
+            f" (reused connection: {self._tts._pool.last_connection_reused})"
+        )
+
+    async def _synthesize(self, output_emitter: tts.AudioEmitter, timeout: float) -> list[bytes]:
+        texts = split_text_by_byte_length(escape(remove_incompatible_characters(self._input_text)), 4096)
+        decoder = None
+        decode_task = None
+        audio: list[bytes] = []
 
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    output_emitter.push(chunk["data"])
-            
-            logger.info(f"EdgeTTS finished synthesizing: {len(self._input_text)} chars")
+        if self._tts._output_format == "decoded-mp3":
+            decoder = utils.codecs.AudioStreamDecoder(sample_rate=SAMPLE_RATE, num_channels=1, format="audio/mpeg")
 
-        except Exception as e:
-            logger.error(f"EdgeTTS failed: {e}")
+            async def _drain_decoder() -> None:
+                async for frame in decoder:
+                    pcm = frame.data.tobytes()
+                    output_emitter.push(pcm)
+                    audio.append(pcm)
+
+            decode_task = asyncio.create_task(_drain_decoder())
+
+        try:
+            pool = self._tts._pool
+            for text in texts:
+                ws = await pool.get(timeout=timeout)
+                if ws.closed:
+                    # service ปิด socket ที่ว่างอยู่ไปแล้ว ทิ้งแล้วเปิดใหม่
+                    pool.remove(ws)
+                    ws = await pool.get(timeout=timeout)
+                try:
+                    async for data in self._tts._request(ws, text):
+                        if decoder is not None:
+                            decoder.push(data)
+                        else:
+                            output_emitter.push(data)
+                            audio.append(data)
+                except BaseException:
+                    # request ค้างกลางทาง socket นี้อาจยังมีข้อมูลเก่าค้างอยู่ ไม่ใช้ต่อ
+                    pool.remove(ws)
+                    raise
+                pool.put(ws)
+            if decoder is not None:
+                decoder.end_input()
+                await decode_task
+        finally:
+            if decode_task is not None:
+                await utils.aio.cancel_and_wait(decode_task)
+                await decoder.aclose()
+        return audio
@@ -0,0 +1,145 @@
+# websocket ที่พูด protocol เดียวกับ Edge TTS แต่ส่งเสียงสำเร็จรูป สำหรับทดสอบ/benchmark EdgeTTS แบบไม่ต้องออก internet
+#
+#   python edge_tts_standin.py --port 8765 --latency-ms 120
+#   EdgeTTS(endpoint="ws://127.0.0.1:8765/edge/v1", output_format="pcm")
+#
+# เสียงที่ส่ง: ไฟล์จาก --audio (ส่งตามเดิมทุก request) หรือ tone ยาวตามจำนวนตัวอักษร
+# (raw PCM หรือ encode เป็น MP3 ด้วย PyAV ตาม outputFormat ที่ client ขอ)
+import argparse
+import asyncio
+import io
+import json
+import logging
+import re
+
+import numpy as np
+from aiohttp import web
+
+logger = logging.getLogger("edge_tts_standin")
+
+SAMPLE_RATE = 24000
+CHUNK_BYTES = 4096
+
+
+def _tone_pcm(n_chars: int, ms_per_char: float) -> bytes:
+    n = int(SAMPLE_RATE * n_chars * ms_per_char / 1000)
+    t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16).tobytes()
+
+
+def _encode_mp3(pcm: bytes) -> bytes:
+    import av
+
+    buf = io.BytesIO()
+    with av.open(buf, "w", format="mp3") as container:
+        stream = container.add_stream("mp3", rate=SAMPLE_RATE, layout="mono")
+        samples = np.frombuffer(pcm, dtype=np.int16).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+        frame.sample_rate = SAMPLE_RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def _text_message(request_id: str, path: str, body: str = "") -> str:
+    return f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\nPath:{path}\r\n\r\n{body}"
+
+
+def _audio_message(request_id: str, content_type: str | None, data: bytes) -> bytes:
+    headers = f"X-RequestId:{request_id}\r\n"
+    if content_type:
+        headers += f"Content-Type:{content_type}\r\n"
+    headers = (headers + "Path:audio\r\n").encode()
+    return len(headers).to_bytes(2, "big") + headers + data
+
+
+class StandIn:
+    def __init__(self, *, audio: bytes | None = None, latency_ms: float = 100.0, ms_per_char: float = 60.0, chunk_interval_ms: float = 0.0):
+        self.audio = audio
+        self.latency_s = latency_ms / 1000
+        self.ms_per_char = ms_per_char
+        self.chunk_interval_s = chunk_interval_ms / 1000
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        logger.info(f"connection #{self.connections} from {request.remote}")
+        output_format = "audio-24khz-48kbitrate-mono-mp3"
+
+        async for msg in ws:
+            if msg.type != web.WSMsgType.TEXT:
+                continue
+            head, _, body = msg.data.partition("\r\n\r\n")
+            headers = dict(line.split(":", 1) for line in head.split("\r\n") if ":" in line)
+            if headers.get("Path") == "speech.config":
+                output_format = json.loads(body)["context"]["synthesis"]["audio"]["outputFormat"]
+            elif headers.get("Path") == "ssml":
+                try:
+                    await self._respond(ws, headers.get("X-RequestId", ""), body, output_format)
+                except ConnectionResetError:
+                    # client ตัดกลางทาง (เช่น timeout ฝั่ง client)
+                    break
+        return ws
+
+    async def _respond(self, ws: web.WebSocketResponse, request_id: str, ssml: str, output_format: str) -> None:
+        self.requests += 1
+        text = re.sub(r"<[^>]+>", "", ssml)
+        raw = output_format.startswith("raw-")
+        if self.audio is not None:
+            audio = self.audio
+        else:
+            pcm = _tone_pcm(len(text), self.ms_per_char)
+            audio = pcm if raw else _encode_mp3(pcm)
+        content_type = "audio/x-wav" if raw else "audio/mpeg"
+
+        await ws.send_str(_text_message(request_id, "turn.start", "{}"))
+        await asyncio.sleep(self.latency_s)
+        for i in range(0, len(audio), CHUNK_BYTES):
+            await ws.send_bytes(_audio_message(request_id, content_type, audio[i:i + CHUNK_BYTES]))
+            if self.chunk_interval_s:
+                await asyncio.sleep(self.chunk_interval_s)
+        await ws.send_bytes(_audio_message(request_id, None, b""))
+        await ws.send_str(_text_message(request_id, "turn.end", "{}"))
+
+
+def make_app(standin: StandIn) -> web.Application:
+    app = web.Application()
+    app.router.add_get("/edge/v1", standin.handle)
+    return app
+
+
+async def start(standin: StandIn, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    # เปิด server ใน event loop ปัจจุบัน คืน runner (ไว้ cleanup) และ endpoint สำหรับ EdgeTTS
+    runner = web.AppRunner(make_app(standin))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"ws://{host}:{port}/edge/v1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--audio", help="canned audio file served for every request")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="delay before the first audio chunk")
+    parser.add_argument("--ms-per-char", type=float, default=60.0)
+    args = parser.parse_args()
+
+    audio = None
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+    logging.basicConfig(level=logging.INFO)
+    standin = StandIn(audio=audio, latency_ms=args.latency_ms, ms_per_char=args.ms_per_char)
+    web.run_app(make_app(standin), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
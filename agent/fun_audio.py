@@ -1,224 +1,83 @@
-import sys
 import os
 import asyncio
-from typing import AsyncGenerator
+import contextlib
+import re
+import time
+from collections import deque
 import logging
-# --- 1. Aggressive YAML Patch (Nuclear Option) ---
-import yaml
-
-def patch_yaml():
-    # Patch PyYAML
-    loaders = [
-        'Loader', 'SafeLoader', 
-        'CLoader', 'CSafeLoader',
-        'FullLoader', 'UnsafeLoader'
-    ]
-    
-    for name in loaders:
-        try:
-            loader_cls = getattr(yaml, name, None)
-            if loader_cls:
-                setattr(loader_cls, 'max_depth', 10000)
-        except Exception as e:
-            print(f"Warning: Could not patch yaml.{name}: {e}")
-
-    # Patch ruamel.yaml (Crucial for HyperPyYAML/CosyVoice)
-    try:
-        import ruamel.yaml
-        ruamel_loaders = ['Loader', 'SafeLoader', 'RoundTripLoader']
-        for name in ruamel_loaders:
-             try:
-                loader_cls = getattr(ruamel.yaml, name, None)
-                if loader_cls:
-                    setattr(loader_cls, 'max_depth', 10000)
-             except Exception as e:
-                print(f"Warning: Could not patch ruamel.yaml.{name}: {e}")
-    except ImportError:
-        print("Warning: ruamel.yaml not found, skipping patch.")
-    except Exception as e:
-        print(f"Warning: Error patching ruamel.yaml: {e}")
-
-# เรียกใช้งานทันทีก่อนจะ import library อื่น
-patch_yaml()
-# ------------------------------------------------
-# --- Patch ModelScope to use HuggingFace ---
-# This ensures that internal downloads (like wetext) use HF instead of ModelScope
-try:
-    import modelscope
-    from huggingface_hub import snapshot_download as hf_snapshot_download
-    import logging
-    
-    logger = logging.getLogger("FunAudio")
-
-    def patched_snapshot_download(model_id, *args, **kwargs):
-        logger.info(f"Intercepted ModelScope download for {model_id}. Redirecting to HuggingFace...")
-        # Map known ModelScope IDs to HF IDs if they differ, otherwise assume same
-        if model_id == "pengzhendong/wetext":
-            # The repo_id on HF is the same
-            pass
-            
-        # Filter out arguments that might not be compatible if needed, 
-        # but snapshot_download signatures are similar enough for basic usage.
-        # safely remove 'cache_dir' if it's None to let HF use default or specific one
-        if 'cache_dir' in kwargs and kwargs['cache_dir'] is None:
-            del kwargs['cache_dir']
-            
-        return hf_snapshot_download(repo_id=model_id, *args, **kwargs)
-
-    modelscope.snapshot_download = patched_snapshot_download
-    logger.info("Successfully patched modelscope.snapshot_download to use huggingface_hub configuration.")
-
-except ImportError:
-    print("Warning: modelscope or huggingface_hub not found, skipping patch.")
-except Exception as e:
-    print(f"Warning: Failed to patch modelscope: {e}")
-
 
 from livekit import rtc
-from livekit.agents import stt, tts, utils, DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions
+from livekit.agents import stt, tts, utils, vad as vad_mod, DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions, APIConnectionError, APIError, NOT_GIVEN, NotGivenOr
+from livekit.agents.utils import is_given
 from livekit.agents.utils import AudioBuffer
 import numpy as np
-import yaml
-
-# --- 1. Monkey-patch PyYAML AND PyTorch Audio Load ---
-try:
-    if not hasattr(yaml.Loader, 'max_depth'):
-        yaml.Loader.max_depth = 10000
-    if not hasattr(yaml.SafeLoader, 'max_depth'):
-        yaml.SafeLoader.max_depth = 10000
-except Exception:
-    pass
-
-try:
-    # Patch torchaudio.load to use soundfile directly (bypass TorchCodec issue)
-    import torchaudio
-    import soundfile as sf
-    import torch
-
-    def patched_torchaudio_load(filepath, **kwargs):
-        # Ignore backend kwargs etc
-        data, sample_rate = sf.read(filepath)
-        if data.ndim == 1:
-            data = data.reshape(-1, 1) # (samples, 1)
-        data = data.T # (channels, samples)
-        tensor = torch.from_numpy(data).float() 
-        return tensor, sample_rate
-
-    logger.info("Patching torchaudio.load with soundfile...")
-    torchaudio.load = patched_torchaudio_load
-except ImportError as e:
-    logger.warning(f"Could not patch torchaudio: {e}")
-except Exception as e:
-    logger.warning(f"Error patching torchaudio: {e}")
-
-# --- 2. Path Setup ---
-# หา Path ของ Project Root ให้แม่นยำขึ้น
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-# สมมติว่า fun_audio.py อยู่ในโฟลเดอร์ agent/ หรือ root ของ project
-# ปรับให้ชี้ไปที่ Root หลักที่มีโฟลเดอร์ Fun-Audio-Chat
-# ถ้าโครงสร้างคือ: /Users/.../Sources/livekit-demo/agent/fun_audio.py
-# และ model อยู่: /Users/.../Sources/livekit-demo/Fun-Audio-Chat/pretrained_models
-PROJECT_ROOT = os.path.dirname(CURRENT_DIR) 
-
-# ถ้า fun_audio.py อยู่ใน livekit-demo เลย ให้ใช้ CURRENT_DIR
-# PROJECT_ROOT = CURRENT_DIR 
-
-COSYVOICE_PATH = os.path.join(PROJECT_ROOT, "Fun-Audio-Chat/third_party/CosyVoice")
-if COSYVOICE_PATH not in sys.path:
-    sys.path.append(COSYVOICE_PATH)
+
+# torch / funasr / cosyvoice และ monkey-patch ทั้งหมดอยู่ใน bootstrap และถูก import ตอนสร้าง STT/TTS เท่านั้น
+import bootstrap
+from bootstrap import COSYVOICE_PATH, PROJECT_ROOT
+from audio_ingest import AudioAccumulator, ingest_frames
+from inference_executor import InferenceExecutor
+from pcm_output import PcmConverter
+from phrase_chunker import PhraseChunker
+from tts_cache import TTSCache, cache_key, get_tts_cache
+from stt_batcher import get_batcher
+from tts_scheduler import TTSScheduler, get_scheduler
+from model_registry import REGISTRY
+from model_load_cache import cosyvoice_load_cache, file_sha256
+from inference_backends import apply_cosyvoice_backend, check_backend, load_sensevoice
+from placement import get_placement
+from worker_load import record_rtf
+from voice_registry import Voice, VoiceNotFound, VoiceStore, find_voice_wav, get_voice_store
 
 logger = logging.getLogger("fun_audio")
 
-# --- 3. Patch load_wav BEFORE importing CosyVoice ---
-# This fixes "TorchCodec is required" error by ensuring we use a working backend
-try:
-    import cosyvoice.utils.file_utils
-    import torchaudio
-    import torch
-    
-    # Original load_wav might be failing. specific to this environment.
-    def patched_load_wav(wav, target_sr, min_sr=16000):
-        # Generic load, let torchaudio decide backend or default
-        try:
-            # Try loading without enforcing backend first (newer torchaudio might prefer this)
-            speech, sample_rate = torchaudio.load(wav) 
-        except Exception:
-            # Fallback to soundfile explicit
-            speech, sample_rate = torchaudio.load(wav, backend='soundfile')
-            
-        speech = speech.mean(dim=0, keepdim=True)
-        if sample_rate != target_sr:
-            assert sample_rate >= min_sr, 'wav sample rate {} must be greater than {}'.format(sample_rate, target_sr)
-            # Use Resample. Note: this might be slow on CPU but standard.
-            speech = torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=target_sr)(speech)
-        return speech
-
-    cosyvoice.utils.file_utils.load_wav = patched_load_wav
-    logger.info("Successfully monkey-patched cosyvoice.utils.file_utils.load_wav")
-
-except ImportError:
-    pass
-except Exception as e:
-    logger.warning(f"Failed to patch load_wav: {e}")
-
-# --- 5. Monkey-Patch CosyVoice TransformerLM.sampling_ids (Fix RuntimeError crash) ---
-# This fixes "sampling reaches max_trials" error in Thai/Cross-Lingual
-try:
-    from cosyvoice.llm.llm import TransformerLM
-    
-    # Original sampling_ids raises RuntimeError if it can't find a token.
-    # We patch it to return the token anyway (best effort) after warnings.
-    def patched_sampling_ids(self, weighted_scores, decoded_tokens, sampling, ignore_eos=True):
-        num_trials, max_trials = 0, 200 # Increased from 100
-        while True:
-            top_ids = self.sampling(weighted_scores, decoded_tokens, sampling)
-            if (not ignore_eos) or (top_ids < self.speech_token_size):
-                break
-            num_trials += 1
-            if num_trials > max_trials:
-                # logger.debug(f"sampling reaches max_trials {max_trials} and still get eos. Force returning EOS.")
-                break # Just return attempts to avoid crash
-        return top_ids
-
-    TransformerLM.sampling_ids = patched_sampling_ids
-    logger.info("Successfully monkey-patched TransformerLM.sampling_ids")
-except ImportError:
-    pass
-except Exception as e:
-    logger.warning(f"Failed to patch sampling_ids: {e}")
-
-# --- 6. Try Import Libraries ---
-try:
-    from cosyvoice.cli.cosyvoice import CosyVoice, CosyVoice2, CosyVoice3
-    from cosyvoice.utils.file_utils import load_wav
-    HAS_COSYVOICE = True
-except ImportError as e:
-    logger.warning(f"CosyVoice library import failed: {e}")
-    HAS_COSYVOICE = False
-
-try:
-    from funasr import AutoModel
-    # from funasr.utils.postprocess_utils import rich_transcription_postprocess
-    HAS_FUNASR = True
-except ImportError:
-    HAS_FUNASR = False
+
+def find_prompt_wav() -> str | None:
+    for name in ("asset/zero_shot_prompt.wav", "asset/cross_lingual_prompt.wav"):
+        path = os.path.join(COSYVOICE_PATH, name)
+        if os.path.exists(path):
+            return path
+    return None
 
 
+class _CopyOnReadDict(dict):
+    # คืน shallow copy ทุกครั้งที่อ่าน เพื่อให้ frontend แก้ไข model_input ได้โดยไม่กระทบ speaker ที่ลงทะเบียนไว้
+    def __getitem__(self, key):
+        return dict(super().__getitem__(key))
 
 
 class SenseVoiceSTT(stt.STT):
-    def __init__(self, model_path: str = "Fun-Audio-Chat/pretrained_models/SenseVoiceSmall", device: str = "cpu"):
-        super().__init__(capabilities=stt.STTCapabilities(streaming=False, interim_results=False))
+    def __init__(self, model_path: str = "Fun-Audio-Chat/pretrained_models/SenseVoiceSmall", device: str = "cpu", max_batch_size: int = 8, max_wait_ms: float = 10.0, vad: vad_mod.VAD | None = None, interim_interval: float = 0.6, window_s: float = 6.0, backend: str = "torch"):
+        # ถ้าส่ง vad มาจะเปิด streaming mode (ถอดความเป็นช่วงๆ ระหว่างพูด + interim transcript)
+        streaming = vad is not None
+        super().__init__(capabilities=stt.STTCapabilities(streaming=streaming, interim_results=streaming))
         self._model = None
+        self._batcher = None
+        self._vad = vad
+        self._interim_interval = interim_interval
+        self._window_s = window_s
+        # torch (fp32) / int8 / onnx ดู inference_backends.py
+        self.backend = check_backend(backend)
         
         full_model_path = os.path.join(PROJECT_ROOT, model_path)
         
-        if HAS_FUNASR:
+        AutoModel = bootstrap.ensure_funasr()
+        if AutoModel:
             logger.info(f"Loading SenseVoice model from: {full_model_path}")
             try:
                 if os.path.exists(full_model_path):
-                    self._model = AutoModel(model=full_model_path, device=device)
+                    # โหลดครั้งเดียวต่อ process แล้วแชร์ข้าม job
+                    self._model = REGISTRY.get_or_load(
+                        "sensevoice",
+                        full_model_path,
+                        lambda: load_sensevoice(AutoModel, full_model_path, device=device, backend=backend, threads=get_placement().threads("stt")),
+                        device=device,
+                        dtype=backend,
+                        engine="stt",
+                    )
                     logger.info("SenseVoice model loaded successfully")
+                    # utterance จากหลาย session ที่มาพร้อมกันจะถูกรวมเป็น batch เดียว
+                    self._batcher = get_batcher(self._model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
                 else:
                     logger.error(f"SenseVoice model path not found: {full_model_path}")
             except Exception as e:
@@ -227,65 +86,257 @@ class SenseVoiceSTT(stt.STT):
             logger.warning("funasr not installed. SenseVoiceSTT will not function.")
 
     async def _recognize_impl(self, buffer: AudioBuffer, *, language: str | None = None, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> stt.SpeechEvent:
-        if not HAS_FUNASR or not self._model:
+        if not self._model:
             # logger.warning("SenseVoice model not active, returning empty transcript")
             return stt.SpeechEvent(type=stt.SpeechEventType.FINAL_TRANSCRIPT, alternatives=[])
 
-        raw_bytes = b""
         if isinstance(buffer, rtc.AudioFrame):
-            raw_bytes = buffer.data.tobytes()
+            frames = [buffer]
         elif hasattr(buffer, 'frames'):
-             raw_bytes = b"".join([f.data.tobytes() for f in buffer.frames])
-        elif hasattr(buffer, 'data'):
-             raw_bytes = buffer.data.tobytes()
+            frames = buffer.frames
+        elif isinstance(buffer, list):
+            frames = buffer
         else:
-             return stt.SpeechEvent(type=stt.SpeechEventType.FINAL_TRANSCRIPT, alternatives=[])
-        
-        # LiveKit audio is 16-bit PCM
-        audio_np = np.frombuffer(raw_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+            return stt.SpeechEvent(type=stt.SpeechEventType.FINAL_TRANSCRIPT, alternatives=[])
+
+        # LiveKit audio is 16-bit PCM: แปลง/downmix/resample เป็น float32 16 kHz ลง buffer เดียว
+        audio_np = ingest_frames(frames, SENSEVOICE_SAMPLE_RATE)
+
+        return await self._batcher.recognize(audio_np, language or "th")
+
+    def batching_stats(self) -> dict:
+        return self._batcher.stats() if self._batcher else {}
+
+    def stream(self, *, language: NotGivenOr[str] = NOT_GIVEN, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "SenseVoiceRecognizeStream":
+        if self._vad is None:
+            raise NotImplementedError("SenseVoiceSTT needs a VAD for streaming, pass vad= or wrap it in stt.StreamAdapter")
+        return SenseVoiceRecognizeStream(
+            self,
+            vad=self._vad,
+            language=language if is_given(language) else "th",
+            conn_options=conn_options,
+        )
 
+    async def _decode(self, audio: np.ndarray, language: str) -> str:
+        if self._batcher is None or len(audio) == 0:
+            return ""
+        event = await self._batcher.recognize(audio, language)
+        return event.alternatives[0].text if event.alternatives else ""
+
+
+SENSEVOICE_SAMPLE_RATE = 16000
+_SENSEVOICE_TAGS = re.compile(r"^(?:<\|[^|]*\|>)+")
+
+
+def _find_cut(audio: np.ndarray, lo: int, hi: int, frame: int = 320) -> int:
+    # หาจุดตัดที่เงียบที่สุด (RMS ต่ำสุดต่อ 20ms) ในช่วง [lo, hi) เพื่อไม่ให้ตัดกลางคำ
+    hi = min(hi, len(audio))
+    lo = max(0, min(lo, hi - frame))
+    n = (hi - lo) // frame
+    if n <= 0:
+        return hi
+    energy = np.square(audio[lo:lo + n * frame]).reshape(n, frame).mean(axis=1)
+    return lo + int(np.argmin(energy)) * frame + frame // 2
+
+
+def _join_segments(texts: list[str]) -> str:
+    # SenseVoice ใส่ tag (<|th|><|NEUTRAL|>...) ทุกครั้งที่ decode เก็บไว้แค่ของ segment แรก
+    parts = [texts[0]] + [_SENSEVOICE_TAGS.sub("", t) for t in texts[1:]] if texts else []
+    return " ".join(p for p in parts if p)
+
+
+class _Utterance:
+    def __init__(self, frames: list[rtc.AudioFrame]):
+        self._audio = AudioAccumulator(SENSEVOICE_SAMPLE_RATE)
+        self._audio.append_frames(frames)
+        self.committed = 0  # จำนวน sample ที่ decode แล้วและจะไม่ decode ซ้ำ
+        self.texts: list[str] = []
+        self.interim_at = 0
+        self.ended = False
+        self.changed = asyncio.Event()
+        self.changed.set()
+
+    @property
+    def total(self) -> int:
+        return len(self._audio)
+
+    def append(self, frames: list[rtc.AudioFrame]) -> None:
+        self._audio.append_frames(frames)
+        self.changed.set()
+
+    def audio(self) -> np.ndarray:
+        return self._audio.view()
+
+
+class SenseVoiceRecognizeStream(stt.RecognizeStream):
+    # ใช้ VAD ตัดช่วงพูด ระหว่างพูดจะ decode หน้าต่างล่าสุดเป็น interim ทุก interim_interval วินาที
+    # เมื่อหน้าต่างยาวเกิน window_s จะ commit ส่วนต้น (ตัดตรงจุดเงียบ) เก็บ text ไว้ไม่ decode ซ้ำ
+    # ตอนจบประโยคจึงเหลือ decode แค่ส่วนท้ายที่ยังไม่ commit
+    def __init__(self, stt_: SenseVoiceSTT, *, vad: vad_mod.VAD, language: str, conn_options: APIConnectOptions):
+        super().__init__(stt=stt_, conn_options=conn_options, sample_rate=SENSEVOICE_SAMPLE_RATE)
+        self._sv = stt_
+        self._vad = vad
+        self._language = language
+        self._window = int(stt_._window_s * SENSEVOICE_SAMPLE_RATE)
+        self._commit_search = min(self._window // 2, 2 * SENSEVOICE_SAMPLE_RATE)
+        self._interim_samples = int(stt_._interim_interval * SENSEVOICE_SAMPLE_RATE)
+
+    async def _run(self) -> None:
+        vad_stream = self._vad.stream()
+
+        async def _forward_input() -> None:
+            async for frame in self._input_ch:
+                if isinstance(frame, self._FlushSentinel):
+                    vad_stream.flush()
+                    continue
+                vad_stream.push_frame(frame)
+            vad_stream.end_input()
+
+        async def _recognize() -> None:
+            utt: _Utterance | None = None
+            decoder: asyncio.Task | None = None
+            async for event in vad_stream:
+                if event.type == vad_mod.VADEventType.START_OF_SPEECH:
+                    if decoder is not None:
+                        await utils.aio.cancel_and_wait(decoder)
+                    utt = _Utterance(event.frames)
+                    decoder = asyncio.create_task(self._decode_loop(utt), name="sensevoice_decode_loop")
+                    self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH))
+
+                elif event.type == vad_mod.VADEventType.INFERENCE_DONE:
+                    if utt is not None and not utt.ended:
+                        utt.append(event.frames)
+
+                elif event.type == vad_mod.VADEventType.END_OF_SPEECH:
+                    speech_end_time = time.time() - event.silence_duration - event.inference_duration
+                    self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH, speech_end_time=speech_end_time))
+                    if utt is None:
+                        continue
+
+                    # รอ commit ที่กำลังทำอยู่ให้จบ แล้ว decode เฉพาะส่วนท้าย
+                    utt.ended = True
+                    utt.changed.set()
+                    await decoder
+                    audio = ingest_frames(event.frames, SENSEVOICE_SAMPLE_RATE)
+                    tail = await self._sv._decode(audio[utt.committed:], self._language)
+                    text = _join_segments(utt.texts + [tail])
+                    utt, decoder = None, None
+                    if text:
+                        self._event_ch.send_nowait(
+                            stt.SpeechEvent(
+                                type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                                alternatives=[stt.SpeechData(text=text, confidence=1.0, language=self._language)],
+                                speech_end_time=speech_end_time,
+                            )
+                        )
+
+            if decoder is not None:
+                await utils.aio.cancel_and_wait(decoder)
+
+        tasks = [
+            asyncio.create_task(_forward_input(), name="sensevoice_forward_input"),
+            asyncio.create_task(_recognize(), name="sensevoice_recognize"),
+        ]
         try:
-            res = self._model.generate([audio_np], language=language if language else "th", use_itn=False)
-            if res and len(res) > 0 and 'text' in res[0]:
-                text = res[0]['text']
-                return stt.SpeechEvent(
-                    type=stt.SpeechEventType.FINAL_TRANSCRIPT,
-                    alternatives=[stt.SpeechData(text=text, confidence=1.0, language=language or "th")]
-                )
-        except Exception as e:
-            logger.error(f"SenseVoice generation error: {e}")
-        
-        return stt.SpeechEvent(type=stt.SpeechEventType.FINAL_TRANSCRIPT, alternatives=[])
+            await asyncio.gather(*tasks)
+        finally:
+            await utils.aio.cancel_and_wait(*tasks)
+            await vad_stream.aclose()
+
+    async def _decode_loop(self, utt: _Utterance) -> None:
+        while True:
+            await utt.changed.wait()
+            utt.changed.clear()
+            if utt.ended:
+                return
+
+            if utt.total - utt.committed > self._window:
+                audio = utt.audio()[utt.committed:]
+                cut = _find_cut(audio, self._window - self._commit_search, self._window)
+                utt.texts.append(await self._sv._decode(audio[:cut], self._language))
+                utt.committed += cut
+                utt.changed.set()
+
+            elif utt.total - utt.interim_at >= self._interim_samples:
+                utt.interim_at = utt.total
+                tail = await self._sv._decode(utt.audio()[utt.committed:], self._language)
+                text = _join_segments(utt.texts + [tail])
+                if text and not utt.ended:
+                    self._event_ch.send_nowait(
+                        stt.SpeechEvent(
+                            type=stt.SpeechEventType.INTERIM_TRANSCRIPT,
+                            alternatives=[stt.SpeechData(text=text, confidence=1.0, language=self._language)],
+                        )
+                    )
+
+
+def _load_cosyvoice(cli, full_model_path: str, load_cache: bool = True, backend: str = "torch"):
+    # Implement robust AutoModel logic
+    # Check for specific YAMLs first to determine version
+    if os.path.exists(os.path.join(full_model_path, 'cosyvoice3.yaml')):
+        logger.info("Detected CosyVoice3 model.")
+        model_cls, version = cli.CosyVoice3, "cosyvoice3"
+    elif os.path.exists(os.path.join(full_model_path, 'cosyvoice2.yaml')):
+        logger.info("Detected CosyVoice2 model.")
+        model_cls, version = cli.CosyVoice2, "cosyvoice2"
+    else:
+        logger.info("Detected CosyVoice(V1) model.")
+        model_cls, version = cli.CosyVoice, "cosyvoice1"
+
+    if load_cache:
+        # ข้าม HyperPyYAML และ torch.load checkpoint ถ้ามี cache ที่ตรงกับไฟล์ใน model dir
+        with cosyvoice_load_cache(cli, full_model_path):
+            model = model_cls(full_model_path)
+    else:
+        model = model_cls(full_model_path)
+    # cache เก็บ weight fp32 เสมอ แปลงเป็น int8 / ONNX หลังโหลด
+    apply_cosyvoice_backend(model, full_model_path, backend, threads=get_placement().threads("tts"))
+    return model, version
 
 
 class CosyVoiceTTS(tts.TTS):
-    def __init__(self, model_path: str = "Fun-Audio-Chat/pretrained_models/Fun-CosyVoice3-0.5B-2512", device: str = "cpu"):
-        # LiveKit TTS usually expects sample rate matching the output
-        super().__init__(capabilities=tts.TTSCapabilities(streaming=True), sample_rate=22050, num_channels=1)
+    def __init__(self, model_path: str = "Fun-Audio-Chat/pretrained_models/Fun-CosyVoice3-0.5B-2512", device: str = "cpu", max_queued_chunks: int = 4, output_sample_rate: int | None = None, frame_size_ms: int | None = None, cache: TTSCache | None = None, use_cache: bool = True, load_cache: bool = True, backend: str = "torch", voice: str = "default", silence_on_failure: bool = False):
         self._model = None
         self._device = device
-        self.voice = "default" # Default to 'default' (zero-shot/cross-lingual) for Thai support
+        self.backend = check_backend(backend)
+        # ชื่อเสียงใน voice store ("default" = prompt wav ที่มากับ CosyVoice) ดู voice_registry.py
+        self.voice = voice
+        # False: ไม่มีเสียงเลย (model / voice ไม่พร้อม หรือ synthesis ล้ม) ให้ raise APIConnectionError
+        # ให้ ChunkedStream retry หรือ HedgedTTS สลับไป engine สำรองได้
+        # True: push เสียงเงียบ 500 ms แทน (พฤติกรรมเดิมเมื่อใช้ CosyVoice ตัวเดียว session ไม่สะดุด)
+        self.silence_on_failure = silence_on_failure
+        self._model_dir = None
+        self._model_version = None
+        self._voice_store: VoiceStore | None = None
+        # thread เฉพาะสำหรับ inference พร้อม queue จำกัดขนาดกลับไปที่ AudioEmitter
+        self._executor = InferenceExecutor("cosyvoice", max_queue=max_queued_chunks, engine="tts")
+        # ลำดับ step ของ LM / flow ข้าม session ที่แชร์ model (tts_scheduler.py)
+        self._scheduler: TTSScheduler | None = None
+        # สถิติ time-to-first-audio / ช่องว่างระหว่างวลี ของ stream() ล่าสุด
+        self.turn_stats: deque[dict] = deque(maxlen=100)
+        # PCM ของวลีที่เคยสังเคราะห์แล้ว (key รวม prompt speaker และ model version)
+        self._cache = (cache or get_tts_cache()) if use_cache else None
         
         full_model_path = os.path.join(PROJECT_ROOT, model_path)
         logger.info(f"Checking CosyVoice model at: {full_model_path}")
 
-        if HAS_COSYVOICE:
+        cli = bootstrap.ensure_cosyvoice()
+        if cli:
              if os.path.exists(full_model_path):
                  logger.info(f"Found model folder. Loading CosyVoice...")
                  try:
-                    # Implement robust AutoModel logic
-                    # Check for specific YAMLs first to determine version
-                    if os.path.exists(os.path.join(full_model_path, 'cosyvoice3.yaml')):
-                        logger.info("Detected CosyVoice3 model.")
-                        self._model = CosyVoice3(full_model_path)
-                    elif os.path.exists(os.path.join(full_model_path, 'cosyvoice2.yaml')):
-                         logger.info("Detected CosyVoice2 model.")
-                         self._model = CosyVoice2(full_model_path)
-                    else:
-                         logger.info("Detected CosyVoice(V1) model.")
-                         self._model = CosyVoice(full_model_path)
-                         
-                    logger.info("CosyVoice model loaded successfully!")
+                    # โหลดครั้งเดียวต่อ process แล้วแชร์ข้าม job
+                    loaded = REGISTRY.get_or_load(
+                        "cosyvoice",
+                        full_model_path,
+                        lambda: _load_cosyvoice(cli, full_model_path, load_cache, backend),
+                        device=device,
+                        dtype=backend,
+                        engine="tts",
+                    )
+                    if loaded:
+                        self._model, self._model_version = loaded
+                        logger.info("CosyVoice model loaded successfully!")
                  except Exception as e:
                     logger.error(f"Failed to load CosyVoice model (Exception): {e}")
              else:
@@ -293,9 +344,182 @@ class CosyVoiceTTS(tts.TTS):
         else:
              logger.warning("CosyVoice library not loaded.")
 
+        # ใช้ sample rate จริงของ model (CosyVoice2/3 = 24 kHz, V1 = 22050)
+        # ตั้ง output_sample_rate=48000 เพื่อ resample เองครั้งเดียว LiveKit จะไม่ต้อง resample ทุก frame
+        self._native_sample_rate = self._model.sample_rate if self._model else 22050
+        self._frame_size_ms = frame_size_ms
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=True),
+            sample_rate=output_sample_rate or self._native_sample_rate,
+            num_channels=1,
+        )
+
+        if self._model:
+            self._model_dir = full_model_path
+            model_version = f"{self._model_version}-{os.path.basename(os.path.normpath(full_model_path))}"
+            self._voice_store = get_voice_store(full_model_path, model_version)
+            self._scheduler = get_scheduler(self._model)
+            self._voice_spk_id(self.voice, verify=True)
+
+    def _init_emitter(self, output_emitter: tts.AudioEmitter, request_id: str, **kwargs) -> None:
+        options = {"frame_size_ms": self._frame_size_ms} if self._frame_size_ms else {}
+        output_emitter.initialize(
+            request_id=request_id,
+            sample_rate=self.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+            **options,
+            **kwargs,
+        )
+
+    @property
+    def voice_store(self) -> VoiceStore | None:
+        return self._voice_store
+
+    def update_options(self, *, voice: NotGivenOr[str] = NOT_GIVEN) -> None:
+        # เปลี่ยนเสียงของ session นี้ มีผลกับ stream ถัดไป ไม่ extract feature บน event loop:
+        # เสียงที่มีแค่ wav ถูก ingest บน inference thread ตอน stream แรก (aupdate_options ingest ให้เสร็จก่อน)
+        if is_given(voice):
+            if not self._voice_known(voice):
+                logger.warning(f"Voice {voice!r} not available, keeping {self.voice!r}")
+                return
+            self.voice = voice
+
+    async def aupdate_options(self, *, voice: NotGivenOr[str] = NOT_GIVEN) -> None:
+        if is_given(voice):
+            if await self._avoice_spk_id(voice) is None:
+                logger.warning(f"Voice {voice!r} not available, keeping {self.voice!r}")
+                return
+            self.voice = voice
+
+    def ingest_voice(self, name: str, wav_path: str | None = None) -> Voice | None:
+        # Extract prompt features (speech tokens, speaker embedding, mel) จาก wav อ้างอิงครั้งเดียว
+        # แล้วเก็บลง voice store ใช้ซ้ำได้ทุก process ไม่ต้อง extract ใหม่ทุกประโยค
+        wav_path = wav_path or (find_prompt_wav() if name == "default" else find_voice_wav(name))
+        if not wav_path or not os.path.exists(wav_path):
+            logger.error(f"No reference wav for voice {name!r} (looked for voices/{name}.wav)")
+            return None
+        wav_hash = file_sha256(wav_path)
+        start = time.perf_counter()
+        try:
+            spk_info = self._model.frontend.frontend_zero_shot('', '', wav_path, self._model.sample_rate, '')
+        except Exception as e:
+            logger.error(f"Failed to extract prompt features from {wav_path}: {e}")
+            return None
+        # ข้อความจะถูกเติมทีหลังตอน synthesize
+        spk_info.pop('text', None)
+        spk_info.pop('text_len', None)
+        logger.info(f"Extracted features of voice {name!r} in {time.perf_counter() - start:.2f}s")
+        spk_id = f"{name}_{self._model_version}_{wav_hash[:16]}"
+        return self._voice_store.put(name, spk_info, spk_id=spk_id, source=wav_path, source_sha256=wav_hash)
+
+    def _voice_known(self, name: str) -> bool:
+        # อยู่ใน voice store แล้ว หรือมี wav อ้างอิงให้ ingest
+        if self._voice_store is None:
+            return False
+        return self._voice_store.entry(name) is not None or bool(find_prompt_wav() if name == "default" else find_voice_wav(name))
+
+    async def _avoice_spk_id(self, name: str) -> str | None:
+        # สำหรับ event loop: extract feature ของเสียงใหม่ (CPU หลายวินาที) รันบน inference thread
+        # ต่อคิวกับ synthesis ไม่รันพร้อมกันบน model เดียวกัน
+        if self._voice_store is None:
+            return None
+        if self._voice_store.entry(name) is None and await self._executor.run(self.ingest_voice, name) is None:
+            return None
+        return self._voice_spk_id(name)
+
+    def _voice_spk_id(self, name: str, verify: bool = False) -> str | None:
+        # spk_id ของเสียงที่ลงทะเบียนใน frontend.spk2info แล้ว (tensor เป็น view บน mmap ของ voice store)
+        # verify: ตรวจว่า wav ต้นทางยังเป็นไฟล์เดิม (hash ทั้งไฟล์ ทำตอนสร้าง TTS เท่านั้น)
+        # เสียงที่ยังไม่อยู่ใน store ถูก ingest ที่นี่แบบ sync (prewarm / CLI) บน event loop ใช้ _avoice_spk_id
+        if self._voice_store is None:
+            return None
+        entry = self._voice_store.entry(name)
+        if verify and entry and entry["source"] and os.path.exists(entry["source"]) and file_sha256(entry["source"]) != entry["source_sha256"]:
+            logger.info(f"Reference wav of voice {name!r} changed, re-extracting")
+            entry = None
+        voice = self._voice_store.get(name) if entry else self.ingest_voice(name)
+        if voice is None:
+            return None
+        # model ถูกแชร์ข้าม job ถ้า job ก่อนหน้าลงทะเบียน speaker นี้แล้วก็ใช้ต่อได้เลย
+        frontend = self._model.frontend
+        if voice.spk_id not in frontend.spk2info:
+            # frontend ลบ key ออกจาก model_input ระหว่าง cross-lingual ถ้าคืน dict ตัวเดิมจะพังในประโยคถัดไป
+            if not isinstance(frontend.spk2info, _CopyOnReadDict):
+                frontend.spk2info = _CopyOnReadDict(frontend.spk2info)
+            frontend.spk2info[voice.spk_id] = voice.spk_info
+        return voice.spk_id
+
+    def inference_stats(self) -> dict:
+        # queue depth และเวลารอ chunk ของ inference thread
+        return self._executor.stats()
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats() if self._cache else {}
+
+    def scheduler_stats(self) -> dict:
+        return self._scheduler.stats() if self._scheduler else {}
+
+    def _cache_key(self, text: str, spk_id: str) -> str:
+        return cache_key(text, voice=spk_id, model=f"{self._model_version}:{self.backend}:{self._model_dir}", sample_rate=self.sample_rate)
+
+    async def _synthesize_cached(self, text: str, spk_id: str, output_emitter: tts.AudioEmitter, on_chunk=None) -> int:
+        # เล่นจาก cache ถ้ามี ไม่งั้นสังเคราะห์บน inference thread แล้วเก็บลง cache เมื่อจบครบทั้งวลี
+        # คืนจำนวน byte ที่ push ไป
+        key = self._cache_key(text, spk_id) if self._cache else None
+        cached = await self._cache.aget(key) if key else None
+        if cached is not None:
+            output_emitter.push(cached)
+            if on_chunk:
+                on_chunk(len(cached))
+            return len(cached)
+
+        audio = []
+        start = time.perf_counter()
+        chunks = self._executor.stream(self._generate_pcm, text, spk_id)
+        async with contextlib.aclosing(chunks):
+            async for chunk_bytes in chunks:
+                output_emitter.push(chunk_bytes)
+                audio.append(chunk_bytes)
+                if on_chunk:
+                    on_chunk(len(chunk_bytes))
+        nbytes = sum(len(c) for c in audio)
+        record_rtf("tts", time.perf_counter() - start, nbytes / 2 / self.sample_rate)
+        # ไม่ cache ผลที่ได้ไม่ครบ (ถ้า error ระหว่างทางจะไม่มาถึงตรงนี้)
+        if key:
+            await self._cache.aput(key, b"".join(audio))
+        return nbytes
+
+    def _generate_pcm(self, text: str, spk_id: str):
+        # รันบน inference thread: ทั้ง frontend, LM, flow, vocoder และการแปลงเป็น int16
+        # ใช้ prompt feature ใน voice store ไม่ต้องโหลด wav (frontend ไม่อ่าน wav เมื่อมี spk_id)
+        model_output = self._model.inference_cross_lingual(
+            text,
+            '',
+            zero_shot_spk_id=spk_id,
+            stream=True,
+        )
+        converter = PcmConverter(self._native_sample_rate, self.sample_rate)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for i, item in enumerate(model_output):
+            if 'tts_speech' in item:
+                # tensor บน CPU อยู่แล้ว numpy() ไม่ copy
+                chunk_bytes = converter.convert(item['tts_speech'].detach().cpu().numpy())
+                if chunk_bytes:
+                    if debug:
+                        logger.debug("Generated chunk %d (%d bytes)", i, len(chunk_bytes))
+                    yield chunk_bytes
+
+        tail = converter.flush()
+        if tail:
+            yield tail
+
     def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> tts.ChunkedStream:
         return CosyVoiceStream(self, text, conn_options)
 
+    def stream(self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "CosyVoiceSynthesizeStream":
+        return CosyVoiceSynthesizeStream(self, conn_options)
+
 
 class CosyVoiceStream(tts.ChunkedStream):
     def __init__(self, tts: CosyVoiceTTS, text: str, conn_options: APIConnectOptions):
@@ -304,113 +528,149 @@ class CosyVoiceStream(tts.ChunkedStream):
 
     async def _run(self, output_emitter: tts.AudioEmitter) -> None:
         # Initialize Emitter
-        output_emitter.initialize(
-            request_id=utils.shortuuid("tts_req_"),
-            sample_rate=22050, # CosyVoice บังคับ 22050 (ถ้าแก้ตรงนี้ Model จริงเสียงจะเพี้ยน)
-            num_channels=1,
-            mime_type="audio/pcm"
-        )
-
-        # Helper to push silence
-        def push_silence(duration_ms=500): 
-            # Ensure emitter is initialized first
-            try:
-                output_emitter.initialize(
-                     request_id=utils.shortuuid("tts_sil_"),
-                     sample_rate=22050, 
-                     num_channels=1, 
-                     mime_type="audio/pcm"
-                )
-            except RuntimeError:
-                pass # Already initialized
-            
-            samples = int(22050 * (duration_ms / 1000.0))
-            silent_data = np.zeros(samples, dtype=np.int16).tobytes()
-            output_emitter.push(silent_data)
+        self._tts._init_emitter(output_emitter, utils.shortuuid("tts_req_"))
 
+        audio_frames_generated = False
+        error: Exception | None = None
         if not self._tts._model:
             logger.error("CosyVoice model not loaded.")
-            push_silence()
+            error = APIConnectionError("CosyVoice model not loaded")
+        elif not (spk_id := await self._tts._avoice_spk_id(self._tts.voice)):
+            logger.error(f"Voice {self._tts.voice!r} not available. Cannot perform cross-lingual synthesis.")
+            error = APIConnectionError(f"CosyVoice voice {self._tts.voice!r} not available")
+        else:
+            logger.info(f"Synthesizing text: {self._text}")
+
+            # generator ของ CosyVoice รันบน inference thread ไม่ block event loop
+            def on_chunk(nbytes: int) -> None:
+                nonlocal audio_frames_generated
+                audio_frames_generated = True
+
+            try:
+                await self._tts._synthesize_cached(self._text, spk_id, output_emitter, on_chunk)
+            except Exception as e:
+                # CosyVoice sometimes fails with "sampling reaches max_trials" for short/difficult inputs
+                if "sampling reaches max_trials" in str(e):
+                    logger.warning(f"CosyVoice generation ended early due to sampling error: {e}")
+                else:
+                    logger.exception(f"Error during CosyVoice synthesis: {e}")
+                # ถ้ามีเสียงออกไปแล้วบางส่วน ให้ stream จบตามปกติ
+                error = e
+
+            logger.info(f"CosyVoice generator finished. Audio frames generated: {audio_frames_generated}, executor: {self._tts.inference_stats()}, cache: {self._tts.cache_stats()}")
+
+        if audio_frames_generated:
             return
-            
-        audio_frames_generated = False
+        if self._tts.silence_on_failure:
+            logger.warning("No audio frames generated via CosyVoice. Pushing silence.")
+            output_emitter.push(np.zeros(self._tts.sample_rate // 2, dtype=np.int16).tobytes())
+            return
+        if isinstance(error, APIError):
+            raise error
+        raise APIConnectionError(f"CosyVoice produced no audio for {self._text!r}: {error}") from error
+
+
+class _TurnTimeline:
+    # จำลองเวลาเล่นเสียง: ถือว่าเสียงเริ่มเล่นทันทีที่ push และเล่นต่อเนื่องตามความยาว
+    # ใช้คำนวณ time-to-first-audio และช่องว่าง (underrun) ระหว่างวลี
+    def __init__(self, sample_rate: int):
+        self._bytes_per_s = sample_rate * 2
+        self.first_text_at: float | None = None
+        self.first_audio_at: float | None = None
+        self._play_end = 0.0
+        self.phrases = 0
+        self.gaps: list[float] = []
+
+    def on_text(self) -> None:
+        if self.first_text_at is None:
+            self.first_text_at = time.perf_counter()
+
+    def on_audio(self, nbytes: int, first_of_phrase: bool) -> None:
+        now = time.perf_counter()
+        if self.first_audio_at is None:
+            self.first_audio_at = now
+        elif first_of_phrase:
+            self.gaps.append(max(0.0, now - self._play_end))
+        self._play_end = max(self._play_end, now) + nbytes / self._bytes_per_s
+
+    def summary(self) -> dict:
+        ttfa = None
+        if self.first_text_at is not None and self.first_audio_at is not None:
+            ttfa = self.first_audio_at - self.first_text_at
+        return {
+            "phrases": self.phrases,
+            "ttfa_ms": round(ttfa * 1000, 1) if ttfa is not None else None,
+            "max_gap_ms": round(max(self.gaps) * 1000, 1) if self.gaps else 0.0,
+            "total_gap_ms": round(sum(self.gaps) * 1000, 1),
+        }
+
+
+class CosyVoiceSynthesizeStream(tts.SynthesizeStream):
+    # รับ token จาก LLM ทีละนิด ตัดเป็นวลี (วลีแรกสั้นเพื่อให้ได้เสียงแรกเร็ว) แล้วสังเคราะห์ต่อกันไป
+    # ระหว่างที่วลีก่อนหน้ากำลังเล่น วลีถัดไปถูกสังเคราะห์ล่วงหน้าบน inference thread แล้ว
+    def __init__(self, tts: CosyVoiceTTS, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, conn_options=conn_options)
+        self._tts: CosyVoiceTTS = tts
+
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        request_id = utils.shortuuid("tts_req_")
+        self._tts._init_emitter(output_emitter, request_id, stream=True)
+        output_emitter.start_segment(segment_id=utils.shortuuid("tts_seg_"))
+
+        timeline = _TurnTimeline(self._tts.sample_rate)
+        phrases: asyncio.Queue[str | None] = asyncio.Queue()
+        # เสียงเดียวตลอด turn แม้ session เปลี่ยนเสียงระหว่างพูด
+        spk_id = await self._tts._avoice_spk_id(self._tts.voice) if self._tts._model else None
+
+        async def _read_input() -> None:
+            chunker = PhraseChunker()
+            async for data in self._input_ch:
+                if isinstance(data, self._FlushSentinel):
+                    for phrase in chunker.flush():
+                        phrases.put_nowait(phrase)
+                    continue
+                timeline.on_text()
+                self._mark_started()
+                for phrase in chunker.push(data):
+                    phrases.put_nowait(phrase)
+            for phrase in chunker.flush():
+                phrases.put_nowait(phrase)
+            phrases.put_nowait(None)
+
+        async def _synthesize() -> None:
+            while (phrase := await phrases.get()) is not None:
+                timeline.phrases += 1
+                if not self._tts._model or not spk_id:
+                    logger.error("CosyVoice model or voice not available, skipping phrase.")
+                    continue
+                first = True
+
+                def on_chunk(nbytes: int) -> None:
+                    nonlocal first
+                    timeline.on_audio(nbytes, first)
+                    first = False
+
+                try:
+                    await self._tts._synthesize_cached(phrase, spk_id, output_emitter, on_chunk)
+                except Exception as e:
+                    logger.error(f"CosyVoice failed on phrase {phrase!r}: {e}")
+
+        tasks = [
+            asyncio.create_task(_read_input(), name="cosyvoice_read_input"),
+            asyncio.create_task(_synthesize(), name="cosyvoice_synthesize"),
+        ]
         try:
-             # Basic inference
-             logger.info(f"Synthesizing text: {self._text}")
-             
-             # Use Cross-Lingual Inference to support Thai
-             prompt_wav_path = os.path.join(COSYVOICE_PATH, "asset/zero_shot_prompt.wav")
-             
-             if not os.path.exists(prompt_wav_path):
-                 prompt_wav_path = os.path.join(COSYVOICE_PATH, "asset/cross_lingual_prompt.wav")
-             
-             if not os.path.exists(prompt_wav_path):
-                 logger.error(f"Prompt wav not found at {prompt_wav_path}. Cannot perform cross-lingual synthesis.")
-                 raise FileNotFoundError("Prompt wav not found")
-
-             logger.info(f"Using prompt wav for Cross-Lingual: {prompt_wav_path}")
-             # CosyVoice internals will load the wav using patched torchaudio.load
-             model_output = self._tts._model.inference_cross_lingual(self._text, prompt_wav_path, stream=True)
-             
-             logger.info("Starting CosyVoice generator execution...")
-             
-             # Initialize Emitter for raw PCM BEFORE generating or pushing
-             # Initialize Emitter (moved from top)
-             try:
-                 output_emitter.initialize(
-                     request_id=utils.shortuuid("tts_req_"),
-                     sample_rate=22050, # CosyVoice output
-                     num_channels=1,
-                     mime_type="audio/pcm"
-                 )
-             except Exception:
-                 pass # Might be initialized if we switch logic later, but good for safety
-
-             try:
-                 for i, item in enumerate(model_output):
-                     # logger.debug(f"Received chunk {i} keys: {list(item.keys())}") 
-                     if 'tts_speech' in item:
-                         audio_tensor = item['tts_speech']
-                         
-                         # Convert torch tensor to numpy safely
-                         audio_float = audio_tensor.detach().cpu().numpy().flatten()
-                         
-                         # Convert to int16 PCM
-                         audio_int16 = (audio_float * 32768).astype(np.int16)
-                         
-                         # PUSH RAW BYTES
-                         chunk_bytes = audio_int16.tobytes()
-                         if len(chunk_bytes) > 0:
-                             output_emitter.push(chunk_bytes)
-                             audio_frames_generated = True
-                             logger.info(f"Pushed chunk {i} bytes successfully")
-                         
-             except RuntimeError as e:
-                 # CosyVoice sometimes fails with "sampling reaches max_trials" for short/difficult inputs
-                 if "sampling reaches max_trials" in str(e):
-                      logger.warning(f"CosyVoice generation ended early due to sampling error: {e}")
-                 else:
-                      logger.error(f"CosyVoice runtime error during generation: {e}")
-                 
-                 # If we already generated audio, don't raise exception to keep stream alive
-                 if not audio_frames_generated:
-                     raise e
-             except Exception as e:
-                 import traceback
-                 logger.error(f"Error during CosyVoice stream iteration: {e}\n{traceback.format_exc()}")
-                 if not audio_frames_generated:
-                     raise e
-             except Exception as e:
-                 import traceback
-                 logger.error(f"Error during CosyVoice stream iteration: {e}\n{traceback.format_exc()}")
-                 if not audio_frames_generated:
-                     raise e
-             
-             logger.info(f"CosyVoice generator finished. Audio frames generated: {audio_frames_generated}")
-                         
-        except Exception as e:
-             logger.error(f"CosyVoice synthesis failed: {e}")
-             
-        if not audio_frames_generated:
+            await asyncio.gather(*tasks)
+        finally:
+            await utils.aio.cancel_and_wait(*tasks)
+
+        if timeline.first_text_at is not None and timeline.first_audio_at is None:
+            if not self._tts.silence_on_failure:
+                raise APIConnectionError(f"CosyVoice produced no audio for {timeline.phrases} phrases")
             logger.warning("No audio frames generated via CosyVoice. Pushing silence.")
-            push_silence()
\ No newline at end of file
+            output_emitter.push(np.zeros(self._tts.sample_rate // 2, dtype=np.int16).tobytes())
+
+        output_emitter.end_segment()
+        stats = timeline.summary()
+        self._tts.turn_stats.append(stats)
+        logger.info(f"CosyVoice turn: {stats}")
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import tts, utils, APIConnectOptions, APIConnectionError, APIError, DEFAULT_API_CONNECT_OPTIONS
+
+logger = logging.getLogger("hedged_tts")
+
+
+class _EngineStats:
+    def __init__(self, window: int):
+        self.requests = 0
+        self.wins = 0
+        self.losses = 0
+        self.errors = 0
+        self.first_chunk_ms: deque[float] = deque(maxlen=window)
+
+    def summary(self) -> dict:
+        lat = np.asarray(self.first_chunk_ms, dtype=np.float64)
+        return {
+            "requests": self.requests,
+            "wins": self.wins,
+            "losses": self.losses,
+            "errors": self.errors,
+            "first_chunk_ms_p50": round(float(np.percentile(lat, 50)), 1) if len(lat) else None,
+            "first_chunk_ms_p95": round(float(np.percentile(lat, 95)), 1) if len(lat) else None,
+        }
+
+
+class HedgedTTS(tts.TTS):
+    # เริ่มที่ primary ก่อน ถ้าไม่มีเสียงออกมาภายใน deadline_s (หรือ primary ล้ม) ค่อยเริ่ม secondary ด้วย
+    # engine ที่ได้เสียงก่อนชนะ อีกตัวถูกยกเลิก เก็บสถิติชนะ/แพ้และ latency ของ chunk แรกไว้ตั้ง deadline จากข้อมูลจริง
+    def __init__(self, primary: tts.TTS, secondary: tts.TTS, *, deadline_s: float = 0.6, stats_window: int = 500):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=primary.sample_rate,
+            num_channels=1,
+        )
+        self._engines = [primary, secondary]
+        self.deadline_s = deadline_s
+        names = [type(e).__name__ for e in self._engines]
+        if names[0] == names[1]:
+            names[1] += "#2"
+        self._names = names
+        self._stats = {name: _EngineStats(stats_window) for name in names}
+        self._hedged = 0
+        self._requests = 0
+
+    def stats(self) -> dict:
+        return {
+            "deadline_ms": round(self.deadline_s * 1000, 1),
+            "requests": self._requests,
+            "hedged": self._hedged,
+            "engines": {name: s.summary() for name, s in self._stats.items()},
+        }
+
+    def prewarm(self) -> None:
+        for engine in self._engines:
+            engine.prewarm()
+
+    async def aclose(self) -> None:
+        for engine in self._engines:
+            await engine.aclose()
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> tts.ChunkedStream:
+        return HedgedStream(self, text, conn_options)
+
+
+class _Lane:
+    # synthesis ของ engine หนึ่งตัว: อ่าน frame เข้า queue ไว้ก่อน จนกว่าจะรู้ว่าใครชนะ
+    def __init__(self, engine: tts.TTS, name: str, text: str, conn_options: APIConnectOptions):
+        self.engine = engine
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: float | None = None
+        self.error: BaseException | None = None
+        self.frames: asyncio.Queue[rtc.AudioFrame | None] = asyncio.Queue()
+        # resolve เมื่อได้เสียงแรก หรือเมื่อจบโดยไม่มีเสียง
+        self.ready: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._stream = engine.synthesize(text, conn_options=conn_options)
+        self._task = asyncio.create_task(self._pump(), name=f"hedged_tts_{self.name}")
+
+    @property
+    def has_audio(self) -> bool:
+        return self.first_chunk_at is not None
+
+    @property
+    def first_chunk_ms(self) -> float:
+        return (self.first_chunk_at - self.started_at) * 1000
+
+    async def _pump(self) -> None:
+        try:
+            async for ev in self._stream:
+                if self.first_chunk_at is None:
+                    self.first_chunk_at = time.perf_counter()
+                    self._resolve()
+                self.frames.put_nowait(ev.frame)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.frames.put_nowait(None)
+            self._resolve()
+
+    def _resolve(self) -> None:
+        if not self.ready.done():
+            self.ready.set_result(None)
+
+    async def aclose(self) -> None:
+        await utils.aio.cancel_and_wait(self._task)
+        await self._stream.aclose()
+
+
+class HedgedStream(tts.ChunkedStream):
+    def __init__(self, tts_instance: HedgedTTS, text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=tts_instance, input_text=text, conn_options=conn_options)
+        self._tts = tts_instance
+
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        hedged = self._tts
+        hedged._requests += 1
+        # retry ภายใน engine ทำให้ช้า ให้ hedge เป็นตัวกันความล้มเหลวแทน
+        child_options = APIConnectOptions(max_retry=0, timeout=self._conn_options.timeout)
+        primary, secondary = hedged._engines
+
+        lanes = [_Lane(primary, hedged._names[0], self._input_text, child_options)]
+        try:
+            await asyncio.wait([lanes[0].ready], timeout=hedged.deadline_s)
+            if not lanes[0].has_audio:
+                hedged._hedged += 1
+                logger.info(f"{lanes[0].name} has no audio after {hedged.deadline_s * 1000:.0f} ms, starting {hedged._names[1]}")
+                lanes.append(_Lane(secondary, hedged._names[1], self._input_text, child_options))
+
+            winner = None
+            while winner is None:
+                # ถ้าได้เสียงพร้อมกัน primary ชนะ
+                winner = next((lane for lane in lanes if lane.has_audio), None)
+                waiting = [lane.ready for lane in lanes if not lane.ready.done()]
+                if winner is None and not waiting:
+                    break
+                if winner is None:
+                    await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            for lane in lanes:
+                stats = hedged._stats[lane.name]
+                stats.requests += 1
+                if lane.has_audio:
+                    stats.first_chunk_ms.append(lane.first_chunk_ms)
+                if lane.error is not None and not lane.has_audio:
+                    stats.errors += 1
+                if winner is not None and len(lanes) > 1:
+                    if lane is winner:
+                        stats.wins += 1
+                    else:
+                        stats.losses += 1
+
+            for lane in lanes:
+                if lane is not winner:
+                    await lane.aclose()
+
+            if winner is None:
+                errors = "; ".join(f"{lane.name}: {lane.error}" for lane in lanes)
+                raise APIConnectionError(f"all TTS engines failed ({errors})")
+
+            logger.info(f"HedgedTTS winner: {winner.name} (first chunk {winner.first_chunk_ms:.0f} ms, hedged={len(lanes) > 1})")
+            await self._forward(winner, output_emitter)
+        finally:
+            for lane in lanes:
+                await lane.aclose()
+
+    async def _forward(self, lane: _Lane, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(
+            request_id=utils.shortuuid("tts_req_"),
+            sample_rate=self._tts.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        resampler = None
+        while (frame := await lane.frames.get()) is not None:
+            if frame.sample_rate != self._tts.sample_rate:
+                if resampler is None:
+                    resampler = rtc.AudioResampler(frame.sample_rate, self._tts.sample_rate)
+                for out in resampler.push(frame):
+                    output_emitter.push(out.data.tobytes())
+            else:
+                output_emitter.push(frame.data.tobytes())
+        if resampler is not None:
+            for out in resampler.flush():
+                output_emitter.push(out.data.tobytes())
+        if lane.error is not None:
+            # เสียงออกไปแล้วบางส่วน ส่ง error ต่อให้ ChunkedStream ตัดสินใจ retry
+            if isinstance(lane.error, APIError):
+                raise lane.error
+            raise APIConnectionError(f"{lane.name} failed mid-synthesis: {lane.error}") from lane.error
@@ -0,0 +1,120 @@
+# backend สำหรับ inference บน CPU เลือกแยกต่อ model:
+#   torch  fp32 PyTorch (เดิม)
+#   int8   torch dynamic quantization: weight ของ Linear / LSTM / GRU เป็น int8, activation ยังเป็น fp32
+#   onnx   ONNX Runtime session
+#
+# SenseVoice (onnx): รันผ่าน funasr_onnx.SenseVoiceSmall ที่ export model_quant.onnx ให้เองครั้งแรก
+# CosyVoice (onnx): flow estimator รันผ่าน ONNX Runtime จาก flow.decoder.estimator.fp32.onnx
+#   (export ด้วย cosyvoice/bin/export_onnx.py) ส่วน LM (autoregressive + KV cache) และ vocoder
+#   ไม่มี ONNX export ใน upstream จึงใช้ int8 แทน
+import logging
+import os
+
+logger = logging.getLogger("inference_backends")
+
+BACKENDS = ("torch", "int8", "onnx")
+FLOW_ESTIMATOR_ONNX = "flow.decoder.estimator.fp32.onnx"
+
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown inference backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def quantize_int8(module):
+    # แทน Linear / LSTM / GRU ใน module ด้วยรุ่น int8 (in place) module แบบอื่น (เช่น Conv) ยังเป็น fp32
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(
+        module, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}, dtype=torch.qint8, inplace=True
+    )
+
+
+def ort_session(path: str, threads: int | None = None):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxSenseVoice:
+    # ให้ funasr_onnx.SenseVoiceSmall มี generate() แบบเดียวกับ funasr.AutoModel เพื่อใช้กับ SenseVoiceBatcher ได้
+    def __init__(self, model_dir: str, threads: int | None = None):
+        from funasr_onnx import SenseVoiceSmall
+
+        kwargs = {"intra_op_num_threads": threads} if threads else {}
+        self._model = SenseVoiceSmall(model_dir, batch_size=8, quantize=True, **kwargs)
+
+    def generate(self, inputs, *, language: str = "auto", use_itn: bool = False, batch_size: int | None = None, **kwargs):
+        texts = self._model(list(inputs), language=language, textnorm="withitn" if use_itn else "woitn")
+        return [{"key": str(i), "text": text} for i, text in enumerate(texts)]
+
+
+def load_sensevoice(AutoModel, model_dir: str, *, device: str = "cpu", backend: str = "torch", threads: int | None = None):
+    # คืน object ที่มี generate() (funasr.AutoModel หรือ OnnxSenseVoice)
+    check_backend(backend)
+    if backend == "onnx":
+        return OnnxSenseVoice(model_dir, threads)
+    model = AutoModel(model=model_dir, device=device)
+    if backend == "int8":
+        quantize_int8(model.model)
+    return model
+
+
+def _onnx_estimator(estimator, path: str, threads: int | None = None):
+    import numpy as np
+    import torch
+
+    class OnnxFlowEstimator(torch.nn.Module):
+        # flow matching เรียก estimator หลายครั้งต่อ chunk (ตาม n_timesteps) เป็นส่วนที่หนักที่สุดของ flow
+        # เหมือน TensorRT path ของ upstream: graph export แบบ non-streaming จึงไม่สน flag streaming
+        def __init__(self):
+            super().__init__()
+            self.session = ort_session(path, threads)
+            self.input_names = [i.name for i in self.session.get_inputs()]
+            # ค่า attribute อื่น (in_channels, out_channels ฯลฯ) ยังอ่านจากตัวเดิมได้
+            self.__dict__["_torch_estimator"] = estimator
+
+        def __getattr__(self, name):
+            try:
+                return super().__getattr__(name)
+            except AttributeError:
+                return getattr(self.__dict__["_torch_estimator"], name)
+
+        def forward(self, x, mask, mu, t, spks=None, cond=None, streaming=False):
+            feeds = {}
+            for name, value in zip(self.input_names, (x, mask, mu, t, spks, cond)):
+                feeds[name] = np.ascontiguousarray(value.detach().cpu().float().numpy())
+            out = self.session.run(None, feeds)[0]
+            return torch.from_numpy(out).to(x.device, x.dtype)
+
+    return OnnxFlowEstimator()
+
+
+def apply_cosyvoice_backend(model, model_dir: str, backend: str, threads: int | None = None) -> dict:
+    # แปลง model ของ cli.CosyVoice* ที่โหลดแล้ว (LM / flow / vocoder) คืน backend ที่ใช้จริงของแต่ละส่วน
+    check_backend(backend)
+    inner = model.model
+    used = {"llm": backend, "flow": backend, "hift": backend}
+    if backend == "torch":
+        return used
+
+    if backend == "onnx":
+        path = os.path.join(model_dir, FLOW_ESTIMATOR_ONNX)
+        if os.path.exists(path):
+            inner.flow.decoder.estimator = _onnx_estimator(inner.flow.decoder.estimator, path, threads)
+        else:
+            logger.warning(f"{path} not found (export it with cosyvoice/bin/export_onnx.py), using int8 for flow")
+            quantize_int8(inner.flow)
+            used["flow"] = "int8"
+        used["llm"] = used["hift"] = "int8"
+    else:
+        quantize_int8(inner.flow)
+    quantize_int8(inner.llm)
+    quantize_int8(inner.hift)
+    logger.info(f"CosyVoice backends: {used}")
+    return used
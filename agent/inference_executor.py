@@ -0,0 +1,150 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator
+
+from placement import get_placement
+
+logger = logging.getLogger("inference_executor")
+
+# executor ทุกตัวใน process (ใช้สำหรับรายงาน queue depth / load)
+_EXECUTORS: "weakref.WeakSet[InferenceExecutor]" = weakref.WeakSet()
+
+
+def active_executors() -> list["InferenceExecutor"]:
+    return list(_EXECUTORS)
+
+
+class _Done:
+    pass
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class InferenceExecutor:
+    # รัน generator ของ model (sync) บน thread เฉพาะ แล้วส่ง chunk กลับมาที่ event loop
+    # ผ่าน asyncio.Queue ที่มีขนาดจำกัด ถ้าฝั่ง async ดึงไม่ทัน worker จะถูก block (backpressure)
+    def __init__(self, name: str, *, max_queue: int = 4, wait_window: int = 512, engine: str | None = None):
+        self._name = name
+        self._max_queue = max_queue
+        # engine (stt / tts / vad): ตั้งจำนวน thread และ affinity ของ worker thread ตาม placement
+        pin = {"initializer": get_placement().pin, "initargs": (engine,)} if engine else {}
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-infer", **pin)
+        self._lock = threading.Lock()
+        self._pending_jobs = 0
+        self._running_jobs = 0
+        self._queues: set[asyncio.Queue] = set()
+        self._total_chunks = 0
+        self._wait_s: deque[float] = deque(maxlen=wait_window)
+        _EXECUTORS.add(self)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def stream(self, gen_fnc: Callable[..., Iterator], *args, **kwargs) -> AsyncIterator:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._max_queue)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            try:
+                fut = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            except RuntimeError:
+                # event loop ปิดไปแล้ว
+                return False
+            while True:
+                try:
+                    fut.result(timeout=0.1)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if stop.is_set():
+                        fut.cancel()
+                        return False
+
+        def produce() -> None:
+            with self._lock:
+                self._pending_jobs -= 1
+                self._running_jobs += 1
+            if stop.is_set():
+                # ผู้เรียกยกเลิกไปก่อนที่งานจะได้เริ่ม
+                with self._lock:
+                    self._running_jobs -= 1
+                return
+            try:
+                for item in gen_fnc(*args, **kwargs):
+                    if stop.is_set() or not put(item):
+                        break
+            except BaseException as e:
+                put(_Failed(e))
+            finally:
+                with self._lock:
+                    self._running_jobs -= 1
+                put(_Done())
+
+        with self._lock:
+            self._pending_jobs += 1
+            self._queues.add(queue)
+        loop.run_in_executor(self._pool, produce)
+
+        try:
+            while True:
+                start = time.perf_counter()
+                item = await queue.get()
+                if isinstance(item, _Done):
+                    break
+                if isinstance(item, _Failed):
+                    raise item.exc
+                with self._lock:
+                    self._total_chunks += 1
+                    self._wait_s.append(time.perf_counter() - start)
+                yield item
+        finally:
+            # ไม่รอ worker ให้จบ chunk ที่กำลังคำนวณ แค่บอกให้หยุดและปลด put ที่ค้างอยู่
+            stop.set()
+            with self._lock:
+                self._queues.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+
+    async def run(self, fnc: Callable, *args, **kwargs):
+        # งานครั้งเดียว (ไม่ใช่ generator) บน thread เดียวกับ stream() ต่อคิวกับ inference ไม่รันพร้อมกันบน model เดียวกัน
+        def once():
+            yield fnc(*args, **kwargs)
+
+        result = None
+        async for result in self.stream(once):
+            pass
+        return result
+
+    def queue_depth(self) -> int:
+        # งานที่รอ thread + chunk ที่ค้างอยู่ใน queue
+        with self._lock:
+            return self._pending_jobs + sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._wait_s)
+            stats = {
+                "name": self._name,
+                "pending_jobs": self._pending_jobs,
+                "running_jobs": self._running_jobs,
+                "queued_chunks": sum(q.qsize() for q in self._queues),
+                "total_chunks": self._total_chunks,
+            }
+        if waits:
+            stats["chunk_wait_ms_avg"] = 1000.0 * sum(waits) / len(waits)
+            stats["chunk_wait_ms_p95"] = 1000.0 * waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+            stats["chunk_wait_ms_max"] = 1000.0 * waits[-1]
+        return stats
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
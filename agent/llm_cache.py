@@ -0,0 +1,276 @@
+import collections
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any
+
+from livekit.agents import llm, utils, APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr
+from prometheus_client import Counter
+
+logger = logging.getLogger("llm_cache")
+
+# คำถามส่วนใหญ่ของ call center ซ้ำกัน (ราคา, เวลาเปิดปิด, คำทักทาย) เก็บคำตอบที่ stream มาแล้ว
+# ต่อ (system prompt + ท้ายบทสนทนา, คำพูดผู้ใช้ที่ normalize แล้ว) ไว้เล่นซ้ำทันทีโดยไม่ต้องถาม LLM
+# cache แชร์ทุก job ใน process คำตอบสั้นๆ ("ใช่ครับ" / "เอาสองชิ้นครับ") ขึ้นกับสิ่งที่คุยกันก่อนหน้า
+# จึงรวม AGENT_LLM_CACHE_CONTEXT_ITEMS ข้อความล่าสุดก่อนคำพูดนี้ไว้ใน key (turn แรก / FAQ ยังใช้ร่วมกันได้)
+_SENSEVOICE_TAGS = re.compile(r"<\|[^|]*\|>")
+# คำลงท้ายสุภาพไม่เปลี่ยนความหมายของคำถาม ("ราคาเท่าไหร่ครับ" = "ราคาเท่าไหร่คะ")
+_THAI_PARTICLES = re.compile(r"(?:ครับผม|ครับ|คับ|ค่ะ|คะ|ค่า|นะคะ|นะครับ|จ้ะ|จ้า|จ๊ะ|ฮะ|นะ)+$")
+
+DEFAULT_TTL_S = float(os.getenv("AGENT_LLM_CACHE_TTL", "600"))
+# 2 = คำพูดก่อนหน้าของผู้ใช้ + คำตอบของเอเจนต์ (ถามว่า "รับกี่ชิ้นคะ" ของสินค้าไหน)
+DEFAULT_CONTEXT_ITEMS = int(os.getenv("AGENT_LLM_CACHE_CONTEXT_ITEMS", "2"))
+
+LLM_CACHE_REQUESTS = Counter(
+    "agent_llm_cache_requests",
+    "LLM requests seen by the response cache",
+    ["result"],
+)
+
+
+def normalize_utterance(text: str) -> str:
+    # ตัด tag ของ SenseVoice, ช่องว่าง (ภาษาไทยไม่เว้นวรรคระหว่างคำ SenseVoice เว้นไม่สม่ำเสมอ),
+    # เครื่องหมายวรรคตอน, zero-width space และคำลงท้าย แปลงเลขไทยเป็นเลขอารบิก
+    text = unicodedata.normalize("NFKC", _SENSEVOICE_TAGS.sub("", text)).lower()
+    out = []
+    for ch in text:
+        cat = unicodedata.category(ch)
+        if ch.isspace() or cat[0] in "PZ" or cat in ("Cf", "Cc", "Sk", "So"):
+            continue
+        if cat == "Nd":
+            ch = str(unicodedata.digit(ch))
+        out.append(ch)
+    return _THAI_PARTICLES.sub("", "".join(out))
+
+
+def edit_ratio(a: str, b: str) -> float:
+    # edit distance / ความยาวของ string ที่ยาวกว่า
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1] / max(len(a), len(b), 1)
+
+
+class _Entry:
+    __slots__ = ("utterance", "chunks", "created_at")
+
+    def __init__(self, utterance: str, chunks: list[str], created_at: float):
+        self.utterance = utterance
+        self.chunks = chunks
+        self.created_at = created_at
+
+
+class LLMResponseCache:
+    # TTL + LRU ใน memory ของ worker process
+    # max_edit_ratio > 0 ยอมให้ utterance ต่างกันได้เล็กน้อย (เช่น ASR ผิดหนึ่งตัวอักษร) ระวังคำที่ต่างกัน
+    # ตัวเดียวแต่ความหมายตรงข้าม ("เปิดกี่โมง" / "ปิดกี่โมง") จึงปิดไว้เป็นค่าเริ่มต้น
+    def __init__(self, *, max_entries: int = 512, ttl_s: float = DEFAULT_TTL_S, max_edit_ratio: float = 0.0, min_fuzzy_chars: int = 8):
+        self._max_entries = max_entries
+        self._ttl = ttl_s
+        self._max_edit_ratio = max_edit_ratio
+        self._min_fuzzy_chars = min_fuzzy_chars
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[tuple[str, str], _Entry] = collections.OrderedDict()
+        self._hits = 0
+        self._fuzzy_hits = 0
+        self._misses = 0
+        self._expired = 0
+
+    def get(self, context: str, utterance: str) -> list[str] | None:
+        now = time.monotonic()
+        with self._lock:
+            key = (context, utterance)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self._ttl:
+                del self._entries[key]
+                self._expired += 1
+                entry = None
+            if entry is None and self._max_edit_ratio > 0 and len(utterance) >= self._min_fuzzy_chars:
+                entry = self._nearest(context, utterance, now)
+                if entry is not None:
+                    self._fuzzy_hits += 1
+                    key = (context, entry.utterance)
+            if entry is None:
+                self._misses += 1
+                LLM_CACHE_REQUESTS.labels(result="miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        LLM_CACHE_REQUESTS.labels(result="hit").inc()
+        return entry.chunks
+
+    def _nearest(self, context: str, utterance: str, now: float) -> _Entry | None:
+        best, best_ratio = None, self._max_edit_ratio
+        for (ctx, _), entry in self._entries.items():
+            if ctx != context or now - entry.created_at > self._ttl:
+                continue
+            if abs(len(entry.utterance) - len(utterance)) > best_ratio * len(utterance):
+                continue
+            ratio = edit_ratio(utterance, entry.utterance)
+            if ratio <= best_ratio:
+                best, best_ratio = entry, ratio
+        return best
+
+    def put(self, context: str, utterance: str, chunks: list[str]) -> None:
+        with self._lock:
+            self._entries[(context, utterance)] = _Entry(utterance, chunks, time.monotonic())
+            self._entries.move_to_end((context, utterance))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "fuzzy_hits": self._fuzzy_hits,
+                "misses": self._misses,
+                "expired": self._expired,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_LLM_CACHE: LLMResponseCache | None = None
+_LLM_CACHE_LOCK = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    # cache เดียวต่อ process แชร์ข้าม session / job
+    global _LLM_CACHE
+    with _LLM_CACHE_LOCK:
+        if _LLM_CACHE is None:
+            _LLM_CACHE = LLMResponseCache()
+        return _LLM_CACHE
+
+
+def _context_key(chat_ctx: llm.ChatContext, model: str, history_items: int = DEFAULT_CONTEXT_ITEMS) -> str:
+    # key สั้นจาก model + system prompt (prompt เปลี่ยนเมื่อไหร่คำตอบเดิมใช้ไม่ได้)
+    # + history_items ข้อความล่าสุดก่อนคำพูดของผู้ใช้ (คำตอบเดียวกันใช้ซ้ำได้เฉพาะหลังบทสนทนาเดียวกัน)
+    system, history = [], []
+    for item in chat_ctx.items[:-1]:
+        if item.type == "message" and item.role in ("system", "developer"):
+            system.append(item.text_content or "")
+        elif item.type == "message" and item.role == "user":
+            # คำพูดก่อนหน้าของผู้ใช้ normalize แบบเดียวกับ utterance (คำลงท้ายไม่เปลี่ยนบริบท)
+            history.append(f"user:{normalize_utterance(item.text_content or '')}")
+        elif item.type == "message":
+            history.append(f"{item.role}:{item.text_content or ''}")
+        else:
+            history.append(f"{item.type}:{item.id}")
+    recent = history[-history_items:] if history_items > 0 else []
+    return hashlib.sha256("\x1f".join([model, *system, "\x1e", *recent]).encode("utf-8")).hexdigest()[:16]
+
+
+def _last_user_utterance(chat_ctx: llm.ChatContext) -> str | None:
+    # cache เฉพาะ request ที่ตอบข้อความล่าสุดของผู้ใช้ (ไม่ใช่ผลของ tool call)
+    if not chat_ctx.items:
+        return None
+    last = chat_ctx.items[-1]
+    if last.type != "message" or last.role != "user":
+        return None
+    return last.text_content
+
+
+class CachedLLM(llm.LLM):
+    # ห่อ LLM จริง: hit = เล่น chunk ที่เก็บไว้ทันที, miss = ส่งต่อไป LLM จริงแล้วเก็บคำตอบถ้าจบครบ
+    # request ที่มี tools ไม่ผ่าน cache (คำตอบอาจขึ้นกับสถานะภายนอก)
+    def __init__(self, inner: llm.LLM, *, cache: LLMResponseCache | None = None, context_items: int = DEFAULT_CONTEXT_ITEMS):
+        super().__init__()
+        self._inner = inner
+        self._cache = cache or get_llm_cache()
+        self._context_items = context_items
+
+    @property
+    def model(self) -> str:
+        return self._inner.model
+
+    @property
+    def provider(self) -> str:
+        return self._inner.provider
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats()
+
+    def prewarm(self, *args, **kwargs) -> None:
+        self._inner.prewarm(*args, **kwargs)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool] | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict[str, Any]] = NOT_GIVEN,
+    ) -> llm.LLMStream:
+        inner_kwargs = {
+            "chat_ctx": chat_ctx,
+            "tools": tools,
+            "conn_options": conn_options,
+            "parallel_tool_calls": parallel_tool_calls,
+            "tool_choice": tool_choice,
+            "extra_kwargs": extra_kwargs,
+        }
+        text = None if tools else _last_user_utterance(chat_ctx)
+        utterance = normalize_utterance(text) if text else ""
+        if not utterance:
+            return self._inner.chat(**inner_kwargs)
+
+        context = _context_key(chat_ctx, self._inner.model, self._context_items)
+        chunks = self._cache.get(context, utterance)
+        if chunks is not None:
+            logger.info(f"LLM cache hit: {utterance!r}")
+            return _ReplayStream(self, chat_ctx=chat_ctx, conn_options=conn_options, chunks=chunks)
+        return _RecordingStream(self, chat_ctx=chat_ctx, conn_options=conn_options, inner_kwargs=inner_kwargs, context=context, utterance=utterance)
+
+
+class _ReplayStream(llm.LLMStream):
+    def __init__(self, llm_: CachedLLM, *, chat_ctx: llm.ChatContext, conn_options: APIConnectOptions, chunks: list[str]):
+        super().__init__(llm_, chat_ctx=chat_ctx, tools=[], conn_options=conn_options)
+        self._chunks = chunks
+
+    async def _run(self) -> None:
+        request_id = utils.shortuuid("cached_")
+        for content in self._chunks:
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=content)))
+
+
+class _RecordingStream(llm.LLMStream):
+    def __init__(self, llm_: CachedLLM, *, chat_ctx: llm.ChatContext, conn_options: APIConnectOptions, inner_kwargs: dict, context: str, utterance: str):
+        # retry เกิดใน stream ของ LLM จริงแล้ว ไม่ retry ซ้ำที่ชั้นนี้
+        super().__init__(llm_, chat_ctx=chat_ctx, tools=[], conn_options=APIConnectOptions(max_retry=0, timeout=conn_options.timeout))
+        self._cached_llm = llm_
+        self._inner_kwargs = inner_kwargs
+        self._context = context
+        self._utterance = utterance
+
+    async def _run(self) -> None:
+        chunks: list[str] = []
+        cacheable = True
+        async with self._cached_llm._inner.chat(**self._inner_kwargs) as stream:
+            async for chunk in stream:
+                if chunk.delta:
+                    if chunk.delta.tool_calls:
+                        cacheable = False
+                    if chunk.delta.content:
+                        chunks.append(chunk.delta.content)
+                self._event_ch.send_nowait(chunk)
+        # มาถึงตรงนี้แปลว่า stream จบครบโดยไม่มี error
+        if cacheable and chunks:
+            self._cached_llm._cache.put(self._context, self._utterance, chunks)
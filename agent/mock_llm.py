@@ -1,57 +1,274 @@
 from __future__ import annotations
 import asyncio
+import itertools
+import json
+import random
 from livekit.agents.llm import LLM, LLMStream, ChatContext, ChatChunk, ChoiceDelta
-from livekit.agents import utils, APIConnectOptions
+from livekit.agents import utils, APIConnectOptions, APIConnectionError, APITimeoutError, DEFAULT_API_CONNECT_OPTIONS
+
+from chat_window import item_tokens
+
+# profile ของ MockLLM สำหรับ load test โดยไม่ต้องรัน Ollama:
+#   time-to-first-token, tokens/s, ความยาวคำตอบ (สุ่มตาม distribution), คำตอบภาษาไทยหลายประโยค
+#   และ error / timeout ที่ฉีดเข้าไปตามอัตราที่กำหนด ทุกอย่างสุ่มจาก seed เดียว (request ที่ n ได้ผลเดิมทุกครั้ง)
+#
+#   MockLLM()                                   # echo แบบเดิม
+#   MockLLM("ollama-cpu")                       # preset
+#   MockLLM(MockProfile(ttft_ms="lognormal:400,0.5", tokens_per_s="normal:12,3", failure_rate=0.05))
+
+# ประโยคตอบแบบ call center (ใช้ต่อกันจนได้ความยาวตาม length_chars)
+THAI_REPLIES = [
+    "สวัสดีค่ะ ยินดีต้อนรับสู่ร้านของเรานะคะ",
+    "วันนี้มีอะไรให้ฟ้าใสช่วยไหมคะ",
+    "ตอนนี้เรามีโปรโมชั่นพิเศษ ลดราคาสินค้าทุกชิ้นสูงสุดห้าสิบเปอร์เซ็นต์ค่ะ",
+    "โปรโมชั่นนี้มีถึงสิ้นเดือนนี้เท่านั้นนะคะ",
+    "ถ้าสั่งซื้อวันนี้ จัดส่งฟรีทั่วประเทศภายในสามวันทำการค่ะ",
+    "ลูกค้าสามารถชำระเงินได้ทั้งบัตรเครดิต โอนเงิน หรือเก็บเงินปลายทางค่ะ",
+    "สนใจรับรายละเอียดเพิ่มเติมทางไลน์ไหมคะ",
+    "ขอบคุณที่ใช้บริการนะคะ มีอะไรสอบถามเพิ่มเติมได้ตลอดเลยค่ะ",
+]
+
+
+class Dist:
+    # distribution แบบง่ายสำหรับ profile: const / uniform / normal / lognormal (a = median, b = sigma)
+    KINDS = ("const", "uniform", "normal", "lognormal")
+
+    def __init__(self, kind: str, a: float, b: float = 0.0):
+        if kind not in self.KINDS:
+            raise ValueError(f"unknown distribution {kind!r}, expected one of {', '.join(self.KINDS)}")
+        self.kind = kind
+        self.a = float(a)
+        self.b = float(b)
+
+    @classmethod
+    def parse(cls, spec: Dist | float | str) -> Dist:
+        # 120 / "120" / "uniform:80,200" / "normal:12,3" / "lognormal:400,0.5"
+        if isinstance(spec, Dist):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("const", spec)
+        kind, _, params = str(spec).partition(":")
+        if not params:
+            return cls("const", float(kind))
+        return cls(kind, *(float(p) for p in params.split(",")))
+
+    def sample(self, rng: random.Random, minimum: float = 0.0) -> float:
+        if self.kind == "uniform":
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == "normal":
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == "lognormal":
+            value = self.a * rng.lognormvariate(0.0, self.b)
+        else:
+            value = self.a
+        return max(minimum, value)
+
+    def __repr__(self) -> str:
+        return f"{self.a:g}" if self.kind == "const" else f"{self.kind}:{self.a:g},{self.b:g}"
+
+
+class MockProfile:
+    def __init__(
+        self,
+        name: str = "custom",
+        *,
+        ttft_ms: Dist | float | str = 0.0,
+        tokens_per_s: Dist | float | str = 10.0,
+        chars_per_token: float = 5.0,
+        length_chars: Dist | float | str | None = None,
+        replies: list[str] | None = None,
+        echo: bool = False,
+        failure_rate: float = 0.0,
+        midstream_failure_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        prefill_tokens_per_s: float = 0.0,
+        num_ctx: int = 0,
+        seed: int | None = 0,
+    ):
+        self.name = name
+        self.ttft_ms = Dist.parse(ttft_ms)
+        self.tokens_per_s = Dist.parse(tokens_per_s)
+        self.chars_per_token = chars_per_token
+        # None = ประโยคเดียวต่อคำตอบ
+        self.length_chars = Dist.parse(length_chars) if length_chars is not None else None
+        self.replies = replies or THAI_REPLIES
+        self.echo = echo
+        # ล้มก่อน token แรก / ล้มกลางคำตอบ / เงียบจนหมด conn_options.timeout
+        self.failure_rate = failure_rate
+        self.midstream_failure_rate = midstream_failure_rate
+        self.timeout_rate = timeout_rate
+        # เวลา prefill ของ prompt (0 = ไม่คิด) แบบ Ollama: ส่วนหน้าที่ตรงกับ prompt ก่อนหน้าอยู่ใน KV cache แล้ว
+        # prompt เกิน num_ctx (0 = ไม่จำกัด) Ollama เลื่อน context ทิ้ง cache และ prefill ใหม่ทั้ง num_ctx
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.num_ctx = num_ctx
+        self.seed = seed
+
+    @classmethod
+    def from_dict(cls, config: dict) -> MockProfile:
+        config = dict(config)
+        return cls(config.pop("name", "custom"), **config)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "ttft_ms": repr(self.ttft_ms),
+            "tokens_per_s": repr(self.tokens_per_s),
+            "chars_per_token": self.chars_per_token,
+            "length_chars": repr(self.length_chars) if self.length_chars else None,
+            "echo": self.echo,
+            "failure_rate": self.failure_rate,
+            "midstream_failure_rate": self.midstream_failure_rate,
+            "timeout_rate": self.timeout_rate,
+            "prefill_tokens_per_s": self.prefill_tokens_per_s,
+            "num_ctx": self.num_ctx,
+            "seed": self.seed,
+        }
+
+
+PROFILES = {
+    # พฤติกรรมเดิม: ทวนคำผู้ใช้ ทีละ 5 ตัวอักษร ทุก 100 ms
+    "echo": MockProfile("echo", echo=True),
+    # ไม่มี delay ใช้วัด overhead ของ pipeline
+    "instant": MockProfile("instant", tokens_per_s=10000, length_chars=60),
+    # ใกล้เคียง qwen2.5:7b บน Ollama (CPU): token แรกช้าและแกว่ง คำตอบ 2-3 ประโยค
+    "ollama-cpu": MockProfile("ollama-cpu", ttft_ms="lognormal:700,0.4", tokens_per_s="normal:9,2", chars_per_token=2.5, length_chars="uniform:60,180"),
+    # GPU / hosted API
+    "fast": MockProfile("fast", ttft_ms="lognormal:180,0.3", tokens_per_s="normal:60,10", chars_per_token=2.5, length_chars="uniform:60,180"),
+    # มี error / timeout ปนมา ใช้ทดสอบ retry และ fallback
+    "flaky": MockProfile("flaky", ttft_ms="lognormal:400,0.5", tokens_per_s="normal:20,5", chars_per_token=2.5, length_chars="uniform:40,160", failure_rate=0.05, midstream_failure_rate=0.05, timeout_rate=0.03),
+}
+
+
+def get_profile(spec: MockProfile | str | dict | None) -> MockProfile:
+    # ชื่อ preset, JSON ของ MockProfile หรือ object
+    if spec is None:
+        return PROFILES["echo"]
+    if isinstance(spec, MockProfile):
+        return spec
+    if isinstance(spec, dict):
+        return MockProfile.from_dict(spec)
+    if spec.lstrip().startswith("{"):
+        return MockProfile.from_dict(json.loads(spec))
+    if spec not in PROFILES:
+        raise ValueError(f"unknown MockLLM profile {spec!r}, expected one of {', '.join(PROFILES)}")
+    return PROFILES[spec]
+
 
 class MockLLM(LLM):
-    def __init__(self):
+    def __init__(self, profile: MockProfile | str | dict | None = None, *, seed: int | None = None):
         super().__init__()
+        self.profile = get_profile(profile)
+        self._seed = self.profile.seed if seed is None else seed
+        self._requests = itertools.count()
+        self._cached_prompt: list[tuple[str, int]] = []
 
-    def chat(self, chat_ctx: ChatContext, **kwargs) -> LLMStream:
-        return MockLLMStream(self, chat_ctx)
+    def _prefill_s(self, chat_ctx: ChatContext) -> float:
+        profile = self.profile
+        if not profile.prefill_tokens_per_s:
+            return 0.0
+        prompt = [(f"{item.type}:{getattr(item, 'role', '')}:{getattr(item, 'text_content', None) or ''}", item_tokens(item)) for item in chat_ctx.items]
+        total = sum(tokens for _, tokens in prompt)
+        cached = 0
+        for (key, tokens), (cached_key, _) in zip(prompt, self._cached_prompt):
+            if key != cached_key:
+                break
+            cached += tokens
+        if profile.num_ctx and total > profile.num_ctx:
+            uncached = profile.num_ctx
+        else:
+            uncached = total - cached
+        self._cached_prompt = prompt
+        return uncached / profile.prefill_tokens_per_s
+
+    def chat(self, chat_ctx: ChatContext, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS, **kwargs) -> LLMStream:
+        index = next(self._requests)
+        # rng แยกต่อ request: request ที่ n ได้ผลเดิมเสมอไม่ว่า request จะมาพร้อมกันกี่ตัว
+        rng = random.Random(f"{self._seed}:{index}") if self._seed is not None else random.Random()
+        return MockLLMStream(self, chat_ctx, profile=self.profile, rng=rng, conn_options=conn_options, prefill_s=self._prefill_s(chat_ctx))
 
 class MockLLMStream(LLMStream):
-    def __init__(self, llm: LLM, chat_ctx: ChatContext):
+    def __init__(self, llm: LLM, chat_ctx: ChatContext, *, profile: MockProfile, rng: random.Random, conn_options: APIConnectOptions, prefill_s: float = 0.0):
         super().__init__(
-            llm, 
-            chat_ctx=chat_ctx, 
-            tools=[], 
-            conn_options=APIConnectOptions()
+            llm,
+            chat_ctx=chat_ctx,
+            tools=[],
+            conn_options=conn_options
         )
+        self._profile = profile
+        self._rng = rng
+        self._prefill_s = prefill_s
         self._closing = False
 
-    async def _run(self):
+    def _user_message(self) -> str:
         # Determine response based on last user message
-        user_msg = ""
         for msg in reversed(self._chat_ctx.items):
             if msg.role == "user":
                 if isinstance(msg.content, list):
-                    user_msg = " ".join([str(c) for c in msg.content])
-                else:
-                    user_msg = str(msg.content)
-                break
-        
-        response_text = f"คุณพูดว่า: {user_msg} (นี่คือระบบตอบกลับอัตโนมัติ)"
-        if not user_msg:
-            response_text = "สวัสดีครับ ผมจาวิสเองครับ มีอะไรให้ช่วยไหมครับ"
+                    return " ".join([str(c) for c in msg.content])
+                return str(msg.content)
+        return ""
+
+    def _response_text(self) -> str:
+        profile, rng = self._profile, self._rng
+        if profile.echo:
+            user_msg = self._user_message()
+            if not user_msg:
+                return "สวัสดีครับ ผมจาวิสเองครับ มีอะไรให้ช่วยไหมครับ"
+            return f"คุณพูดว่า: {user_msg} (นี่คือระบบตอบกลับอัตโนมัติ)"
+
+        # ต่อประโยคจาก replies (เริ่มที่ประโยคสุ่ม) จนยาวถึงความยาวที่สุ่มได้
+        target = profile.length_chars.sample(rng, minimum=1) if profile.length_chars else 0
+        start = rng.randrange(len(profile.replies))
+        sentences = [profile.replies[start]]
+        while sum(len(s) for s in sentences) < target:
+            sentences.append(profile.replies[(start + len(sentences)) % len(profile.replies)])
+        return " ".join(sentences)
+
+    def _tokens(self, text: str) -> list[str]:
+        # แบ่งเป็น token ยาวเฉลี่ย chars_per_token (เหมือน tokenizer จริงที่ความยาวไม่เท่ากัน)
+        cpt = self._profile.chars_per_token
+        if self._profile.echo:
+            size = max(1, int(cpt))
+            return [text[i:i + size] for i in range(0, len(text), size)]
+        tokens, i = [], 0
+        while i < len(text):
+            size = max(1, round(self._rng.uniform(0.5, 1.5) * cpt))
+            tokens.append(text[i:i + size])
+            i += size
+        return tokens
+
+    async def _run(self):
+        profile, rng = self._profile, self._rng
+        response_text = self._response_text()
+        tokens = self._tokens(response_text)
+        # สุ่มทุกค่าก่อนเริ่ม เพื่อให้ลำดับการใช้ rng ไม่ขึ้นกับ timing
+        ttft = profile.ttft_ms.sample(rng) / 1000 + self._prefill_s
+        interval = 1.0 / profile.tokens_per_s.sample(rng, minimum=0.1)
+        fail = rng.random() < profile.failure_rate
+        timeout = rng.random() < profile.timeout_rate
+        fail_at = rng.randrange(1, len(tokens)) if len(tokens) > 1 and rng.random() < profile.midstream_failure_rate else None
+
+        if timeout:
+            await asyncio.sleep(self._conn_options.timeout)
+            raise APITimeoutError(f"MockLLM ({profile.name}): injected timeout")
+        await asyncio.sleep(ttft)
+        if fail:
+            raise APIConnectionError(f"MockLLM ({profile.name}): injected failure")
 
         # Simulate streaming delay
-        chunk_size = 5
-        for i in range(0, len(response_text), chunk_size):
+        for i, chunk_content in enumerate(tokens):
             if self._closing:
                 break
-            
-            chunk_content = response_text[i:i+chunk_size]
+            if fail_at is not None and i == fail_at:
+                raise APIConnectionError(f"MockLLM ({profile.name}): injected failure after {i} tokens", retryable=False)
+
             chunk = ChatChunk(
                 id=utils.shortuuid("chunk_"),
                 delta=ChoiceDelta(role="assistant", content=chunk_content)
             )
             # Use internal event emitter to yield chunk
             self._event_ch.send_nowait(chunk)
-            await asyncio.sleep(0.1)
-        
-        # Signal completion
-        self._event_ch.close()
+            await asyncio.sleep(interval)
 
     async def aclose(self):
         self._closing = True
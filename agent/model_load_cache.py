@@ -0,0 +1,154 @@
+# cache การโหลด CosyVoice: เก็บ config ที่ HyperPyYAML resolve แล้ว พร้อม weight ที่โหลดเสร็จ
+# เป็นไฟล์ torch zip ไฟล์เดียวข้าง model dir (<model_dir>.loadcache/model.pt)
+#
+# ครั้งแรก: โหลดตามปกติ (parse YAML + torch.load checkpoint) แล้ว save ผลลัพธ์ลง cache
+# ครั้งต่อไป: torch.load(mmap=True) ไฟล์เดียว ไม่ต้อง parse YAML และไม่ copy weight เข้า module
+# parameter ชี้ไปที่ page ของไฟล์โดยตรง worker หลาย process จึงแชร์ page เดียวกันผ่าน page cache
+#
+# cache หมดอายุเมื่อ hash ของไฟล์ใน model dir หรือ version ของ torch เปลี่ยน
+# (hash ถูกจำไว้ใน manifest.json คู่กับ size/mtime ของไฟล์ ไม่ต้องอ่าน checkpoint ใหม่ทุกครั้ง)
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import contextlib
+from contextlib import contextmanager
+
+logger = logging.getLogger("model_load_cache")
+
+CACHE_SUFFIX = ".loadcache"
+FORMAT_VERSION = 1
+MODEL_CLASSES = ("CosyVoiceModel", "CosyVoice2Model", "CosyVoice3Model")
+
+# patch ระดับ module ของ cosyvoice ต้องไม่ซ้อนกันระหว่าง thread
+_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_dir_for(model_dir: str) -> str:
+    return os.path.realpath(model_dir).rstrip(os.sep) + CACHE_SUFFIX
+
+
+def _read_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _fingerprint(model_dir: str, known: dict, extra: dict) -> tuple[str, dict]:
+    # hash ทุกไฟล์ใน model dir (ใช้ hash เดิมถ้า size/mtime/inode ไม่เปลี่ยน)
+    files = {}
+    for root, dirs, names in os.walk(model_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, model_dir)
+            st = os.stat(path)
+            stamp = [st.st_size, st.st_mtime_ns, st.st_ino]
+            old = known.get(rel)
+            digest = old["sha256"] if old and old.get("stat") == stamp else file_sha256(path)
+            files[rel] = {"stat": stamp, "sha256": digest}
+    payload = {"files": {rel: f["sha256"] for rel, f in files.items()}, **extra}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest(), files
+
+
+def _loaded_weights(self, *args, **kwargs):
+    # แทน CosyVoiceModel.load ตอน cache hit: weight มาจาก cache แล้ว แค่ย้ายไป device และตั้ง eval
+    for name in ("llm", "flow", "hift"):
+        module = getattr(self, name, None)
+        if module is not None:
+            module.to(self.device).eval()
+
+
+@contextmanager
+def cosyvoice_load_cache(cli, model_dir: str, *, cache_dir: str | None = None):
+    # ครอบการสร้าง cli.CosyVoice* หนึ่งครั้ง:
+    #   with cosyvoice_load_cache(cli, path):
+    #       model = cli.CosyVoice3(path)
+    import torch
+    import cosyvoice.cli.model as model_mod
+
+    cache_dir = cache_dir or cache_dir_for(model_dir)
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    blob_path = os.path.join(cache_dir, "model.pt")
+
+    with _lock:
+        start = time.perf_counter()
+        manifest = _read_manifest(manifest_path)
+        extra = {"format": FORMAT_VERSION, "torch": torch.__version__}
+        fingerprint, files = _fingerprint(model_dir, manifest.get("files", {}), extra)
+        hash_s = time.perf_counter() - start
+
+        configs = None
+        if manifest.get("fingerprint") == fingerprint and os.path.exists(blob_path):
+            try:
+                start = time.perf_counter()
+                configs = torch.load(blob_path, map_location="cpu", mmap=True, weights_only=False)
+                logger.info(f"CosyVoice load cache hit: {blob_path} (hash {hash_s:.2f}s, map {time.perf_counter() - start:.2f}s)")
+            except Exception as e:
+                logger.warning(f"Could not read CosyVoice load cache {blob_path}, loading from YAML: {e}")
+        elif os.path.exists(blob_path):
+            logger.info(f"CosyVoice load cache is stale ({model_dir} changed), rebuilding")
+
+        original_yaml = cli.load_hyperpyyaml
+        captured = {}
+
+        def cached_yaml(*args, **kwargs):
+            return configs
+
+        def recording_yaml(*args, **kwargs):
+            captured["configs"] = original_yaml(*args, **kwargs)
+            return captured["configs"]
+
+        cli.load_hyperpyyaml = cached_yaml if configs is not None else recording_yaml
+        patched = []
+        if configs is not None:
+            for name in MODEL_CLASSES:
+                cls = getattr(model_mod, name, None)
+                if cls is not None and "load" in cls.__dict__:
+                    patched.append((cls, cls.__dict__["load"]))
+                    cls.load = _loaded_weights
+        try:
+            yield
+        finally:
+            cli.load_hyperpyyaml = original_yaml
+            for cls, load in patched:
+                cls.load = load
+
+        tmp = f"{blob_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            if "configs" in captured:
+                # module ใน config คือ object เดียวกับที่ model ใช้ ตอนนี้มี weight จริงแล้ว
+                start = time.perf_counter()
+                torch.save(captured["configs"], tmp)
+                os.replace(tmp, blob_path)
+                logger.info(f"Wrote CosyVoice load cache {blob_path} ({os.path.getsize(blob_path) / 2**20:.0f} MiB) in {time.perf_counter() - start:.2f}s")
+                configs = captured["configs"]
+            if configs is not None and (manifest.get("fingerprint") != fingerprint or manifest.get("files") != files):
+                _write_manifest(manifest_path, {"fingerprint": fingerprint, "files": files, **extra})
+        except Exception as e:
+            # model dir อ่านอย่างเดียว หรือ config มี object ที่ pickle ไม่ได้: โหลดแบบเดิมต่อไป
+            logger.warning(f"Could not write CosyVoice load cache to {cache_dir}: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
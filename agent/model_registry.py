@@ -0,0 +1,90 @@
+import logging
+import os
+import resource
+import threading
+import time
+from typing import Any, Callable
+
+from placement import get_placement
+
+logger = logging.getLogger("model_registry")
+
+# LiveKit รัน job แบบ "thread" (ทุก job เป็น thread ใน worker process เดียว) หรือ "process" (job ละ process ลูก)
+# แบบ thread เท่านั้นที่ session หลายสายแชร์ model, SenseVoiceBatcher และ TTSScheduler ตัวเดียวกันจริง
+# แบบ process แต่ละ process โหลด model ของตัวเองและ batch / schedule ได้แค่ session เดียว (แลกกับ job ที่ล่มไม่ลากตัวอื่นไปด้วย)
+JOB_EXECUTOR = os.getenv("AGENT_JOB_EXECUTOR", "thread")
+
+
+def shares_models_across_jobs() -> bool:
+    return JOB_EXECUTOR == "thread"
+
+
+def _rss_bytes() -> int:
+    # resident set size ปัจจุบันของ process (Linux: /proc, ที่อื่นใช้ peak RSS แทน)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS รายงานเป็น byte, Linux เป็น KiB
+        return rss if os.uname().sysname == "Darwin" else rss * 1024
+
+
+class _Entry:
+    __slots__ = ("model", "load_s", "rss_bytes", "engine")
+
+    def __init__(self, model: Any, load_s: float, rss_bytes: int, engine: str | None):
+        self.model = model
+        self.load_s = load_s
+        self.rss_bytes = rss_bytes
+        self.engine = engine
+
+
+class ModelRegistry:
+    # โหลด model แต่ละตัวครั้งเดียวต่อ worker process แล้วแชร์ instance ให้ทุก job
+    # key คือ (kind, path, device, dtype)
+    def __init__(self):
+        self._entries: dict[tuple[str, str, str, str], _Entry] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, kind: str, path: str, loader: Callable[[], Any], *, device: str = "cpu", dtype: str = "float32", engine: str | None = None) -> Any:
+        key = (kind, os.path.realpath(path) if os.path.exists(path) else path, device, dtype)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry.model
+
+            if engine:
+                # ค่า thread ระดับ process ต้องตั้งก่อน model เริ่มทำงาน
+                get_placement().apply_process()
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            model = loader()
+            load_s = time.perf_counter() - start
+            rss = max(0, _rss_bytes() - rss_before)
+
+            # loader คืน None เมื่อโหลดไม่สำเร็จ ไม่ cache ไว้เพื่อให้ลองใหม่ได้
+            if model is not None:
+                self._entries[key] = _Entry(model, load_s, rss, engine)
+                logger.info(f"Loaded {kind} ({key[1]}, {device}, {dtype}) in {load_s:.2f}s, +{rss / 2**20:.0f} MiB RSS")
+            return model
+
+    def report(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "kind": kind,
+                    "path": path,
+                    "device": device,
+                    "dtype": dtype,
+                    "engine": entry.engine,
+                    "placement": get_placement().budgets[entry.engine].as_dict() if entry.engine else None,
+                    "load_s": round(entry.load_s, 3),
+                    "rss_mib": round(entry.rss_bytes / 2**20, 1),
+                }
+                for (kind, path, device, dtype), entry in self._entries.items()
+            ]
+
+
+# registry เดียวต่อ process
+REGISTRY = ModelRegistry()
@@ -0,0 +1,42 @@
+import numpy as np
+
+from audio_ingest import StreamResampler
+
+
+class PcmConverter:
+    # แปลง float32 (-1..1) จาก vocoder เป็น int16 PCM แบบ saturate (ไม่ wrap ตอน peak)
+    # ใช้ buffer ซ้ำระหว่าง chunk และ resample ไป out_rate แบบต่อเนื่องได้ (เช่น 48 kHz ให้ตรงกับ room)
+    def __init__(self, in_rate: int, out_rate: int | None = None):
+        self.in_rate = in_rate
+        self.out_rate = out_rate or in_rate
+        self._resampler = StreamResampler(in_rate, self.out_rate) if self.out_rate != in_rate else None
+        self._scratch = np.empty(0, dtype=np.float32)
+        self._pcm = np.empty(0, dtype=np.int16)
+
+    def convert(self, audio: np.ndarray) -> bytes:
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if self._resampler is not None:
+            audio = self._resampler.push(audio)
+        return self._to_int16(audio)
+
+    def flush(self) -> bytes:
+        # ส่วนท้ายที่ resampler ยังค้างไว้ (filter delay)
+        if self._resampler is None:
+            return b""
+        return self._to_int16(self._resampler.flush())
+
+    def _to_int16(self, audio: np.ndarray) -> bytes:
+        n = len(audio)
+        if n == 0:
+            return b""
+        if len(self._scratch) < n:
+            self._scratch = np.empty(n, dtype=np.float32)
+            self._pcm = np.empty(n, dtype=np.int16)
+        scratch = self._scratch[:n]
+        pcm = self._pcm[:n]
+        np.multiply(audio, 32768.0, out=scratch)
+        np.clip(scratch, -32768.0, 32767.0, out=scratch)
+        np.rint(scratch, out=scratch)
+        np.copyto(pcm, scratch, casting="unsafe")
+        # emitter เก็บ bytes ไว้ประมวลผลทีหลัง ต้องคืนสำเนา ไม่ใช่ view ของ buffer ที่จะถูกเขียนทับ
+        return pcm.tobytes()
@@ -0,0 +1,60 @@
+import re
+
+# จุดที่ตัดวลีได้: เครื่องหมายจบประโยค, จุลภาค, ขึ้นบรรทัดใหม่ และช่องว่าง (ภาษาไทยใช้เว้นวรรคคั่นวลี)
+_STRONG_BREAK = re.compile(r"[.!?。！？\n]+\s*")
+_WEAK_BREAK = re.compile(r"[,，、;:]\s*|\s+")
+
+
+class PhraseChunker:
+    # ตัดข้อความที่ทยอยมาจาก LLM เป็นวลีสำหรับ TTS
+    # วลีแรกตัดให้สั้น (first_min_chars) เพื่อให้ได้เสียงแรกเร็วที่สุด วลีถัดไปยาวขึ้นเพื่อ prosody ที่ดีกว่า
+    def __init__(self, *, first_min_chars: int = 8, min_chars: int = 24, max_chars: int = 120):
+        self._first_min = first_min_chars
+        self._min = min_chars
+        self._max = max_chars
+        self._buf = ""
+        self._emitted = 0
+
+    def push(self, text: str) -> list[str]:
+        self._buf += text
+        phrases = []
+        while True:
+            phrase = self._next_phrase()
+            if phrase is None:
+                break
+            phrases.append(phrase)
+        return phrases
+
+    def flush(self) -> list[str]:
+        rest, self._buf = self._buf.strip(), ""
+        if not rest:
+            return []
+        self._emitted += 1
+        return [rest]
+
+    def _next_phrase(self) -> str | None:
+        min_chars = self._first_min if self._emitted == 0 else self._min
+
+        cut = self._find_break(_STRONG_BREAK, min_chars)
+        if cut is None:
+            # หลังวลีแรก จุดตัดแบบอ่อน (เว้นวรรค/จุลภาค) ต้องได้วลียาวเป็นสองเท่าของ min_chars
+            cut = self._find_break(_WEAK_BREAK, min_chars if self._emitted == 0 else 2 * min_chars)
+        if cut is None and len(self._buf) >= self._max:
+            cut = self._max
+
+        if cut is None:
+            return None
+        phrase, self._buf = self._buf[:cut].strip(), self._buf[cut:]
+        if not phrase:
+            return self._next_phrase() if self._buf else None
+        self._emitted += 1
+        return phrase
+
+    def _find_break(self, pattern: re.Pattern, min_chars: int) -> int | None:
+        # จุดตัดแรกที่ทำให้วลียาวอย่างน้อย min_chars (และยังมีข้อความตามหลัง ไม่ใช่ตัดท้าย buffer ที่อาจยังพิมพ์ไม่จบ)
+        for m in pattern.finditer(self._buf):
+            if m.end() >= len(self._buf):
+                break
+            if len(self._buf[:m.start()].strip()) >= min_chars:
+                return m.end()
+        return None
@@ -0,0 +1,201 @@
+# จำนวน thread และ CPU affinity ของแต่ละ engine (stt / tts / vad) ใน worker process
+#
+# ถ้าไม่จำกัด thread ทุก engine (และทุก job process เมื่อ AGENT_JOB_EXECUTOR=process) ที่รัน SenseVoice + CosyVoice
+# จะใช้ torch/OpenMP เต็มทุก core แย่งกันจน tail latency พุ่ง ตั้งงบ thread ต่อ engine แล้ว
+# (ถ้าต้องการ) pin แต่ละ engine ไว้กับชุด core ของตัวเอง
+#
+# ตั้งค่าผ่าน AGENT_PLACEMENT เป็น JSON หรือ path ของไฟล์ JSON เช่น
+#   {"stt": {"threads": 2, "cpus": "0-1"}, "tts": {"threads": 4, "cpus": "2-5"}, "vad": {"threads": 1}, "interop_threads": 1}
+#
+# torch.set_num_threads / sched_setaffinity มีผลต่อ thread ที่เรียก (OpenMP pool ของ thread นั้นด้วย)
+# จึงเรียก pin() ใน thread ของ engine เอง: InferenceExecutor (tts) และ SenseVoiceBatcher (stt)
+# vad ถูก pin ที่ main thread ตอน prewarm thread อื่นที่สร้างทีหลัง (รวมถึง executor ของ Silero) สืบทอดค่านี้
+#
+#   python placement.py          # แสดง config ที่ resolve แล้วเป็น JSON
+import json
+import logging
+import os
+import sys
+import threading
+
+logger = logging.getLogger("placement")
+
+ENGINES = ("stt", "tts", "vad")
+
+
+def parse_cpus(spec) -> set[int] | None:
+    # "0-3,8" / [0, 1, 2] / None
+    if spec is None or spec == "":
+        return None
+    if isinstance(spec, (list, tuple, set)):
+        return {int(c) for c in spec}
+    cpus = set()
+    for part in str(spec).split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.update(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def _format_cpus(cpus: set[int] | None) -> str | None:
+    if not cpus:
+        return None
+    ranges, items = [], sorted(cpus)
+    start = prev = items[0]
+    for c in items[1:] + [None]:
+        if c is not None and c == prev + 1:
+            prev = c
+            continue
+        ranges.append(f"{start}-{prev}" if prev != start else str(start))
+        if c is not None:
+            start = prev = c
+    return ",".join(ranges)
+
+
+def _allowed_cpus() -> set[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return set(os.sched_getaffinity(0))
+    return set(range(os.cpu_count() or 1))
+
+
+class EngineBudget:
+    def __init__(self, threads: int, cpus: set[int] | None = None):
+        self.threads = max(1, int(threads))
+        self.cpus = cpus
+
+    def as_dict(self) -> dict:
+        return {"threads": self.threads, "cpus": _format_cpus(self.cpus)}
+
+
+class Placement:
+    def __init__(self, budgets: dict[str, EngineBudget], *, interop_threads: int = 1):
+        self.budgets = budgets
+        self.interop_threads = interop_threads
+        # core ทั้งหมดที่ process ได้รับตอนเริ่ม (engine ที่ไม่ได้กำหนด cpus ใช้ชุดนี้)
+        self._allowed = _allowed_cpus()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pinned: list[dict] = []
+        self._process_applied = False
+
+    @classmethod
+    def default(cls) -> "Placement":
+        # ไม่ได้ตั้งค่า: แบ่ง core ที่มี tts ครึ่งหนึ่ง stt หนึ่งในสี่ vad 1 thread ไม่ pin
+        n = len(_allowed_cpus())
+        return cls({"stt": EngineBudget(max(1, n // 4)), "tts": EngineBudget(max(1, n // 2)), "vad": EngineBudget(1)})
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Placement":
+        placement = cls.default()
+        for engine, spec in config.items():
+            if engine == "interop_threads":
+                placement.interop_threads = max(1, int(spec))
+            elif engine in ENGINES:
+                budget = placement.budgets[engine]
+                placement.budgets[engine] = EngineBudget(spec.get("threads", budget.threads), parse_cpus(spec.get("cpus")))
+            else:
+                raise ValueError(f"unknown engine {engine!r} in placement config, expected one of {', '.join(ENGINES)}")
+        return placement
+
+    @classmethod
+    def from_env(cls) -> "Placement":
+        raw = os.getenv("AGENT_PLACEMENT", "").strip()
+        if not raw:
+            return cls.default()
+        if not raw.startswith("{"):
+            with open(raw, encoding="utf-8") as f:
+                raw = f.read()
+        return cls.from_config(json.loads(raw))
+
+    def threads(self, engine: str) -> int:
+        return self.budgets[engine].threads
+
+    def apply_process(self) -> None:
+        # ค่าระดับ process: inter-op pool ของ torch ตั้งได้ครั้งเดียวก่อนเริ่มใช้งานจริง
+        with self._lock:
+            if self._process_applied:
+                return
+            self._process_applied = True
+        torch = sys.modules.get("torch")
+        if torch is None:
+            return
+        try:
+            torch.set_num_interop_threads(self.interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set torch inter-op threads to {self.interop_threads}: {e}")
+
+    def cpus(self, engine: str) -> set[int]:
+        # core ที่ thread ของ engine ได้ใช้จริง (cpus ของ budget ที่อยู่ในชุดที่ process ได้รับ)
+        budget = self.budgets[engine]
+        cpus = (budget.cpus & self._allowed) if budget.cpus else self._allowed
+        return cpus or self._allowed
+
+    def pin(self, engine: str) -> None:
+        # เรียกใน thread ของ engine ครั้งเดียวต่อ thread
+        if getattr(self._local, "engine", None) == engine:
+            return
+        budget = self.budgets[engine]
+        self.apply_process()
+        cpus = self.cpus(engine)
+        if budget.cpus and not (budget.cpus & self._allowed):
+            logger.warning(f"{engine}: cpus {_format_cpus(budget.cpus)} are outside the allowed set {_format_cpus(self._allowed)}, not pinning")
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                # pid 0 = thread ที่เรียก (Linux)
+                os.sched_setaffinity(0, cpus)
+            except OSError as e:
+                logger.warning(f"{engine}: sched_setaffinity failed: {e}")
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(budget.threads)
+
+        self._local.engine = engine
+        thread = threading.current_thread()
+        with self._lock:
+            self._pinned.append({
+                "engine": engine,
+                "thread": thread.name,
+                "native_id": thread.native_id,
+                "affinity": _format_cpus(set(os.sched_getaffinity(0))) if hasattr(os, "sched_getaffinity") else None,
+                "torch_threads": torch.get_num_threads() if torch is not None else None,
+            })
+        logger.info(f"Pinned {engine} thread {thread.name}: {budget.threads} threads on cpus {_format_cpus(cpus)}")
+
+    def diagnostics(self) -> dict:
+        torch = sys.modules.get("torch")
+        total = sum(b.threads for b in self.budgets.values())
+        with self._lock:
+            pinned = list(self._pinned)
+        return {
+            "pid": os.getpid(),
+            "cpu_count": os.cpu_count(),
+            "allowed_cpus": _format_cpus(self._allowed),
+            "budgets": {engine: b.as_dict() for engine, b in self.budgets.items()},
+            "interop_threads": self.interop_threads,
+            "threads_per_job": total,
+            # job (process) ที่รันพร้อมกันได้โดยไม่แย่ง core กัน ถ้าไม่ได้ pin แยก
+            "jobs_per_host_hint": max(1, len(self._allowed) // total),
+            "torch": {"num_threads": torch.get_num_threads(), "interop_threads": torch.get_num_interop_threads()} if torch is not None else None,
+            "env": {name: os.environ[name] for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "AGENT_PLACEMENT") if name in os.environ},
+            "pinned_threads": pinned,
+        }
+
+
+_PLACEMENT: Placement | None = None
+_PLACEMENT_LOCK = threading.Lock()
+
+
+def get_placement() -> Placement:
+    # placement เดียวต่อ process อ่านจาก AGENT_PLACEMENT ครั้งแรกที่ถูกเรียก
+    global _PLACEMENT
+    with _PLACEMENT_LOCK:
+        if _PLACEMENT is None:
+            _PLACEMENT = Placement.from_env()
+        return _PLACEMENT
+
+
+if __name__ == "__main__":
+    print(json.dumps(get_placement().diagnostics(), indent=2))
@@ -0,0 +1,324 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+from livekit.agents import llm, APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr
+from prometheus_client import Counter, Histogram
+
+from llm_cache import edit_ratio, normalize_utterance
+
+logger = logging.getLogger("speculative_llm")
+
+# เริ่มถาม LLM ตั้งแต่ได้ final transcript (ระหว่างรอ endpointing delay) หรือ interim ถ้าเปิดไว้ (ระหว่างที่ผู้ใช้ยังพูด)
+# พอ turn จบจริงและ framework เรียก chat() ด้วย transcript สุดท้าย:
+#   ใกล้เคียงกับข้อความที่เดาไว้ (similarity >= threshold) -> ใช้คำตอบที่กำลัง stream อยู่ต่อเลย
+#   ต่างกัน -> ยกเลิกแล้วเริ่มใหม่ด้วย transcript สุดท้าย
+# preemptive_generation ของ AgentSession เริ่มจาก final transcript และต้องตรงกันทุกตัวอักษร
+# ชั้นนี้ยอม ASR ต่างกันเล็กน้อย และเริ่มจาก interim ได้ (max_per_turn > 0)
+#
+#   llm_ = SpeculativeLLM(inner)
+#   llm_.attach(session)        # ฟัง user_input_transcribed / user_state_changed ของ AgentSession
+
+# similarity = 1 - edit distance / ความยาว ของข้อความที่ normalize แล้ว (ดู llm_cache.normalize_utterance)
+# ตั้งสูงไว้เพราะคำที่ต่างกันตัวเดียวอาจความหมายตรงข้าม ("เปิดกี่โมง" / "ปิดกี่โมง" = 0.9)
+DEFAULT_THRESHOLD = float(os.getenv("AGENT_LLM_SPECULATION_THRESHOLD", "0.95"))
+# จำนวน speculation จาก interim transcript ต่อช่วงที่ผู้ใช้พูด 0 = รอ final transcript อย่างเดียว
+# interim ของคำถามยาวเปลี่ยนทุกรอบ decode แทบไม่เคยตรงกับ final (bench_speculation.py --max-per-turn 3:
+# ไม่มี interim hit เลย และ generation ที่ทิ้งกิน CPU ของ Ollama ~2.6 s ต่อ turn)
+DEFAULT_MAX_PER_TURN = int(os.getenv("AGENT_LLM_SPECULATION_MAX_PER_TURN", "0"))
+
+LLM_SPECULATION = Counter(
+    "agent_llm_speculation",
+    "Speculative LLM generations by outcome",
+    ["result"],
+)
+LLM_SPECULATION_SAVED = Histogram(
+    "agent_llm_speculation_saved_seconds",
+    "Time to first token saved by adopting a speculative generation",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0),
+)
+
+
+def similarity(a: str, b: str) -> float:
+    return 1.0 - edit_ratio(a, b)
+
+
+def _prefix_key(chat_ctx: llm.ChatContext) -> str:
+    # ประวัติสนทนาก่อนข้อความล่าสุดของผู้ใช้ ถ้าระหว่างนั้นมีข้อความใหม่ (เช่นคำตอบที่ถูกขัดจังหวะ)
+    # คำตอบที่เดาไว้ใช้ไม่ได้
+    parts = []
+    for item in chat_ctx.items[:-1]:
+        if item.type == "message":
+            parts.append(f"{item.role}:{item.text_content or ''}")
+        else:
+            parts.append(f"{item.type}:{item.id}")
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _last_user_text(chat_ctx: llm.ChatContext) -> str | None:
+    if not chat_ctx.items:
+        return None
+    last = chat_ctx.items[-1]
+    if last.type != "message" or last.role != "user":
+        return None
+    return last.text_content
+
+
+class _Speculation:
+    # generation หนึ่งครั้งที่เริ่มจาก interim transcript เก็บ chunk ทั้งหมดไว้ให้ stream ที่รับไปใช้เล่นต่อ
+    def __init__(self, inner: llm.LLM, chat_ctx: llm.ChatContext, *, utterance: str, prefix: str, reason: str):
+        self.utterance = utterance
+        self.prefix = prefix
+        self.reason = reason
+        self.started_at = time.perf_counter()
+        self.first_token_at: float | None = None
+        self.chunks: list[llm.ChatChunk] = []
+        self.error: BaseException | None = None
+        self.done = False
+        self._changed = asyncio.Event()
+        self._stream = inner.chat(chat_ctx=chat_ctx)
+        self._task = asyncio.create_task(self._run(), name="llm_speculation")
+
+    async def _run(self) -> None:
+        try:
+            async with self._stream as stream:
+                async for chunk in stream:
+                    if self.first_token_at is None and chunk.delta and chunk.delta.content:
+                        self.first_token_at = time.perf_counter()
+                    self.chunks.append(chunk)
+                    self._changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._changed.set()
+
+    def cancel(self) -> None:
+        if not self._task.done():
+            self._task.cancel()
+
+    async def follow(self):
+        # chunk ที่ได้มาแล้วทั้งหมด แล้วรอ chunk ใหม่จนจบ
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                break
+            self._changed.clear()
+            if i < len(self.chunks) or self.done:
+                continue
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class SpeculativeLLM(llm.LLM):
+    def __init__(self, inner: llm.LLM, *, threshold: float = DEFAULT_THRESHOLD, max_per_turn: int = DEFAULT_MAX_PER_TURN, min_chars: int = 2):
+        super().__init__()
+        self._inner = inner
+        self._threshold = threshold
+        self._max_per_turn = max_per_turn
+        self._min_chars = min_chars
+        self._session = None
+        self._active: _Speculation | None = None
+        self._turn_count = 0
+        self._finals: list[str] = []
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+        self._saved_ms: collections.deque[float] = collections.deque(maxlen=500)
+        self._head_start_ms: collections.deque[float] = collections.deque(maxlen=500)
+        self._wasted_ms = 0.0
+
+    @property
+    def model(self) -> str:
+        return self._inner.model
+
+    @property
+    def provider(self) -> str:
+        return self._inner.provider
+
+    def prewarm(self, *args, **kwargs) -> None:
+        self._inner.prewarm(*args, **kwargs)
+
+    async def aclose(self) -> None:
+        self._discard("cancelled")
+        await self._inner.aclose()
+
+    # --- ต่อกับ AgentSession ---
+
+    def attach(self, session) -> None:
+        self._session = session
+        session.on("user_input_transcribed", self._on_transcribed)
+        session.on("user_state_changed", self._on_user_state)
+        session.on("close", lambda _: self._discard("cancelled"))
+
+    def _on_transcribed(self, ev) -> None:
+        # final (ก่อน endpointing delay หมด) เริ่ม speculation เสมอ interim เฉพาะเมื่อ max_per_turn > 0
+        if not ev.is_final and self._max_per_turn <= 0:
+            return
+        agent = self._current_agent()
+        if agent is None or agent.tools:
+            return
+        # turn หนึ่งอาจมี final หลังท่อน (ผู้ใช้เว้นช่วง) framework ต่อทุกท่อนเป็นข้อความเดียว
+        text = " ".join([*self._finals, ev.transcript])
+        if ev.is_final:
+            self._finals.append(ev.transcript)
+        chat_ctx = agent.chat_ctx.copy()
+        chat_ctx.add_message(role="user", content=text)
+        # WindowedAgent ส่ง history ผ่าน ChatWindow ก่อนเรียก chat() ต้องเดาด้วย prompt เดียวกัน
+        # ไม่อย่างนั้น prefix ไม่ตรง (miss ทุก turn หลัง window เริ่มตัด) และ prompt เต็มเกิน budget / ทำ KV cache ของ Ollama หลุด
+        if (window := getattr(agent, "window", None)) is not None:
+            chat_ctx = window.apply(chat_ctx, record=False)
+        self.speculate(chat_ctx, reason="final" if ev.is_final else "interim")
+
+    def _on_user_state(self, ev) -> None:
+        # จำกัดจำนวน speculation ต่อช่วงที่ผู้ใช้พูด
+        if ev.new_state == "speaking":
+            self._turn_count = 0
+
+    def _current_agent(self):
+        try:
+            return self._session.current_agent if self._session is not None else None
+        except RuntimeError:
+            return None
+
+    # --- speculation ---
+
+    def speculate(self, chat_ctx: llm.ChatContext, *, reason: str = "interim") -> bool:
+        # chat_ctx = ประวัติสนทนา + ข้อความผู้ใช้ (interim) เป็น item สุดท้าย
+        text = _last_user_text(chat_ctx)
+        utterance = normalize_utterance(text) if text else ""
+        if len(utterance) < self._min_chars:
+            return False
+        prefix = _prefix_key(chat_ctx)
+        active = self._active
+        if active is not None and active.prefix == prefix and similarity(utterance, active.utterance) >= self._threshold:
+            # ที่เดาไว้ยังใช้ได้
+            return False
+        # final transcript คือข้อความที่ใกล้ของจริงที่สุด ไม่นับรวมในโควตา
+        if reason != "final" and self._turn_count >= self._max_per_turn:
+            return False
+        self._discard("superseded")
+        self._turn_count += 1
+        self._active = _Speculation(self._inner, chat_ctx, utterance=utterance, prefix=prefix, reason=reason)
+        self._count("started")
+        logger.debug(f"Speculating on {reason} transcript: {utterance!r}")
+        return True
+
+    def _discard(self, result: str) -> None:
+        active, self._active = self._active, None
+        if active is None:
+            return
+        active.cancel()
+        with self._lock:
+            self._wasted_ms += (time.perf_counter() - active.started_at) * 1000
+        self._count(result)
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            self._counts[result] += 1
+        LLM_SPECULATION.labels(result=result).inc()
+
+    def _adopt(self, chat_ctx: llm.ChatContext, tools: list[llm.Tool] | None) -> _Speculation | None:
+        text = _last_user_text(chat_ctx)
+        if text is None:
+            # request ที่ไม่ได้ตอบผู้ใช้ (หลัง tool call / generate_reply) ไม่เกี่ยวกับ speculation
+            return None
+        # turn ของผู้ใช้จบแล้ว
+        self._finals.clear()
+        with self._lock:
+            self._counts["turns"] += 1
+        active = self._active
+        if active is None:
+            return None
+        if tools:
+            self._discard("miss")
+            return None
+        utterance = normalize_utterance(text)
+        if active.error is not None or active.prefix != _prefix_key(chat_ctx) or similarity(utterance, active.utterance) < self._threshold:
+            logger.debug(f"Speculation miss: {active.utterance!r} -> {utterance!r}")
+            self._discard("miss")
+            return None
+
+        self._active = None
+        now = time.perf_counter()
+        head_start = now - active.started_at
+        # token แรกมาแล้ว: ประหยัด TTFT ทั้งหมด, ยังไม่มา: ประหยัดเท่าที่เริ่มก่อน
+        saved = min(head_start, active.first_token_at - active.started_at) if active.first_token_at is not None else head_start
+        with self._lock:
+            self._counts[f"hit_{active.reason}"] += 1
+            self._saved_ms.append(saved * 1000)
+            self._head_start_ms.append(head_start * 1000)
+        self._count("hit")
+        LLM_SPECULATION_SAVED.observe(saved)
+        logger.info(f"Speculation hit ({active.reason}): {utterance!r}, saved {saved * 1000:.0f} ms")
+        return active
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, superseded = self._counts["hit"], self._counts["miss"], self._counts["superseded"]
+            turns = self._counts["turns"]
+            saved = sorted(self._saved_ms)
+            # speculation ที่ถูกแทนที่ก่อน turn จบก็คือ generation ที่ทิ้งเหมือน miss
+            resolved = hits + misses + superseded
+            return {
+                "turns": turns,
+                "started": self._counts["started"],
+                "hits": hits,
+                "interim_hits": self._counts["hit_interim"],
+                "misses": misses,
+                "superseded": superseded,
+                "cancelled": self._counts["cancelled"],
+                "hit_ratio": round(hits / resolved, 4) if resolved else 0.0,
+                "saved_ms_mean": round(sum(saved) / len(saved), 1) if saved else 0.0,
+                "saved_ms_p50": round(saved[len(saved) // 2], 1) if saved else 0.0,
+                "head_start_ms_mean": round(sum(self._head_start_ms) / len(self._head_start_ms), 1) if self._head_start_ms else 0.0,
+                "wasted_ms": round(self._wasted_ms, 1),
+                "wasted_ms_per_turn": round(self._wasted_ms / turns, 1) if turns else 0.0,
+            }
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool] | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict[str, Any]] = NOT_GIVEN,
+    ) -> llm.LLMStream:
+        speculation = self._adopt(chat_ctx, tools)
+        if speculation is None:
+            return self._inner.chat(
+                chat_ctx=chat_ctx,
+                tools=tools,
+                conn_options=conn_options,
+                parallel_tool_calls=parallel_tool_calls,
+                tool_choice=tool_choice,
+                extra_kwargs=extra_kwargs,
+            )
+        return _AdoptedStream(self, chat_ctx=chat_ctx, conn_options=conn_options, speculation=speculation)
+
+
+class _AdoptedStream(llm.LLMStream):
+    def __init__(self, llm_: SpeculativeLLM, *, chat_ctx: llm.ChatContext, conn_options: APIConnectOptions, speculation: _Speculation):
+        # generation เริ่มไปแล้ว retry ไม่ได้ (LLM จริง retry ของมันเองก่อนส่ง token แรก)
+        super().__init__(llm_, chat_ctx=chat_ctx, tools=[], conn_options=APIConnectOptions(max_retry=0, timeout=conn_options.timeout))
+        self._speculation = speculation
+
+    async def _run(self) -> None:
+        try:
+            async for chunk in self._speculation.follow():
+                self._event_ch.send_nowait(chunk)
+        finally:
+            # ถูกขัดจังหวะ (ผู้ใช้พูดแทรก) ก่อนจบ: หยุด generation ด้วย
+            self._speculation.cancel()
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+
+import numpy as np
+from livekit.agents import stt
+
+from model_registry import shares_models_across_jobs
+from placement import get_placement
+from worker_load import record_rtf
+
+logger = logging.getLogger("stt_batcher")
+
+# หนึ่ง batcher ต่อหนึ่ง model (model ถูกแชร์ข้าม session ภายใน process)
+# batch ข้าม session ได้เมื่อ job รันเป็น thread (AGENT_JOB_EXECUTOR=thread) ถ้า job ละ process
+# batcher เห็นแค่ utterance ของ session เดียว (interim กับ final ที่ซ้อนกัน) ดู model_registry.py
+_BATCHERS: "weakref.WeakKeyDictionary[object, SenseVoiceBatcher]" = weakref.WeakKeyDictionary()
+_BATCHERS_LOCK = threading.Lock()
+
+
+def get_batcher(model, *, max_batch_size: int = 8, max_wait_ms: float = 10.0) -> "SenseVoiceBatcher":
+    with _BATCHERS_LOCK:
+        batcher = _BATCHERS.get(model)
+        if batcher is None:
+            batcher = SenseVoiceBatcher(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+            _BATCHERS[model] = batcher
+            if not shares_models_across_jobs():
+                logger.info("Jobs run in separate processes, SenseVoice batches only hold utterances of one session")
+        return batcher
+
+
+def active_batchers() -> list["SenseVoiceBatcher"]:
+    with _BATCHERS_LOCK:
+        return list(_BATCHERS.values())
+
+
+def empty_event() -> stt.SpeechEvent:
+    return stt.SpeechEvent(type=stt.SpeechEventType.FINAL_TRANSCRIPT, alternatives=[])
+
+
+class _Request:
+    __slots__ = ("audio", "language", "future", "loop", "enqueued_at")
+
+    def __init__(self, audio: np.ndarray, language: str, future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.audio = audio
+        self.language = language
+        self.future = future
+        self.loop = loop
+        self.enqueued_at = time.perf_counter()
+
+
+def _resolve(future: asyncio.Future, event: stt.SpeechEvent) -> None:
+    if not future.done():
+        future.set_result(event)
+
+
+def _deliver(req: _Request, event: stt.SpeechEvent) -> None:
+    try:
+        req.loop.call_soon_threadsafe(_resolve, req.future, event)
+    except RuntimeError:
+        # loop ของผู้เรียกปิดไปแล้ว
+        pass
+
+
+class SenseVoiceBatcher:
+    # รวม utterance จากหลาย session ที่จบพร้อมๆ กัน (ภายใน max_wait_ms) ให้เป็น batch เดียว
+    # แล้วเรียก model.generate ครั้งเดียวบน worker thread
+    def __init__(self, model, *, max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        self._model = model
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: queue.Queue[_Request | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._utterances = 0
+        self._batch_sizes: deque[int] = deque(maxlen=512)
+        self._queue_wait_s: deque[float] = deque(maxlen=512)
+
+    def configure(self, *, max_batch_size: int | None = None, max_wait_ms: float | None = None) -> None:
+        if max_batch_size is not None:
+            self._max_batch_size = max(1, max_batch_size)
+        if max_wait_ms is not None:
+            self._max_wait = max(0.0, max_wait_ms) / 1000.0
+
+    async def recognize(self, audio: np.ndarray, language: str) -> stt.SpeechEvent:
+        self._ensure_thread()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_Request(audio, language, future, loop))
+        return await future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = sorted(self._queue_wait_s)
+            stats = {
+                "name": "sensevoice",
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "utterances": self._utterances,
+            }
+        if sizes:
+            stats["batch_size_avg"] = sum(sizes) / len(sizes)
+        if waits:
+            stats["queue_wait_ms_avg"] = 1000.0 * sum(waits) / len(waits)
+            stats["queue_wait_ms_p95"] = 1000.0 * waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+        return stats
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+    def _ensure_thread(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="sensevoice-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self, first: _Request) -> list[_Request]:
+        batch = [first]
+        deadline = first.enqueued_at + self._max_wait
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # ส่ง sentinel กลับเข้าไปให้ loop หลักปิด thread หลังจบ batch นี้
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _worker(self) -> None:
+        get_placement().pin("stt")
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            started = time.perf_counter()
+
+            # FunASR รับ language เดียวต่อการเรียก แยกกลุ่มตามภาษา
+            groups: dict[str, list[_Request]] = {}
+            for req in batch:
+                if not req.future.cancelled():
+                    groups.setdefault(req.language, []).append(req)
+
+            for language, reqs in groups.items():
+                self._run_group(language, reqs)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._utterances += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._queue_wait_s.extend(started - req.enqueued_at for req in batch)
+
+    def _run_group(self, language: str, reqs: list[_Request]) -> None:
+        start = time.perf_counter()
+        try:
+            res = self._model.generate(
+                [req.audio for req in reqs],
+                language=language,
+                use_itn=False,
+                batch_size=len(reqs),
+                disable_pbar=True,
+            )
+        except Exception as e:
+            logger.error(f"SenseVoice generation error (batch of {len(reqs)}): {e}")
+            for req in reqs:
+                _deliver(req, empty_event())
+            return
+
+        record_rtf("stt", time.perf_counter() - start, sum(len(req.audio) for req in reqs) / 16000)
+
+        for i, req in enumerate(reqs):
+            event = empty_event()
+            if res and i < len(res) and 'text' in res[i]:
+                event = stt.SpeechEvent(
+                    type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                    alternatives=[stt.SpeechData(text=res[i]['text'], confidence=1.0, language=language)],
+                )
+            _deliver(req, event)
@@ -0,0 +1,277 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+
+from prometheus_client import Counter
+
+logger = logging.getLogger("tts_cache")
+
+# ไฟล์ใน disk tier: header (magic, ความยาว payload) ตามด้วยเสียง ใช้ตรวจไฟล์ที่เขียนไม่ครบ
+_MAGIC = b"TTSC"
+_HEADER = struct.Struct("<4sQ")
+_SPACES = re.compile(r"\s+")
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "AGENT_TTS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "livekit-demo", "tts")
+)
+# ไฟล์ .tmp ที่เก่ากว่านี้คือของ process ที่ตายระหว่างเขียน
+_STALE_TMP_S = 3600.0
+
+# hit ratio = hit / ทั้งหมด ของ agent_tts_cache_requests
+TTS_CACHE_REQUESTS = Counter(
+    "agent_tts_cache_requests",
+    "Phrase lookups in the TTS audio cache, by result",
+    ["result"],
+)
+TTS_CACHE_BYTES_SAVED = Counter(
+    "agent_tts_cache_bytes_saved",
+    "Audio bytes served from the TTS cache instead of being synthesized",
+)
+
+
+def normalize_text(text: str) -> str:
+    # ข้อความที่ต่างกันแค่ช่องว่าง/รูปแบบ unicode ให้เสียงเดียวกัน
+    return _SPACES.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(text: str, *, voice: str, model: str, sample_rate: int, mime_type: str = "audio/pcm") -> str:
+    raw = "\x1f".join([normalize_text(text), voice, model, str(sample_rate), mime_type])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    # cache เสียงที่สังเคราะห์แล้วระดับวลี (คำทักทาย, คำยืนยัน, ข้อความรอสาย ฯลฯ)
+    # สอง tier: LRU ใน memory (ต่อ process) และไฟล์บน disk (แชร์ทุก process ที่ใช้ dir เดียวกัน) จำกัดขนาดเป็น byte
+    # ผู้เรียกบน event loop ใช้ aget / aput: IO ของ disk tier รันบน thread ไม่ block loop
+    def __init__(self, cache_dir: str | None = DEFAULT_CACHE_DIR, *, memory_bytes: int = 32 * 2**20, disk_bytes: int = 512 * 2**20):
+        self._dir = cache_dir
+        self._memory_limit = memory_bytes
+        self._disk_limit = disk_bytes
+        self._lock = threading.Lock()
+
+        self._memory: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self._memory_bytes = 0
+        # ขนาดของ disk tier จากการ scan dir ครั้งล่าสุด (รวมไฟล์ที่ process อื่นเขียน)
+        self._disk_entries = 0
+        self._disk_bytes = 0
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+
+        if self._dir:
+            self._scan_disk()
+            logger.info(f"TTS cache: {self._disk_entries} entries ({self._disk_bytes / 2**20:.1f} MiB) on disk at {self._dir}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._dir, f"{key}.bin")
+
+    def _scan_disk(self) -> list[tuple[float, str, int]]:
+        # (mtime, ชื่อไฟล์, ขนาด) ของทุก entry ใน dir ลบ .tmp ที่ค้างจาก process ที่ตายไปแล้ว
+        entries = []
+        now = time.time()
+        try:
+            with os.scandir(self._dir) as it:
+                for e in it:
+                    try:
+                        if e.name.endswith(".bin"):
+                            st = e.stat()
+                            entries.append((st.st_mtime, e.name, st.st_size))
+                        elif e.name.endswith(".tmp") and now - e.stat().st_mtime > _STALE_TMP_S:
+                            os.remove(e.path)
+                    except FileNotFoundError:
+                        # process อื่นลบไประหว่าง scan
+                        continue
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not scan TTS cache dir {self._dir}: {e}")
+        with self._lock:
+            self._disk_entries = len(entries)
+            self._disk_bytes = sum(size for _, _, size in entries)
+        return entries
+
+    def get(self, key: str) -> bytes | None:
+        data = self._get_memory(key)
+        if data is None and self._dir:
+            data = self._get_disk(key)
+        elif data is None:
+            self._record_miss()
+        return data
+
+    async def aget(self, key: str) -> bytes | None:
+        # memory hit คืนทันที อ่าน disk บน thread
+        data = self._get_memory(key)
+        if data is None and self._dir:
+            data = await asyncio.to_thread(self._get_disk, key)
+        elif data is None:
+            self._record_miss()
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            self._put_memory(key, data)
+        if self._dir:
+            self._write_disk(key, data)
+
+    async def aput(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            self._put_memory(key, data)
+        if self._dir:
+            await asyncio.to_thread(self._write_disk, key, data)
+
+    def _get_memory(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is None:
+                return None
+            self._memory.move_to_end(key)
+            self._memory_hits += 1
+            self._bytes_saved += len(data)
+        TTS_CACHE_REQUESTS.labels(result="memory_hit").inc()
+        TTS_CACHE_BYTES_SAVED.inc(len(data))
+        return data
+
+    def _get_disk(self, key: str) -> bytes | None:
+        data = self._read_disk(key)
+        if data is None:
+            self._record_miss()
+            return None
+        with self._lock:
+            self._disk_hits += 1
+            self._bytes_saved += len(data)
+            self._put_memory(key, data)
+        TTS_CACHE_REQUESTS.labels(result="disk_hit").inc()
+        TTS_CACHE_BYTES_SAVED.inc(len(data))
+        return data
+
+    def _record_miss(self) -> None:
+        with self._lock:
+            self._misses += 1
+        TTS_CACHE_REQUESTS.labels(result="miss").inc()
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        # entry ที่ใหญ่เกิน 1/4 ของ memory tier เก็บเฉพาะบน disk
+        if len(data) > self._memory_limit // 4 or key in self._memory:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self._memory_limit:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+
+    def _read_disk(self, key: str) -> bytes | None:
+        # อ่านทั้งไฟล์ครั้งเดียว (เสียงต้องเป็น bytes สำหรับ AudioEmitter และ memory tier อยู่แล้ว)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                magic, length = _HEADER.unpack(header)
+                data = f.read()
+            if magic != _MAGIC or len(data) != length:
+                raise ValueError("corrupt cache entry")
+            # mtime = เวลาที่ใช้ล่าสุด ใช้เลือก entry ที่จะลบ
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Dropping TTS cache entry {path}: {e}")
+            self._remove_disk(key)
+            return None
+        return data
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        try:
+            if os.path.exists(path):
+                # process อื่นเขียนวลีเดียวกันไปแล้ว
+                os.utime(path)
+                return
+            os.makedirs(self._dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, len(data)))
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write TTS cache entry {path}: {e}")
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        # ขนาดจริงของ dir (ทุก process เขียนลงที่เดียวกัน) นับใหม่จากการ scan ภายใต้ flock แล้วลบไฟล์ที่ใช้ล่าสุดนานที่สุด
+        # เรียกหลังเขียนเท่านั้น ซึ่งเกิดหลัง cache miss ที่ต้องสังเคราะห์ทั้งวลี ต้นทุน scan จึงเล็กเมื่อเทียบ
+        import fcntl
+
+        try:
+            with open(os.path.join(self._dir, ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                entries = self._scan_disk()
+                total = sum(size for _, _, size in entries)
+                if total <= self._disk_limit:
+                    return
+                entries.sort()
+                removed = 0
+                # เก็บ entry ล่าสุดไว้เสมอแม้ใหญ่เกิน limit
+                for _, name, size in entries[:-1]:
+                    try:
+                        os.remove(os.path.join(self._dir, name))
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    removed += 1
+                    if total <= self._disk_limit:
+                        break
+                with self._lock:
+                    self._disk_entries = len(entries) - removed
+                    self._disk_bytes = total
+        except OSError as e:
+            logger.warning(f"Could not evict TTS cache entries in {self._dir}: {e}")
+
+    def _remove_disk(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                "hits": hits,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+                "bytes_saved": self._bytes_saved,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": self._disk_entries,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_DEFAULT: TTSCache | None = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    # cache เดียวต่อ process แชร์ระหว่าง EdgeTTS และ CosyVoiceTTS ทุก job
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = TTSCache()
+        return _DEFAULT
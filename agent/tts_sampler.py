@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+
+from prometheus_client import Counter
+
+logger = logging.getLogger("tts_sampler")
+
+# การสุ่ม speech token ของ LM ใน CosyVoice (TransformerLM.sampling_ids)
+#
+# ของเดิม: สุ่มด้วย self.sampling (ras_sampling = nucleus top-p/top-k + สุ่มจากทั้ง vocab เมื่อ token ซ้ำเกิน)
+# ถ้าได้ id >= speech_token_size (EOS / stop token) ก่อน min_len ก็สุ่มใหม่ สูงสุด 200 ครั้งต่อ token
+# ภาษาไทย / cross-lingual ที่ LM อยากจบเร็ว EOS กิน mass มาก loop นี้จึงวนหลายรอบ และ latency แกว่ง
+#
+# masked: คำนวณการกระจายของ ras_sampling ทั้งหมดครั้งเดียว (nucleus + ส่วนที่ตกไปสุ่มทั้ง vocab ตาม token ซ้ำ)
+# ตัด id ที่ห้ามออกแล้วสุ่มครั้งเดียว ได้การกระจายเดียวกับ loop เดิม (เงื่อนไขว่าไม่ใช่ EOS) โดยไม่ต้องลองซ้ำ
+# ถ้า mass ที่เหลือเป็นศูนย์ (loop เดิมจะครบ 200 รอบแล้วคืน EOS จนเสียงขาด) สุ่มจาก token ที่อนุญาตทั้งหมดแทน
+#
+# AGENT_TTS_SAMPLER=retry ใช้ loop เดิม
+DEFAULT_SAMPLER = os.getenv("AGENT_TTS_SAMPLER", "masked")
+MAX_TRIALS = 200
+
+TTS_SAMPLER_STEPS = Counter(
+    "agent_tts_sampler_steps",
+    "Speech tokens sampled by the CosyVoice LM, by sampling path",
+    ["path"],
+)
+TTS_SAMPLER_AVOIDED_RETRIES = Counter(
+    "agent_tts_sampler_avoided_retries",
+    "Expected re-draws the EOS-rejection loop would have made",
+)
+
+_stats_lock = threading.Lock()
+_stats = {"steps": 0, "eos_steps": 0, "avoided_retries": 0.0, "exhausted": 0, "retries": 0}
+_local = threading.local()
+
+
+def sampler_stats() -> dict:
+    # eos_steps: token ที่ loop เดิมมีโอกาสต้องสุ่มใหม่, avoided_retries: จำนวนรอบที่คาดว่าจะสุ่มใหม่
+    # exhausted: token ที่ loop เดิมจะครบ MAX_TRIALS, retries: รอบที่สุ่มใหม่จริง (AGENT_TTS_SAMPLER=retry)
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avoided_retries"] = round(stats["avoided_retries"], 2)
+    return stats
+
+
+def _record(path: str, eos_mass: float | None) -> None:
+    TTS_SAMPLER_STEPS.labels(path=path).inc()
+    with _stats_lock:
+        _stats["steps"] += 1
+        if eos_mass is None or eos_mass <= 1e-6:
+            return
+        _stats["eos_steps"] += 1
+        # จำนวนครั้งที่สุ่มได้ EOS ก่อนได้ token ที่ใช้ได้ (geometric)
+        retries = MAX_TRIALS if eos_mass >= 1 else min(MAX_TRIALS, eos_mass / (1 - eos_mass))
+        _stats["avoided_retries"] += retries
+        if eos_mass >= 1:
+            _stats["exhausted"] += 1
+    TTS_SAMPLER_AVOIDED_RETRIES.inc(retries)
+
+
+class RasSampler:
+    # ras_sampling(top_p, top_k, win_size, tau_r) ของ CosyVoice แบบ vectorized พร้อมตัด id ที่ห้าม
+    def __init__(self, speech_token_size: int, *, top_p: float = 0.8, top_k: int = 25, win_size: int = 10, tau_r: float = 0.1):
+        self.speech_token_size = speech_token_size
+        self.top_p = top_p
+        self.top_k = top_k
+        self.win_size = win_size
+        self.tau_r = tau_r
+
+    def _buffers(self, scores):
+        # buffer ต่อ thread (llm_job ของแต่ละวลีรันบน thread ของตัวเอง) สร้างใหม่เมื่อ vocab / dtype เปลี่ยน
+        import torch
+
+        key = (id(self), scores.shape[0], scores.dtype, scores.device)
+        buffers = getattr(_local, "buffers", None)
+        if buffers is None or buffers[0] != key:
+            k = min(self.top_k, scores.shape[0])
+            buffers = _local.buffers = (
+                key,
+                torch.empty_like(scores),
+                torch.empty_like(scores),
+                torch.empty(k, dtype=scores.dtype, device=scores.device),
+                torch.empty(k, dtype=torch.long, device=scores.device),
+            )
+        return buffers[1:]
+
+    def sample(self, weighted_scores, decoded_tokens: list, ignore_eos: bool):
+        # คืน tensor ใหม่ shape [1] (LM เก็บ token ไว้ใน out_tokens ห้ามคืน buffer)
+        import torch
+
+        probs, dist, vals, idx = self._buffers(weighted_scores)
+        torch.softmax(weighted_scores, dim=0, out=probs)
+        torch.topk(probs, vals.shape[0], out=(vals, idx))
+        # nucleus ของ CosyVoice: เอา token ตามลำดับจนผลรวมก่อนหน้าถึง top_p (อย่างน้อยหนึ่งตัว)
+        n = max(1, int(((vals.cumsum(0) - vals) < self.top_p).sum()))
+        cand = idx[:n]
+        p_nuc = vals[:n] / vals[:n].sum()
+
+        # ถ้าสุ่มได้ token ที่ซ้ำใน win_size ตัวล่าสุดเกิน win_size * tau_r ครั้ง ras สุ่มใหม่จากทั้ง vocab
+        window = decoded_tokens[-self.win_size:]
+        if window:
+            recent = torch.as_tensor([int(t) for t in window], device=cand.device)
+            repeated = (cand.unsqueeze(1) == recent.unsqueeze(0)).sum(1) >= self.win_size * self.tau_r
+            fallback = float(p_nuc[repeated].sum())
+            p_nuc = p_nuc.masked_fill(repeated, 0.0)
+        else:
+            fallback = 0.0
+
+        if fallback <= 0.0:
+            # ทางหลัก: สุ่มจาก candidate ไม่เกิน top_k ตัว
+            if ignore_eos:
+                p_nuc = p_nuc.masked_fill(cand >= self.speech_token_size, 0.0)
+            allowed = float(p_nuc.sum())
+            if allowed > 0.0:
+                _record("nucleus", 1.0 - allowed if ignore_eos else None)
+                return cand[torch.multinomial(p_nuc, 1)]
+        else:
+            torch.mul(probs, fallback, out=dist)
+            dist.index_add_(0, cand, p_nuc)
+            eos_mass = None
+            if ignore_eos:
+                eos_mass = float(dist[self.speech_token_size:].sum())
+                dist[self.speech_token_size:] = 0.0
+            if eos_mass is None or eos_mass < 1.0 - 1e-6:
+                _record("mixed", eos_mass)
+                return torch.multinomial(dist, 1)
+
+        # ไม่เหลือ mass บน token ที่อนุญาต: loop เดิมจะครบ MAX_TRIALS แล้วคืน EOS
+        _record("exhausted", 1.0)
+        dist.copy_(probs)
+        dist[self.speech_token_size:] = 0.0
+        if float(dist.sum()) <= 0.0:
+            return weighted_scores[:self.speech_token_size].argmax().reshape(1)
+        return torch.multinomial(dist, 1)
+
+
+def _sampler_for(lm):
+    # สร้างจาก self.sampling ของ LM (functools.partial ของ ras_sampling จาก yaml) ครั้งเดียวต่อ LM
+    sampler = lm.__dict__.get("_agent_sampler")
+    if sampler is None:
+        func = getattr(lm.sampling, "func", lm.sampling)
+        if getattr(func, "__name__", "") == "ras_sampling":
+            options = {k: v for k, v in getattr(lm.sampling, "keywords", {}).items() if k in ("top_p", "top_k", "win_size", "tau_r")}
+            sampler = RasSampler(lm.speech_token_size, **options)
+        else:
+            logger.warning(f"Unknown LM sampling function {func!r}, masking EOS in the scores instead")
+            sampler = False
+        lm.__dict__["_agent_sampler"] = sampler
+    return sampler
+
+
+def masked_sampling_ids(self, weighted_scores, decoded_tokens, sampling, ignore_eos=True):
+    # แทน TransformerLM.sampling_ids
+    sampler = _sampler_for(self)
+    if sampler:
+        return sampler.sample(weighted_scores, decoded_tokens, ignore_eos)
+    if ignore_eos:
+        # sampler ที่ไม่รู้จัก: ให้ id ที่ห้ามมี score -inf แล้วสุ่มครั้งเดียว
+        weighted_scores = weighted_scores.clone()
+        weighted_scores[self.speech_token_size:] = float("-inf")
+    _record("generic", None)
+    return self.sampling(weighted_scores, decoded_tokens, sampling)
+
+
+def retry_sampling_ids(self, weighted_scores, decoded_tokens, sampling, ignore_eos=True):
+    # loop เดิม: สุ่มใหม่จนไม่ได้ EOS ครบ MAX_TRIALS แล้วคืน token ล่าสุดแทนการ crash
+    num_trials = 0
+    while True:
+        top_ids = self.sampling(weighted_scores, decoded_tokens, sampling)
+        if (not ignore_eos) or (top_ids < self.speech_token_size):
+            break
+        num_trials += 1
+        if num_trials > MAX_TRIALS:
+            break
+    TTS_SAMPLER_STEPS.labels(path="retry").inc()
+    with _stats_lock:
+        _stats["steps"] += 1
+        _stats["retries"] += num_trials
+        if num_trials:
+            _stats["eos_steps"] += 1
+        if num_trials > MAX_TRIALS:
+            _stats["exhausted"] += 1
+    return top_ids
+
+
+def sampling_ids_for(name: str = DEFAULT_SAMPLER):
+    if name == "retry":
+        return retry_sampling_ids
+    if name != "masked":
+        logger.warning(f"Unknown AGENT_TTS_SAMPLER {name!r}, using masked")
+    return masked_sampling_ids
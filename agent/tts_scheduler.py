@@ -0,0 +1,259 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+from model_registry import shares_models_across_jobs
+from placement import get_placement
+
+logger = logging.getLogger("tts_scheduler")
+
+# ลำดับการใช้ CPU ของ CosyVoice ข้ามทุก session ที่แชร์ model เดียวกัน
+#
+# แต่ละวลีของ CosyVoice มีสองส่วนที่กิน CPU: LM (llm_job บน thread ของมันเอง decode ทีละ speech token)
+# และ token2wav (flow + vocoder ทุก token_hop_len token บน inference thread ของ session)
+# ถ้าปล่อยไว้ N สายพร้อมกันคือ 2N thread แย่ง core เดียวกัน และทุกสายได้เสียงแรกช้าพอๆ กัน
+# scheduler ให้ทีละ step (LM หนึ่ง token / token2wav หนึ่ง chunk) ได้ slot ตามลำดับ:
+#   1. สายที่เลย deadline แล้ว deadline เก่าสุดก่อน: สายที่ได้เสียงแล้ว = เสียงที่ส่งไปจะเล่นหมด (- guard_s)
+#      สายที่ยังไม่ได้เสียงแรก = เริ่ม + first_chunk_s (ตอนงานล้น ทุกสายยังได้ตามลำดับ ไม่มีสายไหนรอเสียงแรกไม่จบ)
+#   2. สายที่ยังไม่ได้เสียงแรก มาก่อนได้ก่อน
+#   3. ที่เหลือวนตามลำดับ (สายที่ได้ slot นานที่สุดแล้วได้ก่อน)
+# step ที่ค้างรอ LM token (CosyVoice poll ทุก 0.1 s) ไม่ถือ slot ไว้
+#
+# ไม่รวม step ข้ามสายเป็น batch: flow ของ CosyVoice รับ batch 1 และเก็บ cache ของ vocoder / LM ต่อ uuid
+#
+# จำนวน slot (step ที่รันพร้อมกันได้) ตั้งด้วย AGENT_TTS_SCHEDULER_SLOTS ถ้าไม่ตั้ง:
+#   job แบบ thread: core ของ TTS / thread ต่อ step (ดู placement.py) step ไม่แย่ง core กันเกินที่มี
+#     และบนเครื่องหลาย core LM กับ token2wav ของสายเดียวยังรันซ้อนกันได้ (slot เดียวทำให้ต้องรอกัน)
+#   job แบบ process: 0 (ปิด) process ละหนึ่งสาย ไม่มีสายอื่นให้จัดลำดับ
+SLOTS_ENV = os.getenv("AGENT_TTS_SCHEDULER_SLOTS")
+
+# หนึ่ง scheduler ต่อหนึ่ง model
+_SCHEDULERS: "weakref.WeakKeyDictionary[object, TTSScheduler]" = weakref.WeakKeyDictionary()
+_SCHEDULERS_LOCK = threading.Lock()
+_local = threading.local()
+
+
+def placement_slots() -> int:
+    placement = get_placement()
+    return max(1, len(placement.cpus("tts")) // placement.threads("tts"))
+
+
+def default_slots() -> int:
+    if SLOTS_ENV:
+        return int(SLOTS_ENV)
+    return placement_slots() if shares_models_across_jobs() else 0
+
+
+def get_scheduler(model, *, slots: int | None = None) -> "TTSScheduler | None":
+    # slots = 0 ปิด scheduler (ทุก session รัน step ได้พร้อมกันเหมือนเดิม)
+    if slots is None:
+        slots = default_slots()
+    if slots <= 0:
+        return None
+    with _SCHEDULERS_LOCK:
+        scheduler = _SCHEDULERS.get(model)
+        if scheduler is None:
+            scheduler = TTSScheduler(slots=slots, sample_rate=getattr(model, "sample_rate", 24000))
+            if not scheduler.install(model):
+                return None
+            _SCHEDULERS[model] = scheduler
+        return scheduler
+
+
+def active_schedulers() -> list["TTSScheduler"]:
+    with _SCHEDULERS_LOCK:
+        return list(_SCHEDULERS.values())
+
+
+def _arg(args: tuple, kwargs: dict, name: str, index: int):
+    if name in kwargs:
+        return kwargs[name]
+    return args[index] if len(args) > index else None
+
+
+class _Stream:
+    # หนึ่งวลีของ CosyVoice (uuid ของ model.tts)
+    __slots__ = ("created_at", "first_audio_at", "audio_s", "last_served", "last_seen")
+
+    def __init__(self, now: float):
+        self.created_at = now
+        self.first_audio_at: float | None = None
+        self.audio_s = 0.0
+        self.last_served = 0.0
+        self.last_seen = now
+
+
+class TTSScheduler:
+    def __init__(self, *, slots: int = 1, sample_rate: int = 24000, guard_s: float = 0.3, first_chunk_s: float = 2.0, idle_s: float = 60.0):
+        self._slots = max(1, slots)
+        self._sample_rate = sample_rate
+        self._guard_s = guard_s
+        self._first_chunk_s = first_chunk_s
+        # วลีที่ถูกยกเลิกกลางทางไม่มี token2wav finalize ลบทิ้งเมื่อไม่มี step นานเกิน idle_s
+        self._idle_s = idle_s
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting: list[tuple[_Stream, object]] = []
+        self._streams: dict[str | None, _Stream] = {}
+        self._steps = {"llm": 0, "token2wav": 0}
+        self._busy_s = {"llm": 0.0, "token2wav": 0.0}
+        self._wait_s: dict[str, deque[float]] = {"llm": deque(maxlen=2048), "token2wav": deque(maxlen=512)}
+        self._first_chunk_latency: deque[float] = deque(maxlen=512)
+        self._streams_total = 0
+
+    def install(self, model) -> bool:
+        # ห่อ llm_job, llm.inference และ token2wav ของ model (CosyVoice2/3) ให้ขอ slot ทีละ step
+        inner = getattr(model, "model", None)
+        if inner is None or not all(hasattr(inner, name) for name in ("llm_job", "token2wav", "llm")):
+            logger.warning(f"{type(model).__name__} has no llm_job/token2wav, TTS scheduler disabled")
+            return False
+        scheduler = self
+        llm_job, token2wav, inference = inner.llm_job, inner.token2wav, inner.llm.inference
+
+        def scheduled_llm_job(*args, **kwargs):
+            # llm_job(text, prompt_text, llm_prompt_speech_token, llm_embedding, uuid) รันบน thread ใหม่ต่อวลี
+            _local.uuid = _arg(args, kwargs, "uuid", 4)
+            try:
+                return llm_job(*args, **kwargs)
+            finally:
+                _local.uuid = None
+
+        def scheduled_inference(*args, **kwargs):
+            key = getattr(_local, "uuid", None)
+            tokens = inference(*args, **kwargs)
+            try:
+                while True:
+                    # prefill อยู่ใน step แรก
+                    with scheduler.slot(key, "llm"):
+                        try:
+                            token = next(tokens)
+                        except StopIteration:
+                            return
+                    yield token
+            finally:
+                tokens.close()
+
+        def scheduled_token2wav(*args, **kwargs):
+            key = _arg(args, kwargs, "uuid", 5)
+            with scheduler.slot(key, "token2wav"):
+                speech = token2wav(*args, **kwargs)
+            scheduler._on_audio(key, speech.shape[-1] / scheduler._sample_rate, bool(_arg(args, kwargs, "finalize", 7)))
+            return speech
+
+        inner.llm_job = scheduled_llm_job
+        inner.llm.inference = scheduled_inference
+        inner.token2wav = scheduled_token2wav
+        logger.info(f"TTS scheduler installed on {type(model).__name__} ({self._slots} slot(s))")
+        return True
+
+    def slot(self, key: str | None, stage: str) -> "_Slot":
+        return _Slot(self, key, stage)
+
+    def _priority(self, stream: _Stream, now: float) -> tuple:
+        if stream.first_audio_at is None:
+            deadline = stream.created_at + self._first_chunk_s
+        else:
+            deadline = stream.first_audio_at + stream.audio_s - self._guard_s
+        if deadline <= now:
+            return (0, deadline)
+        if stream.first_audio_at is None:
+            return (1, stream.created_at)
+        return (2, stream.last_served)
+
+    def _acquire(self, key: str | None, stage: str) -> float:
+        start = time.perf_counter()
+        with self._cond:
+            stream = self._streams.get(key)
+            if stream is None:
+                self._purge(start)
+                stream = self._streams[key] = _Stream(start)
+                self._streams_total += 1
+            stream.last_seen = start
+            # object() ให้ entry ไม่เท่ากับของ step อื่นในวลีเดียวกัน (LM กับ token2wav รอพร้อมกันได้)
+            entry = (stream, object())
+            self._waiting.append(entry)
+            while True:
+                if self._active < self._slots:
+                    now = time.perf_counter()
+                    best = min(self._waiting, key=lambda w: self._priority(w[0], now))
+                    if best is entry:
+                        break
+                self._cond.wait()
+            self._waiting.remove(entry)
+            self._active += 1
+            granted = time.perf_counter()
+            stream.last_served = granted
+            self._wait_s[stage].append(granted - start)
+            if self._active < self._slots and self._waiting:
+                self._cond.notify_all()
+        return granted
+
+    def _release(self, stage: str, granted: float) -> None:
+        with self._cond:
+            self._active -= 1
+            self._steps[stage] += 1
+            self._busy_s[stage] += time.perf_counter() - granted
+            self._cond.notify_all()
+
+    def _on_audio(self, key: str | None, seconds: float, finalize: bool) -> None:
+        now = time.perf_counter()
+        with self._cond:
+            stream = self._streams.get(key)
+            if stream is None:
+                return
+            if stream.first_audio_at is None and seconds > 0:
+                stream.first_audio_at = now
+                self._first_chunk_latency.append(now - stream.created_at)
+            stream.audio_s += seconds
+            if finalize:
+                del self._streams[key]
+
+    def _purge(self, now: float) -> None:
+        for key in [k for k, s in self._streams.items() if now - s.last_seen > self._idle_s]:
+            del self._streams[key]
+
+    def queue_depth(self) -> int:
+        # step ที่รอ slot อยู่
+        with self._cond:
+            return len(self._waiting)
+
+    def stats(self) -> dict:
+        with self._cond:
+            first = sorted(self._first_chunk_latency)
+            stats = {
+                "name": "cosyvoice",
+                "slots": self._slots,
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "streams": len(self._streams),
+                "streams_total": self._streams_total,
+                "steps": dict(self._steps),
+                "busy_s": {k: round(v, 3) for k, v in self._busy_s.items()},
+            }
+            for stage, waits in self._wait_s.items():
+                if waits:
+                    waits = sorted(waits)
+                    stats[f"{stage}_wait_ms_avg"] = 1000.0 * sum(waits) / len(waits)
+                    stats[f"{stage}_wait_ms_p95"] = 1000.0 * waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+        if first:
+            stats["first_chunk_ms_avg"] = 1000.0 * sum(first) / len(first)
+            stats["first_chunk_ms_p95"] = 1000.0 * first[min(len(first) - 1, int(len(first) * 0.95))]
+        return stats
+
+
+class _Slot:
+    def __init__(self, scheduler: TTSScheduler, key: str | None, stage: str):
+        self._scheduler = scheduler
+        self._key = key
+        self._stage = stage
+        self._granted = 0.0
+
+    def __enter__(self) -> "_Slot":
+        self._granted = self._scheduler._acquire(self._key, self._stage)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._scheduler._release(self._stage, self._granted)
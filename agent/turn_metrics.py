@@ -0,0 +1,141 @@
+import json
+import logging
+import time
+from collections import deque
+
+from livekit.agents import metrics
+from livekit.agents.voice import AgentSession
+from prometheus_client import Histogram
+
+logger = logging.getLogger("turn_metrics")
+
+# เวลาจากผู้ใช้พูดจบ (end of speech) ถึงแต่ละจุดของ turn
+STAGES = ("transcript", "llm_first_token", "tts_first_audio", "playout_start")
+
+TURN_LATENCY = Histogram(
+    "agent_turn_latency_seconds",
+    "Time from end of user speech to each stage of the agent's reply",
+    ["stage", "room", "participant"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+
+
+class _Turn:
+    def __init__(self, end_of_speech: float):
+        self.end_of_speech = end_of_speech
+        self.at: dict[str, float] = {}
+        self.transcript_chars = 0
+        self.eou_delay: float | None = None
+        self.transcription_delay: float | None = None
+
+    def mark(self, stage: str, ts: float) -> None:
+        # เก็บครั้งแรกของแต่ละ stage ที่เกิดหลัง end of speech เท่านั้น
+        if ts >= self.end_of_speech and (stage not in self.at or ts < self.at[stage]):
+            self.at[stage] = ts
+
+    @property
+    def complete(self) -> bool:
+        return all(stage in self.at for stage in STAGES)
+
+
+class TurnMetrics:
+    # ฟัง event ของ AgentSession แล้วแยกเวลาในแต่ละ turn: end of speech -> transcript -> token แรกจาก LLM
+    # -> byte แรกจาก TTS -> เริ่มเล่นเสียง ส่งออกเป็น histogram (Prometheus) และ record JSON ต่อ turn
+    def __init__(self, session: AgentSession, *, room: str, participant: str, record_path: str | None = None):
+        self._labels = {"room": room, "participant": participant}
+        self._record_path = record_path
+        self._turn: _Turn | None = None
+        self._index = 0
+        self.records: deque[dict] = deque(maxlen=200)
+
+        session.on("user_state_changed", self._on_user_state)
+        session.on("user_input_transcribed", self._on_transcribed)
+        session.on("agent_state_changed", self._on_agent_state)
+        session.on("metrics_collected", self._on_metrics)
+        session.on("close", lambda _: self._finish())
+
+    def _on_user_state(self, ev) -> None:
+        if ev.new_state == "speaking":
+            # ผู้ใช้เริ่มพูดใหม่ turn ก่อนหน้า (ถ้ายังค้าง) จบแค่นั้น
+            self._finish()
+        elif ev.old_state == "speaking":
+            self._finish()
+            self._turn = _Turn(ev.created_at)
+
+    def _on_transcribed(self, ev) -> None:
+        if self._turn and ev.is_final:
+            self._turn.mark("transcript", ev.created_at)
+            self._turn.transcript_chars += len(ev.transcript)
+
+    def _on_agent_state(self, ev) -> None:
+        if self._turn and ev.new_state == "speaking":
+            self._turn.mark("playout_start", ev.created_at)
+            self._maybe_finish()
+
+    def _on_metrics(self, ev) -> None:
+        turn = self._turn
+        m = ev.metrics
+        if turn is None:
+            return
+        # metrics ถูกส่งตอน request จบ: timestamp - duration คือเวลาเริ่ม request
+        if isinstance(m, metrics.LLMMetrics) and m.ttft >= 0:
+            turn.mark("llm_first_token", m.timestamp - m.duration + m.ttft)
+        elif isinstance(m, metrics.TTSMetrics) and m.ttfb >= 0:
+            turn.mark("tts_first_audio", m.timestamp - m.duration + m.ttfb)
+        elif isinstance(m, metrics.EOUMetrics):
+            turn.eou_delay = m.end_of_utterance_delay
+            turn.transcription_delay = m.transcription_delay
+        self._maybe_finish()
+
+    def _maybe_finish(self) -> None:
+        if self._turn and self._turn.complete:
+            self._finish()
+
+    def _finish(self) -> None:
+        turn, self._turn = self._turn, None
+        if turn is None or not turn.at:
+            return
+        self._index += 1
+
+        stages = {}
+        for stage in STAGES:
+            if stage in turn.at:
+                latency = turn.at[stage] - turn.end_of_speech
+                stages[stage] = round(latency * 1000, 1)
+                TURN_LATENCY.labels(stage=stage, **self._labels).observe(latency)
+            else:
+                stages[stage] = None
+
+        record = {
+            "turn": self._index,
+            **self._labels,
+            "end_of_speech": round(turn.end_of_speech, 3),
+            "complete": turn.complete,
+            "latency_ms": stages,
+            # เวลาของแต่ละส่วน (ส่วนต่างระหว่าง stage ที่ติดกัน)
+            "breakdown_ms": {
+                "stt": stages["transcript"],
+                "llm": _delta(stages, "transcript", "llm_first_token"),
+                "tts": _delta(stages, "llm_first_token", "tts_first_audio"),
+                "playout": _delta(stages, "tts_first_audio", "playout_start"),
+            },
+            "eou_delay_ms": round(turn.eou_delay * 1000, 1) if turn.eou_delay is not None else None,
+            "transcription_delay_ms": round(turn.transcription_delay * 1000, 1) if turn.transcription_delay is not None else None,
+            "transcript_chars": turn.transcript_chars,
+            "logged_at": round(time.time(), 3),
+        }
+        self.records.append(record)
+        line = json.dumps(record, ensure_ascii=False)
+        logger.info(f"turn latency: {line}")
+        if self._record_path:
+            try:
+                with open(self._record_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write turn record to {self._record_path}: {e}")
+
+
+def _delta(stages: dict, start: str, end: str) -> float | None:
+    if stages[start] is None or stages[end] is None:
+        return None
+    return round(stages[end] - stages[start], 1)
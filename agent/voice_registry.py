@@ -0,0 +1,248 @@
+# เสียง (zero-shot speaker) ของ CosyVoiceTTS: extract prompt feature จาก wav อ้างอิงครั้งเดียวตอน ingest
+# แล้วเก็บ tensor (speech token, speaker embedding, mel) ไว้ใน store บน disk ข้าง model
+#
+#   <model_dir>/voices/index.json   ชื่อเสียง -> offset / dtype / shape ของแต่ละ tensor
+#   <model_dir>/voices/voices.bin   tensor ทุกเสียงต่อกัน (align 64 byte)
+#
+# voices.bin ถูก mmap (copy-on-write) ทั้งไฟล์ tensor ของเสียงเป็น view ลงบน mmap ไม่ copy
+# page ของเสียงที่ไม่ถูกใช้จึงไม่ถูกอ่านเข้า memory การเปลี่ยนเสียงต่อ session เป็นแค่การเลือก spk_id
+#
+#   python voice_registry.py list
+#   python voice_registry.py ingest somchai voices/somchai.wav     # หรือวาง wav ไว้ใน voices/ แล้วใช้ชื่อไฟล์
+import json
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger("voice_registry")
+
+VOICES_DIRNAME = "voices"
+INDEX_NAME = "index.json"
+DATA_NAME = "voices.bin"
+FORMAT_VERSION = 1
+_ALIGN = 64
+
+# wav อ้างอิงที่ ingest อัตโนมัติเมื่อถูกขอครั้งแรก: <project>/voices/<ชื่อ>.wav
+DEFAULT_SOURCE_DIR = os.getenv("AGENT_VOICES_DIR")
+
+
+class VoiceNotFound(KeyError):
+    pass
+
+
+class Voice:
+    def __init__(self, name: str, spk_id: str, spk_info: dict, source: str | None):
+        self.name = name
+        self.spk_id = spk_id
+        self.spk_info = spk_info
+        self.source = source
+
+
+def _dtype(name: str):
+    import torch
+
+    return getattr(torch, name.removeprefix("torch."))
+
+
+class VoiceStore:
+    # หนึ่ง store ต่อ model dir อ่านได้หลาย process พร้อมกัน เขียนผ่าน flock
+    def __init__(self, root: str, model_version: str):
+        self.root = root
+        self.model_version = model_version
+        self._index_path = os.path.join(root, INDEX_NAME)
+        self._data_path = os.path.join(root, DATA_NAME)
+        self._lock = threading.Lock()
+        self._index: dict = {"format": FORMAT_VERSION, "voices": {}}
+        self._index_mtime = None
+        self._mm: mmap.mmap | None = None
+        self._loaded: dict[str, Voice] = {}
+        self._reload_index()
+
+    def _reload_index(self) -> None:
+        try:
+            mtime = os.stat(self._index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._index_mtime:
+            return
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read voice index {self._index_path}: {e}")
+            return
+        if index.get("format") != FORMAT_VERSION:
+            logger.warning(f"Voice index {self._index_path} has format {index.get('format')}, expected {FORMAT_VERSION}; ignoring it")
+            return
+        self._index = index
+        self._index_mtime = mtime
+
+    def names(self) -> list[str]:
+        with self._lock:
+            self._reload_index()
+            return sorted(name for name, entry in self._index["voices"].items() if entry["model_version"] == self.model_version)
+
+    def entry(self, name: str) -> dict | None:
+        with self._lock:
+            self._reload_index()
+            entry = self._index["voices"].get(name)
+            return entry if entry and entry["model_version"] == self.model_version else None
+
+    def _map(self, end: int) -> mmap.mmap:
+        # ไฟล์โตขึ้นเมื่อ process อื่น ingest เพิ่ม map ใหม่ให้ครอบคลุม
+        if self._mm is None or len(self._mm) < end:
+            with open(self._data_path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        return self._mm
+
+    def get(self, name: str) -> Voice:
+        import torch
+
+        with self._lock:
+            # index ถูกแทนเมื่อ process อื่น ingest (stat ไฟล์เดียว) เสียงที่ map ไว้แล้วใช้ต่อถ้ายังเป็นชุดเดิม
+            self._reload_index()
+            entry = self._index["voices"].get(name)
+            if entry is None or entry["model_version"] != self.model_version:
+                raise VoiceNotFound(name)
+            voice = self._loaded.get(name)
+            if voice is not None and voice.spk_id == entry["spk_id"]:
+                return voice
+            mm = self._map(entry["offset"] + entry["nbytes"])
+            spk_info = dict(entry["values"])
+            for key, (dtype, shape, offset) in entry["tensors"].items():
+                dtype = _dtype(dtype)
+                count = 1
+                for dim in shape:
+                    count *= dim
+                tensor = torch.frombuffer(mm, dtype=dtype, count=count, offset=entry["offset"] + offset) if count else torch.empty(0, dtype=dtype)
+                spk_info[key] = tensor.view(shape)
+            voice = Voice(name, entry["spk_id"], spk_info, entry.get("source"))
+            self._loaded[name] = voice
+            return voice
+
+    def put(self, name: str, spk_info: dict, *, spk_id: str, source: str | None = None, source_sha256: str | None = None) -> Voice:
+        # เขียน tensor ต่อท้าย voices.bin แล้วแทน index ทั้งไฟล์ (atomic) ข้อมูลเดิมของชื่อเดียวกันกลายเป็นที่ว่าง
+        import fcntl
+
+        import torch
+
+        tensors, values = {}, {}
+        for key, value in spk_info.items():
+            if isinstance(value, torch.Tensor):
+                tensors[key] = value.detach().cpu().contiguous()
+            else:
+                values[key] = value
+
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._index_mtime = None
+            self._reload_index()
+            with open(self._data_path, "ab") as f:
+                start = f.seek(0, os.SEEK_END)
+                pad = -start % _ALIGN
+                f.write(b"\0" * pad)
+                offset, layout = start + pad, {}
+                pos = 0
+                for key, tensor in tensors.items():
+                    pad = -pos % _ALIGN
+                    f.write(b"\0" * pad)
+                    pos += pad
+                    data = tensor.numpy().tobytes() if tensor.dtype != torch.bfloat16 else tensor.view(torch.int16).numpy().tobytes()
+                    f.write(data)
+                    layout[key] = [str(tensor.dtype), list(tensor.shape), pos]
+                    pos += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._index["voices"][name] = {
+                "model_version": self.model_version,
+                "spk_id": spk_id,
+                "source": source,
+                "source_sha256": source_sha256,
+                "created_at": time.time(),
+                "offset": offset,
+                "nbytes": pos,
+                "tensors": layout,
+                "values": values,
+            }
+            tmp_path = f"{self._index_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, indent=1, ensure_ascii=False)
+            os.replace(tmp_path, self._index_path)
+            self._index_mtime = os.stat(self._index_path).st_mtime_ns
+            self._loaded.pop(name, None)
+        logger.info(f"Stored voice {name!r} ({pos / 1024:.0f} KiB) in {self._data_path}")
+        return self.get(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            voices = self._index["voices"]
+            live = sum(entry["nbytes"] for entry in voices.values())
+            size = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+            return {
+                "voices": len(voices),
+                "loaded": sorted(self._loaded),
+                "loaded_kib": round(sum(voices[n]["nbytes"] for n in self._loaded if n in voices) / 1024, 1),
+                "file_kib": round(size / 1024, 1),
+                # byte ของเสียงที่ถูก ingest ทับ (ยังอยู่ในไฟล์)
+                "dead_kib": round(max(0, size - live) / 1024, 1),
+            }
+
+
+_STORES: dict[tuple[str, str], VoiceStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_voice_store(model_dir: str, model_version: str) -> VoiceStore:
+    # store เดียวต่อ (model dir, version) ต่อ process แชร์ mmap ข้าม job / session
+    key = (os.path.realpath(model_dir), model_version)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = VoiceStore(os.path.join(key[0], VOICES_DIRNAME), model_version)
+        return store
+
+
+def find_voice_wav(name: str) -> str | None:
+    from bootstrap import PROJECT_ROOT
+
+    for directory in filter(None, (DEFAULT_SOURCE_DIR, os.path.join(PROJECT_ROOT, VOICES_DIRNAME))):
+        path = os.path.join(directory, f"{name}.wav")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def main() -> int:
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    ingest = sub.add_parser("ingest")
+    ingest.add_argument("name")
+    ingest.add_argument("wav", nargs="?", help="reference wav (default: voices/<name>.wav)")
+    parser.add_argument("--backend", default="torch")
+    args = parser.parse_args()
+
+    from fun_audio import CosyVoiceTTS
+
+    tts_ = CosyVoiceTTS(use_cache=False, backend=args.backend)
+    if tts_._model is None:
+        print("CosyVoice model not available", file=sys.stderr)
+        return 1
+    store = tts_.voice_store
+    if args.command == "ingest":
+        tts_.ingest_voice(args.name, args.wav)
+    for name in store.names():
+        print(f"{name:<20} {store.entry(name)['source']}")
+    print(json.dumps(store.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
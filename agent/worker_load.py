@@ -0,0 +1,244 @@
+# load ของ worker ที่ LiveKit ใช้เลือกว่าจะส่ง job ใหม่ไปที่ host ไหน (WorkerOptions.load_fnc)
+#
+# default ของ LiveKit ดูแค่ CPU แต่ host ที่ CosyVoice / SenseVoice คิวเต็มอาจ CPU ยังไม่เต็ม 100%
+# (รอ IO / รอ scheduler) และยังรับสายใหม่ต่อ คะแนนที่นี่เอาค่าที่แย่ที่สุดของ
+#   queue   จำนวนงาน inference ที่รอ (executor / STT batcher / TTS scheduler) / AGENT_LOAD_QUEUE_SATURATION
+#   rtf     real-time factor ล่าสุดของ STT / TTS (เวลาคำนวณต่อวินาทีเสียง) / AGENT_LOAD_MAX_RTF
+#           คูณ AGENT_LOAD_RTF_WEIGHT (ไม่เกิน weight)
+#   memory  AGENT_LOAD_MIN_FREE_MB / memory ที่เหลือ
+#   jobs    job ที่รันอยู่ / AGENT_MAX_JOBS (0 = ไม่จำกัด)
+# ทุกตัว 1.0 = เต็ม LiveKit หยุดส่ง job ให้เมื่อคะแนนเกิน load_threshold (AGENT_LOAD_THRESHOLD)
+# RTF บน CPU แกว่งตามความยาววลี (วลีสั้นหนึ่งวลีก็ RTF > 1 ได้) จึงแค่ดันคะแนนขึ้นให้ LiveKit เลือก host อื่นก่อน
+# weight ต่ำกว่า threshold: RTF อย่างเดียวไม่ปิดรับ job host ที่ทำไม่ทันจริงคิวจะโตจน queue เต็มเอง
+#
+# job แบบ thread (default) รันใน process หลักเดียวกับ load_fnc: อ่านคิว / RTF ตรงจาก process นี้
+# แบบ process: job รันใน process ลูก reporter ในแต่ละ process ลูกเขียน queue depth / RTF เป็น Gauge ของ
+# prometheus_client (multiprocess) ทุก REPORT_INTERVAL และ load_fnc อ่านรวมจาก PROMETHEUS_MULTIPROC_DIR
+# (ไฟล์ของ process ที่ตายแล้วถูกลบก่อนอ่าน)
+# ทดลองด้วยคิวจำลอง: python bench_worker_load.py
+import glob
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from prometheus_client import Gauge
+
+from model_registry import shares_models_across_jobs
+
+logger = logging.getLogger("worker_load")
+
+LOAD_THRESHOLD = float(os.getenv("AGENT_LOAD_THRESHOLD", "0.9"))
+MAX_JOBS = int(os.getenv("AGENT_MAX_JOBS", "0"))
+QUEUE_SATURATION = float(os.getenv("AGENT_LOAD_QUEUE_SATURATION", "8"))
+MAX_RTF = float(os.getenv("AGENT_LOAD_MAX_RTF", "1.0"))
+RTF_WEIGHT = float(os.getenv("AGENT_LOAD_RTF_WEIGHT", "0.75"))
+MIN_FREE_MB = float(os.getenv("AGENT_LOAD_MIN_FREE_MB", "1024"))
+REPORT_INTERVAL = 0.5
+# RTF เฉลี่ยของงานที่จบในช่วงนี้ ไม่มีงานเลย = 0 (host ว่าง)
+RTF_WINDOW_S = 30.0
+
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "agent_inference_queue_depth",
+    "Inference work waiting in this process, by queue",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+INFERENCE_RTF = Gauge(
+    "agent_inference_rtf",
+    "Recent real-time factor (compute seconds per audio second), by engine",
+    ["engine"],
+    multiprocess_mode="livemax",
+)
+
+_rtf_lock = threading.Lock()
+_rtf: dict[str, deque[tuple[float, float, float]]] = {}
+_reporter: threading.Thread | None = None
+
+
+def record_rtf(engine: str, compute_s: float, audio_s: float) -> None:
+    # เรียกเมื่อ STT / TTS ทำงานหนึ่งชิ้นเสร็จ (ใน process ของ job)
+    if audio_s <= 0:
+        return
+    with _rtf_lock:
+        _rtf.setdefault(engine, deque(maxlen=256)).append((time.monotonic(), compute_s, audio_s))
+
+
+def recent_rtf(now: float | None = None) -> dict[str, float]:
+    now = time.monotonic() if now is None else now
+    out = {}
+    with _rtf_lock:
+        for engine, samples in _rtf.items():
+            while samples and now - samples[0][0] > RTF_WINDOW_S:
+                samples.popleft()
+            audio = sum(s[2] for s in samples)
+            out[engine] = sum(s[1] for s in samples) / audio if audio else 0.0
+    return out
+
+
+def queue_depths() -> dict[str, int]:
+    from inference_executor import active_executors
+    from stt_batcher import active_batchers
+    from tts_scheduler import active_schedulers
+
+    depths: dict[str, int] = {}
+    for executor in active_executors():
+        depths[executor.name] = depths.get(executor.name, 0) + executor.queue_depth()
+    for batcher in active_batchers():
+        depths["sensevoice_batcher"] = depths.get("sensevoice_batcher", 0) + batcher.queue_depth()
+    for scheduler in active_schedulers():
+        depths["cosyvoice_scheduler"] = depths.get("cosyvoice_scheduler", 0) + scheduler.queue_depth()
+    return depths
+
+
+def _report() -> None:
+    for queue, depth in queue_depths().items():
+        INFERENCE_QUEUE_DEPTH.labels(queue=queue).set(depth)
+    for engine, rtf in recent_rtf().items():
+        INFERENCE_RTF.labels(engine=engine).set(rtf)
+
+
+def start_reporter(interval: float = REPORT_INTERVAL) -> None:
+    # เรียกใน process ของ job (prewarm) ครั้งเดียวต่อ process
+    global _reporter
+    if _reporter is not None:
+        return
+
+    def run() -> None:
+        while True:
+            try:
+                _report()
+            except Exception as e:
+                logger.warning(f"Reporting inference load failed: {e}")
+            time.sleep(interval)
+
+    _reporter = threading.Thread(target=run, name="worker-load-reporter", daemon=True)
+    _reporter.start()
+
+
+class LoadSample:
+    def __init__(self, *, queue_depth: float = 0.0, rtf: float = 0.0, free_mb: float | None = None, active_jobs: int = 0):
+        self.queue_depth = queue_depth
+        self.rtf = rtf
+        # None = ไม่รู้ (ไม่นับ)
+        self.free_mb = free_mb
+        self.active_jobs = active_jobs
+
+
+class LoadPolicy:
+    def __init__(
+        self,
+        *,
+        threshold: float = LOAD_THRESHOLD,
+        max_jobs: int = MAX_JOBS,
+        queue_saturation: float = QUEUE_SATURATION,
+        max_rtf: float = MAX_RTF,
+        rtf_weight: float = RTF_WEIGHT,
+        min_free_mb: float = MIN_FREE_MB,
+    ):
+        self.threshold = threshold
+        self.max_jobs = max_jobs
+        self.queue_saturation = queue_saturation
+        self.max_rtf = max_rtf
+        self.rtf_weight = rtf_weight
+        self.min_free_mb = min_free_mb
+
+    def terms(self, sample: LoadSample) -> dict[str, float]:
+        terms = {
+            "queue": sample.queue_depth / self.queue_saturation if self.queue_saturation > 0 else 0.0,
+            "rtf": self.rtf_weight * min(1.0, sample.rtf / self.max_rtf) if self.max_rtf > 0 else 0.0,
+        }
+        if sample.free_mb is not None and self.min_free_mb > 0:
+            terms["memory"] = self.min_free_mb / max(sample.free_mb, 1.0)
+        if self.max_jobs > 0:
+            terms["jobs"] = sample.active_jobs / self.max_jobs
+        return terms
+
+    def score(self, sample: LoadSample) -> float:
+        # LiveKit ต้องการค่า 0..1
+        return min(1.0, max(self.terms(sample).values()))
+
+    def available(self, sample: LoadSample) -> bool:
+        return self.score(sample) < self.threshold
+
+
+def _free_mb() -> float | None:
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().available / (1024 * 1024)
+
+
+def _read_multiproc(path: str) -> tuple[float, float]:
+    # ผลรวม queue depth และ RTF สูงสุด ของทุก process ลูกที่ยังไม่ตาย
+    from prometheus_client import CollectorRegistry, multiprocess
+
+    for db in glob.glob(os.path.join(path, "gauge_live*_*.db")):
+        match = re.search(r"_(\d+)\.db$", db)
+        if not match:
+            continue
+        pid = int(match.group(1))
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid, path)
+        except PermissionError:
+            pass
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path)
+    queue_depth, rtf = 0.0, 0.0
+    for metric in registry.collect():
+        for sample in metric.samples:
+            if sample.name == "agent_inference_queue_depth":
+                queue_depth += sample.value
+            elif sample.name == "agent_inference_rtf":
+                rtf = max(rtf, sample.value)
+    return queue_depth, rtf
+
+
+class WorkerLoad:
+    # load_fnc ของ WorkerOptions (รันใน process หลักทุก 0.5 s บน thread ของ executor)
+    # multiproc_dir: None = ตาม job executor (thread: process นี้, process: PROMETHEUS_MULTIPROC_DIR)
+    # "" = อ่านคิวใน process นี้ อย่างอื่น = อ่านจาก dir นั้น
+    def __init__(self, policy: LoadPolicy | None = None, *, multiproc_dir: str | None = None):
+        self.policy = policy or LoadPolicy()
+        self._multiproc_dir = multiproc_dir
+        self._lock = threading.Lock()
+        self._last: dict = {}
+
+    def sample(self, active_jobs: int = 0) -> LoadSample:
+        path = self._multiproc_dir
+        if path is None:
+            path = "" if shares_models_across_jobs() else os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+        queue_depth, rtf = 0.0, 0.0
+        if path and os.path.isdir(path):
+            try:
+                queue_depth, rtf = _read_multiproc(path)
+            except Exception as e:
+                logger.warning(f"Reading inference load from {path} failed: {e}")
+        else:
+            # job รันใน process เดียวกัน (thread executor / bench)
+            queue_depth = float(sum(queue_depths().values()))
+            rtf = max(recent_rtf().values(), default=0.0)
+        return LoadSample(queue_depth=queue_depth, rtf=rtf, free_mb=_free_mb(), active_jobs=active_jobs)
+
+    def __call__(self, worker=None) -> float:
+        active_jobs = len(worker.active_jobs) if worker is not None else 0
+        sample = self.sample(active_jobs)
+        terms = self.policy.terms(sample)
+        score = self.policy.score(sample)
+        with self._lock:
+            was_available = self._last.get("available", True)
+            self._last = {"score": score, "terms": terms, "available": score < self.policy.threshold}
+        if was_available != self._last["available"]:
+            state = "available" if self._last["available"] else "unavailable"
+            logger.info(f"Worker {state}: load {score:.2f} (threshold {self.policy.threshold}), {', '.join(f'{k}={v:.2f}' for k, v in terms.items())}")
+        return score
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._last)
@@ -1,73 +1,15 @@
 import sys
 import os
-import torch
-import yaml
 
-# --- Patch PyYAML and ruamel.yaml ---
-def patch_yaml():
-    # Patch PyYAML
-    loaders = [
-        'Loader', 'SafeLoader', 
-        'CLoader', 'CSafeLoader',
-        'FullLoader', 'UnsafeLoader'
-    ]
-    
-    for name in loaders:
-        try:
-            loader_cls = getattr(yaml, name, None)
-            if loader_cls:
-                setattr(loader_cls, 'max_depth', 10000)
-        except Exception as e:
-            print(f"Warning: Could not patch yaml.{name}: {e}")
-
-    # Patch ruamel.yaml (Crucial for HyperPyYAML/CosyVoice)
-    try:
-        import ruamel.yaml
-        ruamel_loaders = ['Loader', 'SafeLoader', 'RoundTripLoader']
-        for name in ruamel_loaders:
-             try:
-                loader_cls = getattr(ruamel.yaml, name, None)
-                if loader_cls:
-                    setattr(loader_cls, 'max_depth', 10000)
-             except Exception as e:
-                print(f"Warning: Could not patch ruamel.yaml.{name}: {e}")
-    except ImportError:
-        print("Warning: ruamel.yaml not found, skipping patch.")
-    except Exception as e:
-        print(f"Warning: Error patching ruamel.yaml: {e}")
-
-patch_yaml()
-# ------------------------------------------------
-
-# --- Patch torchaudio.load to bypass TorchCodec/backend issues ---
-try:
-    import torchaudio
-    import soundfile as sf
-    import numpy as np
-
-    def patched_torchaudio_load(filepath, **kwargs):
-        # Ignore backend kwargs etc
-        data, sample_rate = sf.read(filepath)
-        # data is numpy array
-        # Torchaudio load returns (Tensor[channels, samples], sample_rate)
-        if data.ndim == 1:
-            data = data.reshape(-1, 1) # (samples, 1)
-        
-        # sf read is (samples, channels), convert to (channels, samples)
-        data = data.T 
-        
-        tensor = torch.from_numpy(data).float() 
-        return tensor, sample_rate
-
-    print("Patching torchaudio.load with soundfile...")
-    torchaudio.load = patched_torchaudio_load
-except ImportError as e:
-    print(f"Warning: Could not patch torchaudio: {e}")
+# patch ทั้งหมด (PyYAML, torchaudio, load_wav, sampling_ids) อยู่ใน agent/bootstrap.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent"))
+import bootstrap
 
-# Add paths
-sys.path.append(os.path.join(os.getcwd(), "Fun-Audio-Chat/third_party/CosyVoice"))
-
-from cosyvoice.cli.cosyvoice import CosyVoice, CosyVoice2, CosyVoice3
+cli = bootstrap.ensure_cosyvoice()
+if cli is None:
+    print("CosyVoice library not available")
+    sys.exit(1)
+CosyVoice, CosyVoice2, CosyVoice3 = cli.CosyVoice, cli.CosyVoice2, cli.CosyVoice3
 
 # Path to model
 model_path = "Fun-Audio-Chat/pretrained_models/Fun-CosyVoice3-0.5B-2512"
@@ -1,30 +1,9 @@
 import sys
 import os
-import yaml
 
-# Apply patches first
-def patch_yaml():
-    loaders = ['Loader', 'SafeLoader', 'CLoader', 'CSafeLoader', 'FullLoader', 'UnsafeLoader']
-    for name in loaders:
-        try:
-            loader_cls = getattr(yaml, name, None)
-            if loader_cls:
-                setattr(loader_cls, 'max_depth', 10000)
-        except Exception:
-            pass
-    try:
-        import ruamel.yaml
-        for name in ['Loader', 'SafeLoader', 'RoundTripLoader']:
-            try:
-                loader_cls = getattr(ruamel.yaml, name, None)
-                if loader_cls:
-                    setattr(loader_cls, 'max_depth', 10000)
-            except Exception:
-                pass
-    except ImportError:
-        pass
-
-patch_yaml()
+# patch ทั้งหมดอยู่ใน agent/bootstrap.py (ใช้ชุดเดียวกับ agent)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent"))
+import bootstrap
 
 # Setup paths
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -40,7 +19,10 @@ if COSYVOICE_PATH not in sys.path:
     sys.path.append(COSYVOICE_PATH)
 
 try:
-    from cosyvoice.cli.cosyvoice import CosyVoice, CosyVoice3
+    cli = bootstrap.ensure_cosyvoice()
+    if cli is None:
+        raise ImportError("CosyVoice library not available")
+    CosyVoice, CosyVoice3 = cli.CosyVoice, cli.CosyVoice3
     
     # Path to model
     model_path = os.path.join(PROJECT_ROOT, "Fun-Audio-Chat/pretrained_models/Fun-CosyVoice3-0.5B-2512")